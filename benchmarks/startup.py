@@ -0,0 +1,170 @@
+"""
+Startup benchmark for the refactor app.
+
+Measures, each in a fresh interpreter:
+- import time of the modules app.py needs (python -X importtime), with the slowest dependencies;
+- time to first render: from the start of the process until app.py has painted the title
+  and loader, i.e. including interpreter start-up, importing Streamlit and running the
+  script (AppTest in a new interpreter). The part inside app.py alone, as recorded under
+  the "startup.first_render" metric, is shown next to it.
+
+Exits with status 1 when a median exceeds its budget, so it can run in CI:
+
+    python benchmarks/startup.py --import-budget 4 --render-budget 1
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+APP_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "src", "refactor"
+)
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+FIRST_RENDER_SCRIPT = """
+import json, os, sys, time
+sys.path.insert(0, ".")
+from metrics import metrics
+
+# app.py records startup.first_render right after painting the title and loader
+painted_at = {{}}
+observe = metrics.observe
+def observe_first_render(name, value):
+    painted_at.setdefault(name, time.time())
+    observe(name, value)
+metrics.observe = observe_first_render
+
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file("app.py", default_timeout={timeout})
+try:
+    app.run()
+except Exception:
+    # Without credentials the script fails after the first render, which is all we measure
+    pass
+timings = {{name: values["mean"] for name, values in metrics.snapshot()["timings"].items()}}
+if "startup.first_render" in painted_at:
+    timings["startup.process_to_first_render"] = painted_at["startup.first_render"] - float(os.environ["STARTED_AT"])
+print(json.dumps(timings))
+"""
+
+
+def _run(code: str, *options) -> subprocess.CompletedProcess:
+    # The child measures from this moment, before the interpreter even starts
+    env = dict(os.environ, STARTED_AT=repr(time.time()))
+    return subprocess.run(
+        [sys.executable, *options, "-c", code],
+        cwd=APP_DIR,
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+
+
+def measure_imports(module: str):
+    """Cumulative import time of `module` in seconds and its direct dependencies, slowest first."""
+    process = _run(f"import {module}", "-X", "importtime")
+    if process.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{process.stderr[-2000:]}")
+
+    # Children are printed before their parent, indented by two more spaces
+    total, children, dependencies = None, [], []
+    for line in process.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        cumulative, depth, name = (
+            int(match.group(2)) / 1e6,
+            len(match.group(3)),
+            match.group(4),
+        )
+        if depth == 3:
+            children.append((cumulative, name))
+        elif depth == 1:
+            if name == module:
+                total, dependencies = cumulative, children
+            children = []
+    return total, sorted(dependencies, reverse=True)
+
+
+def measure_first_render(timeout: float) -> dict:
+    process = _run(FIRST_RENDER_SCRIPT.format(timeout=timeout))
+    output = process.stdout.strip().splitlines()
+    if process.returncode != 0 or not output:
+        raise RuntimeError(f"app.py could not be run:\n{process.stderr[-2000:]}")
+    return json.loads(output[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--module", default="app_logic", help="module imported by app.py to time"
+    )
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--top", type=int, default=10, help="slowest dependencies to list"
+    )
+    parser.add_argument("--import-budget", type=float, default=None, help="seconds")
+    parser.add_argument("--render-budget", type=float, default=None, help="seconds")
+    parser.add_argument(
+        "--timeout", type=float, default=30, help="seconds allowed for one app.py run"
+    )
+    parser.add_argument(
+        "--skip-render", action="store_true", help="only measure import time"
+    )
+    args = parser.parse_args()
+
+    import_times, dependencies = [], []
+    for _ in range(args.runs):
+        total, dependencies = measure_imports(args.module)
+        import_times.append(total)
+    import_median = statistics.median(import_times)
+    print(f"import {args.module}: median {import_median:.3f}s over {args.runs} runs")
+    for cumulative, name in dependencies[: args.top]:
+        print(f"  {cumulative:8.3f}s  {name}")
+
+    failures = []
+    if args.import_budget is not None and import_median > args.import_budget:
+        failures.append(
+            f"import time {import_median:.3f}s > budget {args.import_budget:.3f}s"
+        )
+
+    if not args.skip_render:
+        renders = [measure_first_render(args.timeout) for _ in range(args.runs)]
+        first_renders = [
+            run["startup.process_to_first_render"]
+            for run in renders
+            if "startup.process_to_first_render" in run
+        ]
+        if not first_renders:
+            raise RuntimeError("app.py did not record startup.first_render")
+        render_median = statistics.median(first_renders)
+        in_script = statistics.median(
+            run["startup.first_render"]
+            for run in renders
+            if "startup.first_render" in run
+        )
+        print(
+            f"time to first render: median {render_median:.3f}s from process start over {len(first_renders)} runs "
+            f"({in_script:.3f}s of it inside app.py)"
+        )
+        if args.render_budget is not None and render_median > args.render_budget:
+            failures.append(
+                f"time to first render {render_median:.3f}s > budget {args.render_budget:.3f}s"
+            )
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
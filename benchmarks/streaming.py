@@ -0,0 +1,131 @@
+"""
+Streaming render benchmark for StreamHandler.
+
+Replays a simulated answer token by token, on a simulated clock, into a container
+that only counts what Streamlit would receive: render calls and bytes of markdown.
+Compares rendering every token (interval 0) with the coalescing settings:
+
+    python benchmarks/streaming.py --answer-chars 4000 --tokens-per-second 60
+
+With --max-render-calls the run exits with status 1 when the coalescing handler
+renders more often than that, so it can run in CI.
+"""
+
+import argparse
+import os
+import sys
+
+APP_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "src", "refactor"
+)
+
+SAMPLE_ANSWER = """```sql
+SELECT COMPANYNAME, COUNT(DISTINCT HEALTHEVENTID) AS PATIENTS, AVG(VALUE) AS AVERAGE_VALUE
+FROM CATAPULT_HEALTH_DB.POC_CATAPULT_HEALTH.HEALTHRECORDDATA
+WHERE VARIABLE_NAME ILIKE '%cholesterol%'
+AND EVENTDATE BETWEEN '2023-01-01' AND '2023-12-31'
+GROUP BY COMPANYNAME
+ORDER BY PATIENTS DESC;
+```
+"""
+
+
+class RecordingContainer:
+    """Stands in for st.empty(): counts the markdown payloads instead of sending them."""
+
+    def __init__(self):
+        self.calls = 0
+        self.bytes = 0
+
+    def markdown(self, body: str):
+        self.calls += 1
+        self.bytes += len(body.encode("utf-8"))
+
+
+class SimulatedClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def tokens(answer_chars: int, token_chars: int) -> list:
+    text = (SAMPLE_ANSWER * (answer_chars // len(SAMPLE_ANSWER) + 1))[:answer_chars]
+    return [
+        text[index : index + token_chars] for index in range(0, len(text), token_chars)
+    ]
+
+
+def replay(
+    stream: list, tokens_per_second: float, **handler_options
+) -> RecordingContainer:
+    from llm.streamming_handler import StreamHandler
+
+    container, clock = RecordingContainer(), SimulatedClock()
+    handler = StreamHandler(container, clock=clock, **handler_options)
+    for token in stream:
+        clock.now += 1 / tokens_per_second
+        handler.append(token)
+    handler.flush()
+    assert handler.text == "".join(stream)
+    return container
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--answer-chars", type=int, default=4000)
+    parser.add_argument(
+        "--token-chars",
+        type=int,
+        default=4,
+        help="average characters per streamed token",
+    )
+    parser.add_argument("--tokens-per-second", type=float, default=60)
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=None,
+        help="seconds, defaults to STREAM_RENDER_INTERVAL",
+    )
+    parser.add_argument(
+        "--max-pending",
+        type=int,
+        default=None,
+        help="defaults to STREAM_RENDER_MAX_PENDING",
+    )
+    parser.add_argument("--max-render-calls", type=int, default=None)
+    args = parser.parse_args()
+
+    sys.path.insert(0, APP_DIR)
+    stream = tokens(args.answer_chars, args.token_chars)
+    coalescing = {
+        name: value
+        for name, value in (
+            ("interval", args.interval),
+            ("max_pending", args.max_pending),
+        )
+        if value is not None
+    }
+
+    baseline = replay(stream, args.tokens_per_second, interval=0)
+    throttled = replay(stream, args.tokens_per_second, **coalescing)
+    print(
+        f"{len(stream)} tokens, {args.answer_chars} characters at {args.tokens_per_second:g} tokens/s"
+    )
+    print(f"{'mode':<12}{'render calls':>14}{'bytes sent':>14}")
+    for name, container in (("per token", baseline), ("coalesced", throttled)):
+        print(f"{name:<12}{container.calls:>14,}{container.bytes:>14,}")
+    print(
+        f"reduction: {baseline.calls / throttled.calls:.1f}x calls, {baseline.bytes / throttled.bytes:.1f}x bytes"
+    )
+
+    if args.max_render_calls is not None and throttled.calls > args.max_render_calls:
+        print(f"FAIL: {throttled.calls} render calls > budget {args.max_render_calls}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
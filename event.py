@@ -2,7 +2,7 @@ import json
 
 from index import handler
 
-event = {}
+event = {"message": "How many patients are there per company?"}
 
 context = {}
 
@@ -1,12 +1,22 @@
-from src.app import main
+import os
+import sys
+
+# The pipeline modules use flat imports from src/refactor
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src", "refactor"))
+
+# Only /tmp is writable on Lambda
+if os.environ.get("AWS_LAMBDA_FUNCTION_NAME"):
+    os.environ.setdefault("CACHE_DIR", "/tmp/.cache")
+
+from lambda_handler import handler as _handler  # noqa: E402
 
 
 def handler(event, context):
-    return main(event, context)
+    return _handler(event, context)
 
 
 if __name__ == "__main__":
     try:
-        handler(None, None)
+        print(handler({"message": sys.argv[1] if len(sys.argv) > 1 else "Hi"}, None))
     except Exception as e:
         print(e)
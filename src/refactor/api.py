@@ -0,0 +1,49 @@
+"""
+HTTP API for the chat pipeline, deployable and scalable apart from the Streamlit UI.
+Run from the repository root, so it shares CACHE_DIR with the app:
+
+    uvicorn api:app --app-dir src/refactor --host 0.0.0.0 --port 8000
+
+POST /chat streams newline-delimited JSON events while the answer is produced.
+"""
+
+import json
+from typing import Optional
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from engine import get_engine
+
+app = FastAPI(title="Catapult Health Chatbot API")
+
+
+class ChatRequest(BaseModel):
+    message: str = ""
+    # The "confirm" token of an earlier message event, to run its expensive queries anyway (message is then ignored)
+    confirm_token: Optional[str] = None
+
+
+@app.get("/health")
+def health():
+    return {"status": "ok"}
+
+
+@app.get("/greeting")
+def greeting():
+    return {"greeting": get_engine().greeting()}
+
+
+@app.post("/chat")
+async def chat(request: ChatRequest):
+    if not request.message and not request.confirm_token:
+        raise HTTPException(status_code=400, detail='Missing "message"')
+
+    async def ndjson():
+        async for payload in get_engine().stream(
+            request.message, request.confirm_token
+        ):
+            yield json.dumps(payload, default=str) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
@@ -1,12 +1,21 @@
+import time
+SCRIPT_STARTED_AT = time.perf_counter()
+
 import streamlit as st
+from metrics import metrics
+
+# Title and loader are painted before the heavy imports below
+st.title("🏥 Catapult-Health Chatbot")
 new_loader = st.empty()
 new_loader.text("Loading... please wait. ")
+metrics.observe("startup.first_render", time.perf_counter() - SCRIPT_STARTED_AT)
 
-from app_logic import AppLogic
+with metrics.timer("startup.imports"):
+    from config import HISTORY_RENDER_RECENT, SHOW_METRICS
+    from app_logic import AppLogic
+    from result_viewer import render_chart_snapshot, render_query_result
+    from history import HistoryStore
 
-
-# Title
-st.title("🏥 Catapult-Health Chatbot")
 new_loader.empty()
 # Instantiate the app logic
 app_logic = AppLogic()
@@ -19,7 +28,11 @@ if not hasattr(st, "session_state"):
 new_loader.empty()
 
 if "messages" not in st.session_state:
-    st.session_state.messages = [{"role": "system", "content": app_logic.system_generator.generate_response()}]
+    # Usually a cache hit; it is rendered with the history below either way
+    with st.spinner("Preparing the introduction..."):
+        st.session_state.messages = [{"role": "system", "content": app_logic.generate_greeting()}]
+if "history" not in st.session_state:
+    st.session_state.history = HistoryStore()
 
 # user_input for user input and save
 if prompt := st.chat_input():
@@ -27,13 +40,25 @@ if prompt := st.chat_input():
 
 
 if st.session_state.messages[-1]["role"] != "system":
+    # Only the latest results are rendered on every rerun; older ones when the user opens them
+    result_ids = [message["results"].id for message in st.session_state.messages if "results" in message]
+    recent = set(result_ids[-HISTORY_RENDER_RECENT:]) if HISTORY_RENDER_RECENT > 0 else set()
     for message in st.session_state.messages:
         with st.chat_message(message["role"]):
             # Directly output the content if it's a string
             if isinstance(message["content"], str):  # Check if content is a string
                 st.markdown(message["content"])  # Use markdown to preserve any formatting
             if "results" in message:
-                st.dataframe(message["results"])
+                result = message["results"]
+                if result.id in recent or st.checkbox("Show result", key=f"show-{result.id}"):
+                    # A pooled session is leased only for pages read through RESULT_SCAN
+                    render_query_result(result, app_logic.session_pool, history=st.session_state.history)
+            if "chart" in message:
+                render_chart_snapshot(message["chart"])
+else:
+    # First load (or a rerun before the first question): only the greeting, whether it was cached or not
+    with st.chat_message("system"):
+        st.markdown(st.session_state.messages[0]["content"])
 
 
 
@@ -42,3 +67,22 @@ if st.session_state.messages[-1]["role"] != "system":
 if st.session_state.messages[-1]["role"] != "assistant":
     with st.chat_message("assistant"):
         session = app_logic.handle_input(prompt, st.session_state)
+
+# Queries above the cost guard's confirmation threshold only run once the user asks for it
+pending = st.session_state.messages[-1].get("confirm")
+if pending and st.button("Run anyway", key=f"confirm-{len(st.session_state.messages)}"):
+    st.session_state.messages[-1].pop("confirm")
+    with st.chat_message("assistant"):
+        app_logic.handle_input(None, st.session_state, confirm_token=pending["token"])
+
+# New results are compacted, and the oldest spilled to disk past the session's memory budget
+st.session_state.history.track(st.session_state.messages)
+
+if SHOW_METRICS:
+    with st.sidebar.expander("Performance"):
+        st.json(metrics.snapshot())
+    with st.sidebar.expander("Chat history"):
+        st.json(st.session_state.history.stats())
+    with st.sidebar.expander("Speculative SQL"):
+        from speculation import report
+        st.json(report())
@@ -1,169 +1,118 @@
-from llm.input_evaluator import InputEvaluatorLLM
-from llm.query_generator import QueryGeneratorLLM
-from llm.system_generator import SystemGeneratorLLM
-from llm.simple_generator import SimpleGeneratorLLM
-from llm.error_feedback import ErrorFeedbackLLM
-from llm.chart_generator_with_sql import ChartGeneratorLLMFromSQL
-from config import create_session
-from snowflake.connector import ProgrammingError
-from snowflake.snowpark.exceptions import SnowparkSQLException
-import re
+# app_logic.py
 import streamlit as st
-import pandas as pd
-import random
 
-
-class AppLogic:
-    def __init__(self):
-        # Create Snowflake session
-        self.snowflake_session = create_session()
-        self.session_created = self.snowflake_session
-
-        # Initialize the generators
-        self.input_evaluator = InputEvaluatorLLM()
-        self.system_generator = SystemGeneratorLLM(_snowflake_session=self.snowflake_session)
-    
-    def handle_input(self, prompt, session_state):
-        user_input = prompt
-        if user_input:
-            # Evaluate the user input
-            evaluation = self.input_evaluator.evaluate(user_input)
-            if evaluation.is_a_query:
-                attempts = 0
-                max_retries = 3
-                error_feedback = None
-
-                while attempts < max_retries:
-                    resp_container = st.empty()
-                    try:
-                        # Generate the SQL query
-                        if error_feedback:
-                            resp_container.info("Error encountered: trying again...")
-                            query_generator = ErrorFeedbackLLM(self.snowflake_session)
-                            query_to_snowflake = query_generator.generate_response(user_input, error_feedback)
-                        else:
-                            query_generator = QueryGeneratorLLM(self.snowflake_session)
-                            query_to_snowflake = query_generator.generate_response(user_input)
-
-                        # Extract SQL queries from the response
-                        sql_queries = re.findall(r"```sql\n(.*?)\n```", query_to_snowflake, re.DOTALL)
-                        if sql_queries:
-                            for query in sql_queries:
-                                result = self.session_created.sql(query).collect()
-                                message = {"role": "assistant", "content": result, "results": result}
-                                st.dataframe(result)
-                                session_state.messages.append(message)
-
-                            # Clear the error placeholder now that we have a successful query
-                            # resp_container.empty()
-                            break 
-
-                    except (ProgrammingError, SnowparkSQLException) as e:
-                        # Capture the error feedback and show it in the placeholder
-                        error_feedback = str(e)
-                        resp_container.error(f"Attempt {attempts + 1} failed: {e}")
-                        attempts += 1
-                        if attempts >= max_retries:
-                            resp_container.error("All attempts failed.")
-                            break
-    
-            
-
-            # if evaluation.is_a_query:
-            #     attempts = 0
-            #     max_retries = 3
-            #     error_feedback = None
-                
-            #     while attempts < max_retries:
-            #         try:
-            #             # If there was an error previously, use ErrorFeedbackLLM
-            #             if error_feedback:
-            #                 error_feedback_llm = ErrorFeedbackLLM(self.snowflake_session)
-            #                 query_to_snowflake = error_feedback_llm.generate_response(user_input, error_feedback)
-
-            #                 # Find all SQL queries in the generated output
-            #                 sql_queries = re.findall(r"```sql\n(.*?)\n```", query_to_snowflake, re.DOTALL)
-                            
-            #                 if sql_queries:
-            #                     for query in sql_queries:
-            #                         result = self.session_created.sql(query).collect()
-            #                         message = {"role": "assistant", "content": query, "results": result}
-            #                         st.dataframe(result)
-            #                         session_state.messages.append(message.copy())
-
-            #                     # Exit the loop if successful
-            #                     break 
-
-            #             else:
-            #                 query_generator = QueryGeneratorLLM(_snowflake_session=self.snowflake_session)
-            #                 query_to_snowflake = query_generator.generate_response(user_input)
-
-            #                 # Find all SQL queries in the generated output
-            #                 sql_queries = re.findall(r"```sql\n(.*?)\n```", query_to_snowflake, re.DOTALL)
-                            
-            #                 if sql_queries:
-            #                     for query in sql_queries:
-            #                         result = self.session_created.sql(query).collect()
-            #                         message = {"role": "assistant", "content": query, "results": result}
-            #                         st.dataframe(result)
-            #                         session_state.messages.append(message.copy())
-
-            #                     # Exit the loop if successful
-            #                     break 
-                                
-            #         except (ProgrammingError, SnowparkSQLException) as e:
-            #             # Capture the error feedback
-            #             error_feedback = str(e)
-            #             attempts += 1
-            #             if attempts >= max_retries:
-            #                 # Handle max retries exceeded
-            #                 break
-
-                        
-                if evaluation.include_chart:
-                    new_loader = st.empty()
-                    new_loader.text("Loading... please wait. ")
-                    chart_generator = ChartGeneratorLLMFromSQL(_snowflake_session=self.session_created)
-                    chart = chart_generator.generate_chart(user_input, message['results'])
-
-                    # Create a dictionary to hold the local variables after exec() is called
-                    local_vars = {}
-
-                    try:
-                        # Remove the markdown code block formatting and fig.show()
-                        code_to_exec = chart.replace("```python\n", "").replace("```", "").replace("fig.show()", "").strip()
-                        new_loader.empty()
-                        print("Executing code:", code_to_exec)  # Printing the corrected code for verification
-                        exec(code_to_exec, {}, local_vars)
-
-                        if 'fig' in local_vars:
-                            fig = local_vars['fig']
-                            st.plotly_chart(fig)
-                            # Append message to the chat history
-                            message = {"role": "assistant", "content": fig}
-                            session_state.messages.append(message)
-                        else:
-                            st.error("Plot object 'fig' not found in the executed code.")
-                    except Exception as e:
-                        st.error(f"An error occurred while executing the code: {e}")
-
-                # if attempts == max_retries:
-                #     st.error("Failed to execute query after several attempts.")
-                        
-
-                else:
-                    return session_state
-                
-                    
-            else:
-                # Handle non-query input (e.g., greetings, thanks)
-                simple_generator = SimpleGeneratorLLM(_snowflake_session=self.snowflake_session)
-                response = simple_generator.generate_response(user_input)
-                message = {"role": "assistant", "content": response}
-                session_state.messages.append(message)
-                return session_state
-        
+from async_app_logic import AsyncAppLogic
+from config import GREETING_REFRESH_SECONDS, PIPELINE_MODE
+from event_loop import iterate_async
+from events import TOKEN, Event
+from greeting_cache import greeting_cache
+from llm.streamming_handler import StreamHandler
+from result_viewer import render_query_result
+from session_pool import SessionPool
+
+
+@st.cache_resource(show_spinner=False)
+def get_session_pool() -> SessionPool:
+    # One pool per process, shared by every browser session and rerun
+    pool = SessionPool()
+    pool.prefill()
+    return pool
+
+
+class StreamlitEventRenderer:
+    """Renders pipeline events in the Streamlit script thread, where st calls are allowed."""
+
+    def __init__(self, session_state):
+        self.session_state = session_state
+        self.status = st.empty()
+        self.stream = None
+        self.placeholders = {}
+
+    def render(self, event: Event):
+        # A streamed answer ends with the first event that isn't one of its tokens
+        if event.type != TOKEN:
+            self.flush()
+        handler = getattr(self, f"_on_{event.type}", None)
+        if handler is not None:
+            handler(event)
+
+    def flush(self):
+        if self.stream is not None:
+            self.stream.flush()
+
+    def _on_status(self, event: Event):
+        if event.data:
+            self.status.text(event.data)
         else:
-            return  session_state
+            self.status.empty()
+
+    def _on_info(self, event: Event):
+        st.info(event.data)
+
+    def _on_warning(self, event: Event):
+        st.warning(event.data)
+
+    def _on_error(self, event: Event):
+        st.error(event.data)
+
+    def _on_stream_start(self, event: Event):
+        self.stream = StreamHandler(st.empty())
+
+    def _on_token(self, event: Event):
+        self.stream.append(event.data)
 
+    def _on_sql(self, event: Event):
+        st.markdown(event.data)
 
+    def _on_query_started(self, event: Event):
+        placeholder = st.empty()
+        placeholder.caption("Running query...")
+        self.placeholders[event.index] = placeholder
+
+    def _on_result(self, event: Event):
+        # Pages past the first chunk come from the result batches, no session is held for the UI
+        with self.placeholders[event.index].container():
+            render_query_result(event.data)
+
+    def _on_queries_cancelled(self, event: Event):
+        for placeholder in self.placeholders.values():
+            placeholder.empty()
+        self.placeholders = {}
+
+    def _on_chart(self, event: Event):
+        fig, original_points, rendered_points, note = event.data
+        st.plotly_chart(fig)
+        if rendered_points < original_points:
+            st.caption(f"Showing {rendered_points:,} of {original_points:,} points.")
+        if note:
+            st.caption(note)
+
+    def _on_message(self, event: Event):
+        self.session_state.messages.append(event.data)
+
+
+class AppLogic:
+    """
+    The Streamlit side of the chat pipeline: runs AsyncAppLogic on the shared event loop
+    and renders its events from the script thread.
+    """
+
+    def __init__(self, pipeline_mode: str = PIPELINE_MODE, session_pool: SessionPool = None):
+        # Snowflake sessions are leased from the process-wide pool around each Snowflake call
+        self.session_pool = session_pool or get_session_pool()
+        self.engine = AsyncAppLogic(pipeline_mode, self.session_pool)
+        self.pipeline_mode = pipeline_mode
+        # Started once per process; a no-op on every later rerun
+        greeting_cache.start_refresher(self.session_pool, GREETING_REFRESH_SECONDS)
+
+    def generate_greeting(self) -> str:
+        return greeting_cache.get_or_generate_pooled(self.session_pool)
+
+    def handle_input(self, prompt, session_state, confirm_token: str = None):
+        """`confirm_token` is the token of a message's "confirm" entry, when the user runs an expensive query anyway."""
+        if prompt or confirm_token:
+            renderer = StreamlitEventRenderer(session_state)
+            for event in iterate_async(self.engine.handle_input(prompt, confirm_token)):
+                renderer.render(event)
+            renderer.flush()
+        return session_state
@@ -0,0 +1,626 @@
+# async_app_logic.py
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+from snowflake.connector import ProgrammingError
+from snowflake.snowpark import Session
+from snowflake.snowpark.exceptions import SnowparkSQLException
+
+from chart_code_cache import chart_code_cache
+from chart_engine import exec_chart_code, truncation_note, try_build_chart
+from chart_snapshot import ChartSnapshot
+from config import (
+    COST_GUARD_ENABLED,
+    EARLY_SQL_DISPATCH,
+    MAX_CONCURRENT_QUERIES,
+    PIPELINE_MODE,
+    PIPELINE_MODES,
+    SQL_VALIDATION_ENABLED,
+    SQL_VALIDATION_MAX_RETRIES,
+)
+from confirmations import pending_confirmations
+from cost_guard import ALLOW, CONFIRM, REJECT, cost_guard
+from downsampling import downsample_figure
+from events import (
+    CHART,
+    ERROR,
+    INFO,
+    MESSAGE,
+    QUERIES_CANCELLED,
+    QUERY_STARTED,
+    RESULT,
+    SQL,
+    STATUS,
+    STREAM_START,
+    TOKEN,
+    WARNING,
+    Event,
+)
+from llm.chart_generator_with_sql import ChartGeneratorLLMFromSQL
+from llm.error_feedback import ErrorFeedbackLLM
+from llm.input_evaluator import InputEvaluatorLLM
+from llm.query_generator import QueryGeneratorLLM
+from llm.routed_query_generator import RoutedQueryGeneratorLLM
+from llm.simple_generator import SimpleGeneratorLLM
+from metrics import metrics
+from parsers import InputEvaluator
+from query_results import QueryResult
+from result_cache import result_cache
+from schema_context import schema_context_cache
+from session_pool import TOKEN_EXPIRED, SessionPool, SessionPoolExhausted
+from speculation import SqlSpeculation, record_evaluation, should_speculate
+from sql_cache import format_sql_blocks, sql_cache
+from sql_stream import DispatchedQuery, SqlFenceParser, extract_sql
+from sql_validator import SqlValidationError, validate_queries, validate_sql
+
+# Seconds between two status checks of a running Snowpark async job, doubled up to the maximum
+JOB_POLL_INTERVAL = 0.05
+JOB_POLL_MAX_INTERVAL = 1.0
+
+MAX_RETRIES = 3
+
+logger = logging.getLogger(__name__)
+
+# Shared by every conversation on the loop so the warehouse never sees more than this many queries from one process
+QUERY_SLOTS = asyncio.Semaphore(MAX_CONCURRENT_QUERIES)
+
+
+def _result_cache_key(snowflake_session: Session, query: str):
+    if not result_cache.is_cacheable(query):
+        return None
+    return result_cache.key(
+        query, schema_context_cache.get_data_version(snowflake_session)
+    )
+
+
+class AsyncAppLogic:
+    """
+    asyncio implementation of the AppLogic pipeline.
+
+    handle_input is an async generator of events (see events.py) instead of
+    Streamlit calls, so it can run on the shared event loop and serve many
+    conversations at once. Blocking work (schema lookups, result caches,
+    fetching result batches) runs in worker threads; LLM calls use
+    ainvoke/astream and queries run as Snowpark async jobs.
+
+    A pooled session is leased around each Snowflake call only. The LLM calls get no
+    session: their prompts use the schema snapshot loaded under a lease beforehand.
+    """
+
+    def __init__(
+        self,
+        pipeline_mode: str = PIPELINE_MODE,
+        session_pool: SessionPool = None,
+        input_evaluator: InputEvaluatorLLM = None,
+    ):
+        if pipeline_mode not in PIPELINE_MODES:
+            raise ValueError(
+                f"Unknown pipeline mode {pipeline_mode!r}, expected one of {PIPELINE_MODES}"
+            )
+        self.pipeline_mode = pipeline_mode
+        self.session_pool = session_pool or SessionPool()
+        self.input_evaluator = input_evaluator or InputEvaluatorLLM()
+
+    @asynccontextmanager
+    async def lease_session(self):
+        acquire = asyncio.ensure_future(asyncio.to_thread(self.session_pool.acquire))
+        try:
+            session = await asyncio.shield(acquire)
+        except asyncio.CancelledError:
+            # The thread still gets a session; give it back once it does
+            acquire.add_done_callback(
+                lambda future: future.cancelled()
+                or future.exception()
+                or self.session_pool.release(future.result())
+            )
+            raise
+
+        discard = False
+        try:
+            yield session
+        except Exception as e:
+            discard = TOKEN_EXPIRED in str(e)
+            raise
+        finally:
+            self.session_pool.release(session, discard=discard)
+
+    async def _snowflake(self, fn, *args):
+        """fn(session, *args) in a worker thread, on a session leased for this call only."""
+        try:
+            async with self.lease_session() as session:
+                return await asyncio.to_thread(fn, session, *args)
+        except (ProgrammingError, SnowparkSQLException) as e:
+            if TOKEN_EXPIRED not in str(e):
+                raise
+        # The lease discarded the session whose token expired; once more on a fresh one
+        async with self.lease_session() as session:
+            return await asyncio.to_thread(fn, session, *args)
+
+    async def handle_input(self, user_input: str, confirm_token: str = None):
+        """
+        Events for one user message. `confirm_token` is the token of an earlier "confirm" message,
+        to run its expensive queries anyway; `user_input` is then taken from the confirmation.
+        """
+        confirmed = None
+        if confirm_token:
+            confirmed = await asyncio.to_thread(
+                pending_confirmations.redeem, confirm_token
+            )
+            if confirmed is None:
+                yield Event(
+                    ERROR,
+                    "This confirmation has expired or was already used. Please ask the question again.",
+                )
+                return
+            user_input = confirmed["user_input"]
+        if not user_input:
+            return
+        with metrics.timer(f"pipeline.async.{self.pipeline_mode}.end_to_end"):
+            try:
+                async for event in self._handle_input(user_input, confirmed):
+                    yield event
+            except SessionPoolExhausted:
+                yield Event(
+                    ERROR,
+                    "All Snowflake connections are busy right now, please try again in a moment.",
+                )
+
+    async def _route(self, user_input: str):
+        # Returns the evaluation, the SQL to run without generating it (combined mode, or the SQL cache)
+        # and whether it came from the cache, and in split mode the SQL speculatively generated while
+        # the input was evaluated
+        prefilter = self.input_evaluator.prefilter
+        evaluation = prefilter.classify(user_input) if prefilter is not None else None
+        if evaluation is not None and not evaluation.is_a_query:
+            return evaluation, None, False, None
+
+        # Repeated questions reuse SQL that already ran successfully on this schema, with no LLM call
+        fingerprint = await self._snowflake(schema_context_cache.get_fingerprint)
+        cached = await asyncio.to_thread(sql_cache.get, user_input, fingerprint)
+        if cached:
+            if evaluation is None:
+                evaluation = InputEvaluator(
+                    is_a_query=True,
+                    include_chart=cached["include_chart"],
+                    simple_answer=False,
+                )
+            return evaluation, cached["sql_queries"], True, None
+        if evaluation is not None:
+            return evaluation, None, False, None
+
+        if self.pipeline_mode == "combined":
+            routed = await RoutedQueryGeneratorLLM(None).agenerate_response(user_input)
+            return routed, routed.sql_queries, False, None
+
+        speculation = (
+            SqlSpeculation(None, user_input).start() if should_speculate() else None
+        )
+        try:
+            evaluation = await self.input_evaluator.aevaluate(
+                user_input, use_prefilter=False
+            )
+        except BaseException:
+            if speculation is not None:
+                speculation.cancel()
+            raise
+        record_evaluation(evaluation.is_a_query)
+        if speculation is not None:
+            speculation.mark_evaluated()
+        return evaluation, None, False, speculation
+
+    async def _handle_input(self, user_input: str, confirmed: dict = None):
+        speculation = None
+        try:
+            if confirmed:
+                evaluation = InputEvaluator(
+                    is_a_query=True,
+                    include_chart=confirmed["include_chart"],
+                    simple_answer=False,
+                )
+                routed_queries, from_cache = confirmed["sql_queries"], False
+            else:
+                evaluation, routed_queries, from_cache, speculation = await self._route(
+                    user_input
+                )
+
+            if not evaluation.is_a_query:
+                # Handle non-query input (e.g., greetings, thanks)
+                response = ""
+                yield Event(STREAM_START)
+                async for token in SimpleGeneratorLLM(
+                    _snowflake_session=None
+                ).astream_response(user_input):
+                    response += token
+                    yield Event(TOKEN, token)
+                yield Event(MESSAGE, {"role": "assistant", "content": response.strip()})
+                return
+
+            # Also loads the schema snapshot the prompts below are built from
+            fingerprint = await self._snowflake(schema_context_cache.get_fingerprint)
+            results = []
+            answer = self._answer_query(
+                user_input,
+                fingerprint,
+                routed_queries,
+                from_cache,
+                evaluation.include_chart,
+                confirmed,
+                speculation,
+            )
+            async for event in answer:
+                if event.type == MESSAGE and "results" in event.data:
+                    results.append(event.data["results"])
+                yield event
+
+            if evaluation.include_chart and results:
+                async for event in self._chart(user_input, results[-1]):
+                    yield event
+        finally:
+            # Not a query, or the pipeline stopped before using it
+            if speculation is not None and not speculation.streamed:
+                speculation.cancel()
+
+    async def _answer_query(
+        self,
+        user_input: str,
+        fingerprint: str,
+        routed_queries: list,
+        from_cache: bool,
+        include_chart: bool,
+        confirmed: dict = None,
+        speculation: SqlSpeculation = None,
+    ):
+        attempts = 0
+        # Rejections by the local validator don't use up the Snowflake attempts
+        local_failures = 0
+        error_feedback = None
+        cached_queries = routed_queries if from_cache else None
+
+        while attempts < MAX_RETRIES:
+            # Queries started while the answer was streaming, by block index
+            dispatched = {}
+            sql_queries = None
+            try:
+                if error_feedback:
+                    yield Event(INFO, "Error encountered: trying again...")
+                    generator = ErrorFeedbackLLM(None)
+                    tokens = generator.astream_response(user_input, error_feedback)
+                    cached_queries = None
+                elif cached_queries or routed_queries:
+                    tokens = None
+                    query_to_snowflake = format_sql_blocks(
+                        cached_queries or routed_queries
+                    )
+                    yield Event(SQL, query_to_snowflake)
+                elif speculation is not None:
+                    tokens = speculation.stream()
+                    speculation = None
+                else:
+                    tokens = QueryGeneratorLLM(None).astream_response(user_input)
+
+                if tokens is not None:
+                    query_to_snowflake = ""
+                    parser = SqlFenceParser()
+                    snapshot = None
+                    if (
+                        EARLY_SQL_DISPATCH
+                        and SQL_VALIDATION_ENABLED
+                        and local_failures < SQL_VALIDATION_MAX_RETRIES
+                    ):
+                        snapshot = await self._snowflake(
+                            schema_context_cache.get_snapshot
+                        )
+                    yield Event(STREAM_START)
+                    async for token in tokens:
+                        query_to_snowflake += token
+                        yield Event(TOKEN, token)
+                        # The first query of a multi-question answer runs while the model writes the next one
+                        closed = parser.feed(token) if EARLY_SQL_DISPATCH else []
+                        # One chunk can close several blocks; they are the last ones the parser found
+                        for position, query in enumerate(
+                            closed, len(parser.queries) - len(closed)
+                        ):
+                            early = self._dispatch(query, snapshot)
+                            if early is not None:
+                                dispatched[position] = early
+
+                sql_queries = extract_sql(query_to_snowflake)
+                started = {
+                    index: early
+                    for index, early in dispatched.items()
+                    if index < len(sql_queries) and sql_queries[index] == early.query
+                }
+                if not sql_queries:
+                    # Nothing to run; ask again rather than looping on the same answer
+                    attempts += 1
+                    continue
+
+                snapshot = None
+                if (
+                    SQL_VALIDATION_ENABLED
+                    and local_failures < SQL_VALIDATION_MAX_RETRIES
+                ):
+                    snapshot = await self._snowflake(schema_context_cache.get_snapshot)
+                # Without a snapshot only the read-only check runs, it is never skipped
+                validate_queries(sql_queries, snapshot)
+
+                stop = False
+                async for event in self._guard_costs(
+                    user_input, sql_queries, include_chart, confirmed, started
+                ):
+                    stop = True
+                    yield event
+                if stop:
+                    return
+                # Early queries held back for a confirmation that was given start again
+                started = {
+                    index: early
+                    for index, early in started.items()
+                    if early.decision.result() is None
+                    or early.decision.result().action == ALLOW
+                }
+
+                results = [None] * len(sql_queries)
+                async for event in self._run_queries(sql_queries, started):
+                    if event.type == RESULT:
+                        results[event.index] = event.data
+                    yield event
+                for result in results:
+                    yield Event(
+                        MESSAGE,
+                        {"role": "assistant", "content": None, "results": result},
+                    )
+
+                # Only SQL that executed successfully is worth caching, and only SQL that needed no confirmation
+                if not cached_queries and not confirmed:
+                    await asyncio.to_thread(
+                        sql_cache.set,
+                        user_input,
+                        fingerprint,
+                        sql_queries,
+                        include_chart,
+                    )
+                return
+
+            except SqlValidationError as e:
+                if cached_queries:
+                    sql_cache.invalidate(user_input, fingerprint)
+                error_feedback = str(e)
+                yield Event(
+                    WARNING, f"The generated query was rejected before running it: {e}"
+                )
+                local_failures += 1
+                # Past the schema checks, only queries that must never run are rejected; those use up attempts
+                if local_failures > SQL_VALIDATION_MAX_RETRIES:
+                    attempts += 1
+
+            except (ProgrammingError, SnowparkSQLException) as e:
+                if TOKEN_EXPIRED in str(e):
+                    # Not the SQL's fault: the lease discarded the session, the same SQL runs again on a fresh one
+                    metrics.incr("session_pool.token_expired")
+                    yield Event(INFO, "The Snowflake session expired, reconnecting...")
+                    if sql_queries:
+                        routed_queries = sql_queries
+                        error_feedback = None
+                    attempts += 1
+                    continue
+                # A cached query that fails (e.g. data-dependent error) must not be served again
+                if cached_queries:
+                    sql_cache.invalidate(user_input, fingerprint)
+                error_feedback = str(e)
+                yield Event(ERROR, f"Attempt {attempts + 1} failed: {e}")
+                attempts += 1
+
+            finally:
+                # Early queries of an answer that is retried, rejected or waiting for a confirmation
+                for early in dispatched.values():
+                    early.decision.cancel()
+                    early.result.cancel()
+
+        yield Event(ERROR, "All attempts failed.")
+
+    async def _check_cost(self, query: str):
+        if not COST_GUARD_ENABLED:
+            return None
+        key = await self._snowflake(_result_cache_key, query)
+        # Results already in the local cache cost nothing
+        if key and await asyncio.to_thread(result_cache.contains, key):
+            return None
+        return await self._snowflake(cost_guard.check, query)
+
+    def _dispatch(self, query: str, snapshot=None) -> DispatchedQuery:
+        """
+        Starts a ```sql block that closed while the rest of the answer is streaming. Blocks failing
+        validation against `snapshot` (None for the read-only check alone) are left to the final check.
+        """
+        try:
+            validate_sql(query, snapshot)
+        except SqlValidationError:
+            return None
+
+        decision = asyncio.create_task(self._check_cost(query))
+
+        async def check_and_run():
+            outcome = await decision
+            if outcome is not None and outcome.action != ALLOW:
+                return None
+            return await self._run_query(query)
+
+        metrics.incr("queries.dispatched_early")
+        return DispatchedQuery(query, decision, asyncio.create_task(check_and_run()))
+
+    async def _guard_costs(
+        self,
+        user_input: str,
+        sql_queries: list,
+        include_chart: bool,
+        confirmed: dict = None,
+        started: dict = None,
+    ):
+        """
+        Yields events only when the queries must not run now (rejected, or waiting for a confirmation).
+        The queries of a redeemed confirmation are estimated again: they can still be rejected,
+        but are not held back for another confirmation.
+        """
+        # Decisions made while the answer was streaming are reused
+        started = started or {}
+        decisions = await asyncio.gather(
+            *(
+                started[index].decision if index in started else self._check_cost(query)
+                for index, query in enumerate(sql_queries)
+            )
+        )
+        approved = confirmed["sql_queries"] if confirmed else []
+        checked = [
+            (query, decision)
+            for query, decision in zip(sql_queries, decisions)
+            if decision
+        ]
+        rejected = [decision for _, decision in checked if decision.action == REJECT]
+        to_confirm = [
+            decision
+            for query, decision in checked
+            if decision.action == CONFIRM and query not in approved
+        ]
+        if rejected:
+            response = (
+                "The query was not run because "
+                + "; ".join(d.reason for d in rejected)
+                + (
+                    ". Please narrow the question, e.g. to a date range or a few variables."
+                )
+            )
+            yield Event(ERROR, response)
+            yield Event(MESSAGE, {"role": "assistant", "content": response})
+        elif to_confirm:
+            response = (
+                "This query is expensive: "
+                + "; ".join(d.reason for d in to_confirm)
+                + "."
+            )
+            yield Event(WARNING, response)
+            # Only this token leaves the server; redeeming it runs exactly these queries
+            token = await asyncio.to_thread(
+                pending_confirmations.add, user_input, sql_queries, include_chart
+            )
+            yield Event(
+                MESSAGE,
+                {"role": "assistant", "content": response, "confirm": {"token": token}},
+            )
+
+    async def _run_query(self, query: str) -> QueryResult:
+        # Serve repeated queries from the local result cache until the table changes
+        key = await self._snowflake(_result_cache_key, query)
+        if key:
+            cached = await asyncio.to_thread(result_cache.get, key)
+            if cached is not None:
+                return QueryResult.from_dataframe(query, cached, cache_key=key)
+
+        async with QUERY_SLOTS, self.lease_session() as session:
+            job = await asyncio.to_thread(
+                lambda: session.sql(query).collect_nowait(
+                    statement_params=cost_guard.statement_params()
+                )
+            )
+            try:
+                interval = JOB_POLL_INTERVAL
+                while not await asyncio.to_thread(job.is_done):
+                    await asyncio.sleep(interval)
+                    interval = min(interval * 2, JOB_POLL_MAX_INTERVAL)
+            except asyncio.CancelledError:
+                # Stop the warehouse work too, not only the wait for it
+                asyncio.get_running_loop().run_in_executor(None, job.cancel)
+                raise
+
+            # Only the first bounded chunk is pulled now; the query id lets the viewer page through the rest
+            batches = await asyncio.to_thread(job.result, "pandas_batches")
+            result = QueryResult(
+                query, batches=batches, query_id=job.query_id, cache_key=key
+            )
+            await asyncio.to_thread(result.fetch)
+
+        if key and result.exhausted:
+            await asyncio.to_thread(result_cache.set, key, result.data)
+        return result
+
+    async def _run_queries(self, sql_queries: list, started: dict = None):
+        # Every SQL block runs at once; each result is sent as soon as its query finishes
+        started = started or {}
+        tasks = [
+            (
+                started[index].result
+                if index in started
+                else asyncio.create_task(self._run_query(query))
+            )
+            for index, query in enumerate(sql_queries)
+        ]
+        index_of = {task: index for index, task in enumerate(tasks)}
+        for index, query in enumerate(sql_queries):
+            yield Event(QUERY_STARTED, query, index=index)
+
+        pending = set(tasks)
+        try:
+            with metrics.timer("queries.batch"):
+                while pending:
+                    done, pending = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    for task in done:
+                        yield Event(RESULT, task.result(), index=index_of[task])
+        except Exception:
+            # Don't keep running the rest of the batch, it is retried as a whole
+            yield Event(QUERIES_CANCELLED)
+            raise
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _chart(self, user_input: str, result: QueryResult):
+        fig = await self._cached_chart(user_input, result)
+        if fig is None:
+            yield Event(STATUS, "Loading... please wait. ")
+            chart_generator = ChartGeneratorLLMFromSQL(_snowflake_session=None)
+            with metrics.timer("chart_generator.llm"):
+                chart = await chart_generator.agenerate_chart(
+                    user_input, result.data, result.total_rows
+                )
+            yield Event(STATUS, None)
+
+            try:
+                fig = await asyncio.to_thread(exec_chart_code, chart, result.data)
+            except Exception as e:
+                yield Event(ERROR, f"An error occurred while executing the code: {e}")
+                return
+            chart_code_cache.set(user_input, result.data, chart)
+
+        # Never ship tens of thousands of points to the browser
+        fig, original_points, rendered_points = await asyncio.to_thread(
+            downsample_figure, fig
+        )
+        note = truncation_note(result)
+        yield Event(CHART, (fig, original_points, rendered_points, note))
+        snapshot = await asyncio.to_thread(
+            ChartSnapshot, fig, original_points, rendered_points, note
+        )
+        yield Event(MESSAGE, {"role": "assistant", "content": None, "chart": snapshot})
+
+    async def _cached_chart(self, user_input: str, result: QueryResult):
+        # Common "X by Y" charts are built directly from the column dtypes, no LLM involved
+        fig = await asyncio.to_thread(try_build_chart, user_input, result.data)
+        if fig is not None:
+            return fig
+
+        # Code generated earlier for the same request on the same columns is re-run on the fresh data
+        cached_chart = await asyncio.to_thread(
+            chart_code_cache.get, user_input, result.data
+        )
+        if cached_chart:
+            try:
+                return await asyncio.to_thread(
+                    exec_chart_code, cached_chart, result.data
+                )
+            except Exception:
+                logger.warning("Cached chart code failed, regenerating", exc_info=True)
+                chart_code_cache.invalidate(user_input, result.data)
+        return None
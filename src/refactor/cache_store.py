@@ -0,0 +1,122 @@
+# cache_store.py
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from config import CACHE_DIR
+
+
+class TieredCache:
+    """
+    Key/value cache with an in-memory LRU tier in front of a local SQLite tier.
+
+    Values must be JSON-serializable. Entries expire `ttl_seconds` after they were
+    written; the SQLite tier keeps at most `max_disk_items` entries and evicts the
+    least recently used ones first.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        ttl_seconds: int,
+        max_memory_items: int = 256,
+        max_disk_items: int = 5000,
+        cache_dir: str = CACHE_DIR,
+    ):
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_items = max_memory_items
+        self.max_disk_items = max_disk_items
+        self.path = os.path.join(cache_dir, f"{namespace}.sqlite")
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._connection = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._connection.commit()
+        return self._connection
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            if key in self._memory:
+                value, created_at = self._memory[key]
+                if now - created_at < self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    return value
+                del self._memory[key]
+
+            connection = self._connect()
+            row = connection.execute(
+                "SELECT value, created_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] >= self.ttl_seconds:
+                connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+                connection.commit()
+                return None
+
+            connection.execute(
+                "UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            connection.commit()
+            value = json.loads(row[0])
+            self._remember(key, value, row[1])
+            return value
+
+    def set(self, key: str, value):
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO entries (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now),
+            )
+            self._evict(connection, now)
+            connection.commit()
+            self._remember(key, value, now)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._memory.pop(key, None)
+            connection = self._connect()
+            connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+            connection.commit()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            connection = self._connect()
+            connection.execute("DELETE FROM entries")
+            connection.commit()
+
+    def _remember(self, key: str, value, created_at: float):
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def _evict(self, connection: sqlite3.Connection, now: float):
+        connection.execute(
+            "DELETE FROM entries WHERE created_at <= ?", (now - self.ttl_seconds,)
+        )
+        (count,) = connection.execute("SELECT COUNT(*) FROM entries").fetchone()
+        if count > self.max_disk_items:
+            connection.execute(
+                "DELETE FROM entries WHERE key IN "
+                "(SELECT key FROM entries ORDER BY accessed_at ASC LIMIT ?)",
+                (count - self.max_disk_items,),
+            )
@@ -0,0 +1,43 @@
+# chart_code_cache.py
+import hashlib
+import json
+
+import pandas as pd
+
+from cache_store import TieredCache
+from config import CHART_CACHE_MAX_ENTRIES, CHART_CACHE_TTL_SECONDS
+from metrics import metrics
+from sql_cache import normalize_question
+
+
+class ChartCodeCache:
+    """Plotly code from ChartGeneratorLLMFromSQL that ran successfully, keyed by chart intent and result schema."""
+
+    def __init__(self, store: TieredCache = None):
+        self.store = store or TieredCache(
+            "chart_code_cache",
+            ttl_seconds=CHART_CACHE_TTL_SECONDS,
+            max_disk_items=CHART_CACHE_MAX_ENTRIES,
+        )
+
+    @staticmethod
+    def _key(user_input: str, data: pd.DataFrame) -> str:
+        # The code only depends on column names and dtypes, never on the values
+        schema = [[str(column), str(dtype)] for column, dtype in data.dtypes.items()]
+        payload = json.dumps([normalize_question(user_input), schema])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, user_input: str, data: pd.DataFrame):
+        code = self.store.get(self._key(user_input, data))
+        metrics.incr("chart_code_cache.hit" if code else "chart_code_cache.miss")
+        return code
+
+    def set(self, user_input: str, data: pd.DataFrame, code: str):
+        self.store.set(self._key(user_input, data), code)
+
+    def invalidate(self, user_input: str, data: pd.DataFrame):
+        metrics.incr("chart_code_cache.evicted")
+        self.store.delete(self._key(user_input, data))
+
+
+chart_code_cache = ChartCodeCache()
@@ -0,0 +1,193 @@
+# chart_engine.py
+import logging
+import re
+import time
+from dataclasses import dataclass, replace
+
+import pandas as pd
+import plotly.express as px
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# A second categorical column with at most this many values becomes the color of the series
+MAX_COLOR_GROUPS = 10
+
+# Checked in this order, the first chart type mentioned in the user input wins
+CHART_KEYWORDS = [
+    ("pie", r"\b(pie|donut|doughnut|torta|pastel)\b"),
+    ("histogram", r"\b(histogram|histograma|distribution|distribucion|distribución)\b"),
+    (
+        "scatter",
+        r"\b(scatter|dispersion|dispersión|correlation|correlacion|correlación)\b",
+    ),
+    (
+        "line",
+        r"\b(line|lines|linea|línea|trend|tendencia|over time|evolution|evolucion|evolución|timeline)\b",
+    ),
+    ("bar", r"\b(bar|bars|barra|barras|column chart)\b"),
+]
+
+
+@dataclass
+class ChartSpec:
+    kind: str
+    x: str = None
+    y: str = None
+    color: str = None
+    title: str = None
+
+
+def _column_kinds(data: pd.DataFrame) -> dict:
+    kinds = {"temporal": [], "numeric": [], "categorical": []}
+    for column in data.columns:
+        series = data[column]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            kinds["temporal"].append(column)
+        elif pd.api.types.is_bool_dtype(series):
+            kinds["categorical"].append(column)
+        elif pd.api.types.is_numeric_dtype(series):
+            kinds["numeric"].append(column)
+        elif (
+            series.dropna().map(lambda value: hasattr(value, "isoformat")).all()
+            and not series.dropna().empty
+        ):
+            # Snowflake DATE columns arrive as python date objects
+            kinds["temporal"].append(column)
+        else:
+            kinds["categorical"].append(column)
+    return kinds
+
+
+def _mentioned_first(columns: list, user_input: str) -> list:
+    # Columns whose name (or words of it) appear in the user input come first
+    text = user_input.lower()
+
+    def mentioned(column) -> bool:
+        words = [
+            word for word in re.split(r"[_\s]+", str(column).lower()) if len(word) > 2
+        ]
+        return str(column).lower() in text or any(word in text for word in words)
+
+    return sorted(columns, key=lambda column: not mentioned(column))
+
+
+def infer_chart_type(user_input: str):
+    for kind, pattern in CHART_KEYWORDS:
+        if re.search(pattern, user_input, re.IGNORECASE):
+            return kind
+    return None
+
+
+def infer_chart_spec(user_input: str, data: pd.DataFrame):
+    """Chart type and axes from the user text and the column dtypes, or None when it can't be inferred."""
+    if data is None or data.empty or len(data.columns) > 4:
+        return None
+
+    kinds = _column_kinds(data)
+    temporal = _mentioned_first(kinds["temporal"], user_input)
+    numeric = _mentioned_first(kinds["numeric"], user_input)
+    categorical = _mentioned_first(kinds["categorical"], user_input)
+    kind = infer_chart_type(user_input)
+
+    if kind is None:
+        if temporal and numeric:
+            kind = "line"
+        elif categorical and numeric:
+            kind = "bar"
+        elif len(numeric) == 1 and not categorical:
+            kind = "histogram"
+        else:
+            return None
+
+    def color(candidates: list):
+        groups = [
+            column
+            for column in candidates
+            if data[column].nunique() <= MAX_COLOR_GROUPS
+        ]
+        return groups[0] if groups else None
+
+    if kind == "line" and numeric and (temporal or len(numeric) >= 2):
+        x = temporal[0] if temporal else numeric[0]
+        y = numeric[0] if temporal else numeric[1]
+        return ChartSpec("line", x=x, y=y, color=color(categorical))
+    if kind in ("bar", "pie") and categorical and len(categorical) <= 2:
+        # Without a numeric column the chart shows the number of rows per category
+        y = numeric[0] if numeric else None
+        group = color(categorical[1:]) if kind == "bar" and y is not None else None
+        return ChartSpec(kind, x=categorical[0], y=y, color=group)
+    if kind == "bar" and temporal and numeric:
+        return ChartSpec("bar", x=temporal[0], y=numeric[0], color=color(categorical))
+    if kind == "scatter" and len(numeric) >= 2:
+        return ChartSpec("scatter", x=numeric[0], y=numeric[1])
+    if kind == "histogram" and (numeric or categorical):
+        return ChartSpec("histogram", x=(numeric or categorical)[0])
+    return None
+
+
+def build_figure(spec: ChartSpec, data: pd.DataFrame):
+    # The caller's spec is left as it was given
+    spec = replace(spec)
+    if spec.kind == "line":
+        return px.line(
+            data.sort_values(spec.x),
+            x=spec.x,
+            y=spec.y,
+            color=spec.color,
+            title=spec.title,
+        )
+    if spec.kind == "scatter":
+        return px.scatter(data, x=spec.x, y=spec.y, title=spec.title)
+    if spec.kind == "histogram":
+        return px.histogram(data, x=spec.x, title=spec.title)
+
+    if spec.y is None:
+        data = data[spec.x].value_counts().rename_axis(spec.x).reset_index(name="COUNT")
+        spec.y = "COUNT"
+    if spec.kind == "pie":
+        return px.pie(data, names=spec.x, values=spec.y, title=spec.title)
+    return px.bar(data, x=spec.x, y=spec.y, color=spec.color, title=spec.title)
+
+
+def truncation_note(result) -> str:
+    """Caption for a chart drawn from only the first chunk of a larger QueryResult, else None."""
+    if result.exhausted:
+        return None
+    if result.total_rows is not None:
+        return (
+            f"Chart shows the first {result.row_count:,} of {result.total_rows:,} rows."
+        )
+    return f"Chart shows the first {result.row_count:,} rows of the result."
+
+
+def try_build_chart(user_input: str, data: pd.DataFrame):
+    """Plotly figure built without the LLM, or None to fall back to ChartGeneratorLLMFromSQL."""
+    start = time.perf_counter()
+    spec = infer_chart_spec(user_input, data)
+    figure = build_figure(spec, data) if spec is not None else None
+    metrics.observe("chart_engine.latency", time.perf_counter() - start)
+    metrics.incr(
+        "chart_engine.fast_path" if figure is not None else "chart_engine.fallback"
+    )
+    return figure
+
+
+def exec_chart_code(chart: str, data: pd.DataFrame):
+    """Run Plotly code written by ChartGeneratorLLMFromSQL and return the `fig` it builds."""
+    # Remove the markdown code block formatting and fig.show()
+    code_to_exec = (
+        chart.replace("```python\n", "")
+        .replace("```", "")
+        .replace("fig.show()", "")
+        .strip()
+    )
+    logger.debug("Executing chart code:\n%s", code_to_exec)
+
+    # The generated code runs against the real dataframe, it only saw a digest of it
+    local_vars = {"df": data.copy()}
+    exec(code_to_exec, local_vars)
+    if "fig" not in local_vars:
+        raise KeyError("Plot object 'fig' not found in the executed code.")
+    return local_vars["fig"]
@@ -0,0 +1,81 @@
+# chart_snapshot.py
+import importlib.util
+import logging
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import plotly.graph_objects as go
+import plotly.io as pio
+
+from config import CHART_SNAPSHOT_IMAGES
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+IMAGE_WIDTH = 900
+IMAGE_HEIGHT = 500
+
+# Static images need kaleido, which is optional; without it only the figure JSON is kept
+HAS_KALEIDO = importlib.util.find_spec("kaleido") is not None
+
+# Kaleido renders one image at a time, off the script thread
+IMAGE_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chart-snapshot")
+
+
+class ChartSnapshot:
+    """
+    A finished chart as kept in the chat history: its minified figure JSON, compressed,
+    and a PNG rendered in the background when kaleido is installed.
+
+    The history shows the PNG and only rebuilds an interactive figure when asked, so a
+    rerun doesn't serialize every old chart to the browser again.
+    """
+
+    def __init__(
+        self,
+        fig: go.Figure,
+        original_points: int = None,
+        rendered_points: int = None,
+        note: str = None,
+        render_image: bool = CHART_SNAPSHOT_IMAGES and HAS_KALEIDO,
+    ):
+        self.id = uuid.uuid4().hex
+        self.original_points = original_points
+        self.rendered_points = rendered_points
+        # e.g. that the chart only shows the first chunk of the result
+        self.note = note
+        self._figure_json = zlib.compress(
+            pio.to_json(fig, validate=False, remove_uids=True).encode("utf-8")
+        )
+        self._image = (
+            IMAGE_EXECUTOR.submit(self._render_image, fig) if render_image else None
+        )
+        metrics.incr("chart_snapshot.json_bytes", len(self._figure_json))
+
+    @staticmethod
+    def _render_image(fig: go.Figure):
+        try:
+            with metrics.timer("chart_snapshot.image"):
+                return fig.to_image(
+                    format="png", width=IMAGE_WIDTH, height=IMAGE_HEIGHT
+                )
+        except Exception as e:
+            logger.warning("Chart snapshot image failed: %s", e)
+            return None
+
+    @property
+    def image(self):
+        """PNG bytes, or None while the image is being rendered or if there is none."""
+        if self._image is None or not self._image.done():
+            return None
+        return self._image.result()
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._figure_json) + len(self.image or b"")
+
+    def figure(self) -> go.Figure:
+        return pio.from_json(
+            zlib.decompress(self._figure_json).decode("utf-8"), skip_invalid=True
+        )
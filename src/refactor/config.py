@@ -1,15 +1,12 @@
 # config.py
 from dotenv import load_dotenv, find_dotenv
-from langchain.sql_database import SQLDatabase
+from functools import lru_cache
 import os
-import streamlit as st
 from snowflake.snowpark import Session
-from sqlalchemy.dialects import registry
 from snowflake.connector import connect, ProgrammingError
 
 
 load_dotenv(find_dotenv())
-registry.load('snowflake')
 
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 ACCOUNT = os.environ.get("ACCOUNT")
@@ -20,10 +17,98 @@ WAREHOUSE = os.environ.get("WAREHOUSE")
 ROLE = os.environ.get("ROLE")
 DATABASE = os.environ.get("DATABASE")
 
+# local caches (schema context, etc.)
+CACHE_DIR = os.environ.get("CACHE_DIR", ".cache")
+SCHEMA_VERSION_TTL_SECONDS = int(os.environ.get("SCHEMA_VERSION_TTL_SECONDS", 300))
+SQL_CACHE_TTL_SECONDS = int(os.environ.get("SQL_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+SQL_CACHE_MAX_ENTRIES = int(os.environ.get("SQL_CACHE_MAX_ENTRIES", 5000))
+SQL_CACHE_MEMORY_ENTRIES = int(os.environ.get("SQL_CACHE_MEMORY_ENTRIES", 256))
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("RESULT_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+CHART_CACHE_TTL_SECONDS = int(os.environ.get("CHART_CACHE_TTL_SECONDS", 30 * 24 * 3600))
+CHART_CACHE_MAX_ENTRIES = int(os.environ.get("CHART_CACHE_MAX_ENTRIES", 1000))
+# the greeting is generated once per schema fingerprint; GREETING_REFRESH_SECONDS > 0 also regenerates it
+# in the background on that interval
+GREETING_CACHE_TTL_SECONDS = int(os.environ.get("GREETING_CACHE_TTL_SECONDS", 30 * 24 * 3600))
+GREETING_REFRESH_SECONDS = int(os.environ.get("GREETING_REFRESH_SECONDS", 0))
+
+# schema context sent with the prompts: the variables most relevant to the question, within a token budget
+SCHEMA_CONTEXT_TOP_K = int(os.environ.get("SCHEMA_CONTEXT_TOP_K", 30))
+SCHEMA_CONTEXT_TOKEN_BUDGET = int(os.environ.get("SCHEMA_CONTEXT_TOKEN_BUDGET", 1500))
+# tables with up to this many columns always list every column
+SCHEMA_CONTEXT_MAX_COLUMNS = int(os.environ.get("SCHEMA_CONTEXT_MAX_COLUMNS", 80))
+
+# rows and bytes pulled from Snowflake per fetch of one query result
+RESULT_MAX_ROWS = int(os.environ.get("RESULT_MAX_ROWS", 10000))
+RESULT_MAX_BYTES = int(os.environ.get("RESULT_MAX_BYTES", 32 * 1024 * 1024))
+RESULT_PAGE_SIZE = int(os.environ.get("RESULT_PAGE_SIZE", 100))
+# query results kept in one browser session's chat history: bytes in memory before the oldest
+# ones are spilled to CACHE_DIR, and how many of the latest results are rendered on every rerun
+HISTORY_MEMORY_BYTES = int(os.environ.get("HISTORY_MEMORY_BYTES", 64 * 1024 * 1024))
+HISTORY_SPILL_TTL_SECONDS = int(os.environ.get("HISTORY_SPILL_TTL_SECONDS", 24 * 3600))
+HISTORY_RENDER_RECENT = int(os.environ.get("HISTORY_RENDER_RECENT", 3))
+
+# point budgets for the charts sent to the browser
+CHART_LINE_POINTS = int(os.environ.get("CHART_LINE_POINTS", 2000))
+CHART_SCATTER_POINTS = int(os.environ.get("CHART_SCATTER_POINTS", 5000))
+CHART_CATEGORY_LIMIT = int(os.environ.get("CHART_CATEGORY_LIMIT", 25))
+# charts in the chat history are shown as PNG snapshots when kaleido is installed (requirements-dev.txt, Dockerfile);
+# without it the history shows a "Show chart" checkbox that rebuilds the figure
+CHART_SNAPSHOT_IMAGES = os.environ.get("CHART_SNAPSHOT_IMAGES", "true").lower() == "true"
+
+# pipeline switches
+# "split" (InputEvaluatorLLM + QueryGeneratorLLM) or "combined" (one routed LLM call)
+PIPELINE_MODES = ("split", "combined")
+PIPELINE_MODE = os.environ.get("PIPELINE_MODE", "split")
+# "off", "on" or "auto": start QueryGeneratorLLM while InputEvaluatorLLM is still running ("split" mode).
+# "auto" speculates while at least SPECULATION_MIN_QUERY_RATE of the evaluated inputs are data questions
+SPECULATIVE_SQL = os.environ.get("SPECULATIVE_SQL", "off").lower()
+SPECULATION_MIN_QUERY_RATE = float(os.environ.get("SPECULATION_MIN_QUERY_RATE", 0.7))
+SPECULATION_WARMUP = int(os.environ.get("SPECULATION_WARMUP", 20))
+INPUT_PREFILTER_ENABLED = os.environ.get("INPUT_PREFILTER_ENABLED", "true").lower() == "true"
+SESSION_POOL_MIN_SIZE = int(os.environ.get("SESSION_POOL_MIN_SIZE", 1))
+SESSION_POOL_MAX_SIZE = int(os.environ.get("SESSION_POOL_MAX_SIZE", 4))
+SESSION_POOL_IDLE_TIMEOUT = int(os.environ.get("SESSION_POOL_IDLE_TIMEOUT", 30 * 60))
+SESSION_POOL_PING_INTERVAL = int(os.environ.get("SESSION_POOL_PING_INTERVAL", 5 * 60))
+# seconds a message waits for a free session before the user is told to try again
+SESSION_POOL_ACQUIRE_TIMEOUT = float(os.environ.get("SESSION_POOL_ACQUIRE_TIMEOUT", 30))
+# generated SQL is parsed and checked against the cached schema before it is sent to Snowflake;
+# after this many local rejections for one message the query is left for Snowflake to judge
+SQL_VALIDATION_ENABLED = os.environ.get("SQL_VALIDATION_ENABLED", "true").lower() == "true"
+SQL_VALIDATION_MAX_RETRIES = int(os.environ.get("SQL_VALIDATION_MAX_RETRIES", 2))
+# cost guard: EXPLAIN estimates what a generated query scans before it runs (0 disables a threshold)
+COST_GUARD_ENABLED = os.environ.get("COST_GUARD_ENABLED", "true").lower() == "true"
+COST_GUARD_CONFIRM_BYTES = int(os.environ.get("COST_GUARD_CONFIRM_BYTES", 5 * 1024 ** 3))
+COST_GUARD_REJECT_BYTES = int(os.environ.get("COST_GUARD_REJECT_BYTES", 50 * 1024 ** 3))
+COST_GUARD_CONFIRM_PARTITIONS = int(os.environ.get("COST_GUARD_CONFIRM_PARTITIONS", 0))
+COST_GUARD_REJECT_PARTITIONS = int(os.environ.get("COST_GUARD_REJECT_PARTITIONS", 0))
+STATEMENT_TIMEOUT_SECONDS = int(os.environ.get("STATEMENT_TIMEOUT_SECONDS", 120))
+# seconds an expensive query waits on the server for the user to run it anyway
+CONFIRMATION_TTL_SECONDS = int(os.environ.get("CONFIRMATION_TTL_SECONDS", 15 * 60))
+# each ```sql block of a streamed answer is validated, estimated and started as soon as it closes
+EARLY_SQL_DISPATCH = os.environ.get("EARLY_SQL_DISPATCH", "true").lower() == "true"
+MAX_CONCURRENT_QUERIES = int(os.environ.get("MAX_CONCURRENT_QUERIES", 4))
+# streamed answers are re-rendered at most once per interval (seconds) or when this many characters are waiting;
+# an interval of 0 renders every token
+STREAM_RENDER_INTERVAL = float(os.environ.get("STREAM_RENDER_INTERVAL", 0.1))
+STREAM_RENDER_MAX_PENDING = int(os.environ.get("STREAM_RENDER_MAX_PENDING", 2000))
+# rows of each query result sent by the HTTP API / Lambda handler, and rows per result_batch event
+API_RESULT_MAX_ROWS = int(os.environ.get("API_RESULT_MAX_ROWS", 1000))
+API_RESULT_BATCH_ROWS = int(os.environ.get("API_RESULT_BATCH_ROWS", 200))
+SHOW_METRICS = os.environ.get("SHOW_METRICS", "false").lower() == "true"
+
 
 # create connection:
 snowflake_url = f"snowflake://{USER}:{PASSWORD}@{ACCOUNT}/{DATABASE}/{SCHEMA}?warehouse={WAREHOUSE}&role={ROLE}"
-db = SQLDatabase.from_uri(snowflake_url)
+
+
+@lru_cache(maxsize=None)
+def get_db():
+    # SQLDatabase connects and reflects the schema, so it is only built when a chain needs it
+    from langchain.sql_database import SQLDatabase
+    from sqlalchemy.dialects import registry
+
+    registry.load('snowflake')
+    return SQLDatabase.from_uri(snowflake_url)
 
 
 global snowflake_session
@@ -38,7 +123,9 @@ def create_session():
             "role": ROLE,
             "warehouse": WAREHOUSE,
             "database": DATABASE,
-            "schema": SCHEMA
+            "schema": SCHEMA,
+            # Keeps pooled sessions from hitting "Authentication token has expired"
+            "client_session_keep_alive": True,
         }).create()
 
     except ProgrammingError as e:
@@ -50,7 +137,8 @@ def create_session():
                 "role": ROLE,
                 "warehouse": WAREHOUSE,
                 "database": DATABASE,
-                "schema": SCHEMA
+                "schema": SCHEMA,
+                "client_session_keep_alive": True,
             }).create()
         
         else:
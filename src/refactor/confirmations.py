@@ -0,0 +1,45 @@
+# confirmations.py
+import secrets
+
+from cache_store import TieredCache
+from config import CONFIRMATION_TTL_SECONDS
+from metrics import metrics
+
+
+class PendingConfirmations:
+    """
+    Expensive queries waiting for the user to run them anyway.
+
+    The SQL the pipeline produced stays on the server; clients only get an opaque,
+    single-use token, so a confirmation can never carry SQL of its own.
+    """
+
+    def __init__(self, store: TieredCache = None):
+        self.store = store or TieredCache(
+            "pending_confirmations",
+            ttl_seconds=CONFIRMATION_TTL_SECONDS,
+            max_memory_items=256,
+            max_disk_items=5000,
+        )
+
+    def add(self, user_input: str, sql_queries: list, include_chart: bool) -> str:
+        token = secrets.token_urlsafe(32)
+        confirmed = {
+            "user_input": user_input,
+            "sql_queries": list(sql_queries),
+            "include_chart": include_chart,
+        }
+        self.store.set(token, confirmed)
+        return token
+
+    def redeem(self, token: str):
+        """The confirmed request, or None when the token is unknown, expired or already used."""
+        if not isinstance(token, str) or not token:
+            return None
+        confirmed = self.store.get(token)
+        self.store.delete(token)
+        metrics.incr("confirmations.redeemed" if confirmed else "confirmations.invalid")
+        return confirmed
+
+
+pending_confirmations = PendingConfirmations()
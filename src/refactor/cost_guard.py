@@ -0,0 +1,126 @@
+# cost_guard.py
+import json
+import logging
+from dataclasses import dataclass
+
+from snowflake.snowpark import Session
+
+from config import (
+    COST_GUARD_CONFIRM_BYTES,
+    COST_GUARD_CONFIRM_PARTITIONS,
+    COST_GUARD_REJECT_BYTES,
+    COST_GUARD_REJECT_PARTITIONS,
+    STATEMENT_TIMEOUT_SECONDS,
+)
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+ALLOW = "allow"
+CONFIRM = "confirm"
+REJECT = "reject"
+
+
+def format_bytes(size: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+@dataclass
+class CostEstimate:
+    partitions_total: int
+    partitions_assigned: int
+    bytes_assigned: int
+
+    def describe(self) -> str:
+        return (
+            f"{format_bytes(self.bytes_assigned)} in {self.partitions_assigned:,} "
+            f"of {self.partitions_total:,} partitions"
+        )
+
+
+@dataclass
+class GuardDecision:
+    query: str
+    action: str
+    estimate: CostEstimate
+    reason: str = ""
+
+
+class CostGuard:
+    """
+    Estimates what a query would scan with EXPLAIN USING JSON (compile only, no
+    warehouse time) and decides whether it runs, needs a confirmation, or is rejected.
+    A threshold of 0 is disabled.
+    """
+
+    def __init__(
+        self,
+        confirm_bytes: int = COST_GUARD_CONFIRM_BYTES,
+        reject_bytes: int = COST_GUARD_REJECT_BYTES,
+        confirm_partitions: int = COST_GUARD_CONFIRM_PARTITIONS,
+        reject_partitions: int = COST_GUARD_REJECT_PARTITIONS,
+        timeout_seconds: int = STATEMENT_TIMEOUT_SECONDS,
+    ):
+        self.confirm_bytes = confirm_bytes
+        self.reject_bytes = reject_bytes
+        self.confirm_partitions = confirm_partitions
+        self.reject_partitions = reject_partitions
+        self.timeout_seconds = timeout_seconds
+
+    @staticmethod
+    def estimate(snowflake_session: Session, query: str) -> CostEstimate:
+        row = snowflake_session.sql(
+            f"EXPLAIN USING JSON {query.strip().rstrip(';')}"
+        ).collect()[0]
+        stats = json.loads(row[0]).get("GlobalStats", {})
+        return CostEstimate(
+            partitions_total=int(stats.get("partitionsTotal", 0)),
+            partitions_assigned=int(stats.get("partitionsAssigned", 0)),
+            bytes_assigned=int(stats.get("bytesAssigned", 0)),
+        )
+
+    def _exceeds(
+        self, estimate: CostEstimate, max_bytes: int, max_partitions: int
+    ) -> str:
+        if max_bytes and estimate.bytes_assigned > max_bytes:
+            return f"it would scan {estimate.describe()}, above the limit of {format_bytes(max_bytes)}"
+        if max_partitions and estimate.partitions_assigned > max_partitions:
+            return f"it would scan {estimate.describe()}, above the limit of {max_partitions:,} partitions"
+        return ""
+
+    def check(self, snowflake_session: Session, query: str) -> GuardDecision:
+        with metrics.timer("cost_guard.explain"):
+            estimate = self.estimate(snowflake_session, query)
+
+        action, reason = ALLOW, ""
+        if reason := self._exceeds(estimate, self.reject_bytes, self.reject_partitions):
+            action = REJECT
+        elif reason := self._exceeds(
+            estimate, self.confirm_bytes, self.confirm_partitions
+        ):
+            action = CONFIRM
+
+        metrics.incr(f"cost_guard.{action}")
+        log = logger.info if action == ALLOW else logger.warning
+        log(
+            "Cost guard %s (%s): %s",
+            action,
+            estimate.describe(),
+            " ".join(query.split()),
+        )
+        return GuardDecision(
+            query=query, action=action, estimate=estimate, reason=reason
+        )
+
+    def statement_params(self) -> dict:
+        # Snowflake cancels the statement server-side once it runs longer than this
+        if not self.timeout_seconds:
+            return {}
+        return {"STATEMENT_TIMEOUT_IN_SECONDS": str(self.timeout_seconds)}
+
+
+cost_guard = CostGuard()
@@ -0,0 +1,67 @@
+# data_digest.py
+import pandas as pd
+
+SAMPLE_ROWS = 5
+TOP_VALUES = 5
+MAX_COLUMNS = 50
+MAX_VALUE_LENGTH = 40
+
+
+def _short(value) -> str:
+    text = str(value)
+    return (
+        text if len(text) <= MAX_VALUE_LENGTH else text[: MAX_VALUE_LENGTH - 3] + "..."
+    )
+
+
+def _column_stats(series: pd.Series) -> str:
+    nulls = int(series.isna().sum())
+    non_null = series.dropna()
+    if non_null.empty:
+        return f"all {nulls} values are null"
+
+    if pd.api.types.is_bool_dtype(series):
+        counts = non_null.value_counts()
+        stats = ", ".join(f"{value}: {count}" for value, count in counts.items())
+    elif pd.api.types.is_numeric_dtype(series):
+        stats = (
+            f"min {non_null.min()}, max {non_null.max()}, mean {non_null.mean():.4g}"
+        )
+    elif pd.api.types.is_datetime64_any_dtype(series):
+        stats = f"from {non_null.min()} to {non_null.max()}"
+    else:
+        counts = non_null.astype(str).value_counts()
+        top = ", ".join(
+            f"{_short(value)} ({count})"
+            for value, count in counts.head(TOP_VALUES).items()
+        )
+        stats = f"{len(counts)} distinct values, most frequent: {top}"
+
+    return f"{stats}, {nulls} nulls" if nulls else stats
+
+
+def build_data_digest(data: pd.DataFrame, total_rows: int = None) -> str:
+    """
+    Describe a query result in a few hundred tokens: schema, row count, a small
+    sample and per-column stats. The prompt size no longer depends on the number of rows.
+    """
+    columns = list(data.columns)[:MAX_COLUMNS]
+    row_count = f"{len(data):,}"
+    if total_rows is not None and total_rows > len(data):
+        row_count += f" (the first {len(data):,} of {total_rows:,} rows are loaded)"
+
+    lines = [f"Row count: {row_count}", "", "Columns (name: dtype -- stats):"]
+    for column in columns:
+        lines.append(
+            f"- {column}: {data[column].dtype} -- {_column_stats(data[column])}"
+        )
+    if len(data.columns) > MAX_COLUMNS:
+        lines.append(f"- ... and {len(data.columns) - MAX_COLUMNS} more columns")
+
+    sample = data[columns].head(SAMPLE_ROWS).apply(lambda column: column.map(_short))
+    lines += [
+        "",
+        f"First {len(sample)} rows (CSV):",
+        sample.to_csv(index=False).strip(),
+    ]
+    return "\n".join(lines)
@@ -0,0 +1,335 @@
+# downsampling.py
+import warnings
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from config import CHART_CATEGORY_LIMIT, CHART_LINE_POINTS, CHART_SCATTER_POINTS
+from metrics import metrics
+
+OTHER_LABEL = "Other"
+
+# Per-point arrays that must follow the x/y arrays when points are selected
+POINT_ATTRIBUTES = ("x", "y", "text", "hovertext", "customdata")
+
+
+def _as_numeric(values) -> np.ndarray:
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype("datetime64[ns]").astype(np.int64).astype(float)
+    if np.issubdtype(values.dtype, np.number):
+        return values.astype(float)
+    try:
+        with warnings.catch_warnings():
+            # Category labels are tried as dates first; pandas warns on every label it can't parse
+            warnings.simplefilter("ignore", UserWarning)
+            return (
+                pd.to_datetime(pd.Series(values)).astype(np.int64).to_numpy(dtype=float)
+            )
+    except (TypeError, ValueError):
+        return pd.to_numeric(pd.Series(values), errors="raise").to_numpy(dtype=float)
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: indices of `threshold` points that keep the visual shape of a line."""
+    length = len(x)
+    if threshold >= length or threshold < 3:
+        return np.arange(length)
+
+    y = np.nan_to_num(y)
+    bucket_size = (length - 2) / (threshold - 2)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0], indices[-1] = 0, length - 1
+
+    selected = 0
+    for bucket in range(threshold - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+        next_end = min(int((bucket + 2) * bucket_size) + 1, length)
+        # The third vertex is the average of the next bucket (the last point for the last bucket)
+        if end < next_end:
+            average_x, average_y = x[end:next_end].mean(), y[end:next_end].mean()
+        else:
+            average_x, average_y = x[-1], y[-1]
+
+        areas = np.abs(
+            (x[selected] - average_x) * (y[start:end] - y[selected])
+            - (x[selected] - x[start:end]) * (average_y - y[selected])
+        )
+        selected = start + int(np.argmax(areas))
+        indices[bucket + 1] = selected
+    return indices
+
+
+def binned_scatter(x: np.ndarray, y: np.ndarray, max_bins: int):
+    """Aggregate points into a grid of at most `max_bins` cells: cell centroids and point counts."""
+    side = max(int(np.sqrt(max_bins)), 1)
+
+    def cell(values):
+        low, high = values.min(), values.max()
+        scaled = (values - low) / (high - low) if high > low else np.zeros_like(values)
+        return np.clip((scaled * side).astype(np.int64), 0, side - 1)
+
+    valid = ~(np.isnan(x) | np.isnan(y))
+    x, y = x[valid], y[valid]
+    if not len(x):
+        return x, y, np.zeros(0, dtype=np.int64)
+
+    cells = cell(x) * side + cell(y)
+    counts = np.bincount(cells, minlength=side * side)
+    occupied = counts > 0
+    centroid_x = (
+        np.bincount(cells, weights=x, minlength=side * side)[occupied]
+        / counts[occupied]
+    )
+    centroid_y = (
+        np.bincount(cells, weights=y, minlength=side * side)[occupied]
+        / counts[occupied]
+    )
+    return centroid_x, centroid_y, counts[occupied]
+
+
+def category_totals(labels, values) -> pd.Series:
+    values = np.ones(len(labels)) if values is None else np.asarray(values, dtype=float)
+    index = pd.Index([str(label) for label in labels])
+    return pd.Series(values, index=index).groupby(level=0, sort=False).sum()
+
+
+def top_n_with_other(labels, values, limit: int, keep: set = None):
+    """Sum values per label, keep the `limit - 1` largest labels (or `keep`) and fold the rest into "Other"."""
+    totals = category_totals(labels, values)
+    if keep is None:
+        if len(totals) <= limit:
+            return list(totals.index), list(totals.values)
+        keep = set(totals.sort_values(ascending=False).index[: limit - 1])
+
+    kept = totals[totals.index.isin(keep)]
+    rest = totals[~totals.index.isin(keep)]
+    if rest.empty:
+        return list(kept.index), list(kept.values)
+    return list(kept.index) + [OTHER_LABEL], list(kept.values) + [rest.sum()]
+
+
+def _point_count(trace) -> int:
+    for attribute in ("x", "y", "labels", "values"):
+        values = getattr(trace, attribute, None)
+        if values is not None:
+            return len(values)
+    return 0
+
+
+def _clear_marker_arrays(trace):
+    # Per-point marker sizes/colors no longer match once points are aggregated
+    marker = getattr(trace, "marker", None)
+    if marker is None:
+        return
+    for attribute in ("size", "color"):
+        value = getattr(marker, attribute, None)
+        if value is not None and not isinstance(value, str) and not np.isscalar(value):
+            setattr(marker, attribute, None)
+
+
+def _select_points(trace, indices: np.ndarray):
+    length = _point_count(trace)
+    for attribute in POINT_ATTRIBUTES:
+        values = getattr(trace, attribute, None)
+        if values is not None and not isinstance(values, str) and len(values) == length:
+            setattr(trace, attribute, np.asarray(values)[indices])
+    marker = getattr(trace, "marker", None)
+    for attribute in ("size", "color"):
+        value = getattr(marker, attribute, None) if marker is not None else None
+        if (
+            value is not None
+            and not isinstance(value, str)
+            and not np.isscalar(value)
+            and len(value) == length
+        ):
+            setattr(marker, attribute, np.asarray(value)[indices])
+
+
+def _downsample_scatter(trace, line_points: int, scatter_points: int):
+    if (
+        trace.x is None
+        or trace.y is None
+        or len(trace.x) <= min(line_points, scatter_points)
+    ):
+        return
+    try:
+        x, y = _as_numeric(trace.x), _as_numeric(trace.y)
+    except (TypeError, ValueError):
+        # Categorical axis: keep evenly spaced points
+        _select_points(
+            trace, np.linspace(0, len(trace.x) - 1, line_points).astype(np.int64)
+        )
+        return
+
+    if "lines" in (trace.mode or "lines"):
+        if len(x) <= line_points:
+            return
+        ordered = bool(np.all(np.diff(x) >= 0))
+        indices = (
+            lttb_indices(x, y, line_points)
+            if ordered
+            else np.linspace(0, len(x) - 1, line_points).astype(np.int64)
+        )
+        _select_points(trace, indices)
+    elif len(x) > scatter_points:
+        centroid_x, centroid_y, counts = binned_scatter(x, y, scatter_points)
+        for attribute in POINT_ATTRIBUTES:
+            setattr(trace, attribute, None)
+        trace.x, trace.y = centroid_x, centroid_y
+        trace.hovertext = [f"{count} points" for count in counts]
+        _clear_marker_arrays(trace)
+
+
+def _bar_axes(trace):
+    return ("y", "x") if trace.orientation == "h" else ("x", "y")
+
+
+def _is_categorical(values, axis_type=None) -> bool:
+    if axis_type == "category":
+        return True
+    try:
+        _as_numeric(values)
+    except (TypeError, ValueError):
+        return True
+    return False
+
+
+def _downsample_continuous_bars(trace, max_bars: int):
+    # Dates and numbers keep their axis: LTTB on the bar heights, in axis order
+    category_axis, value_axis = _bar_axes(trace)
+    positions = _as_numeric(getattr(trace, category_axis))
+    if len(positions) <= max_bars:
+        return
+    order = np.argsort(positions, kind="stable")
+    heights = _as_numeric(getattr(trace, value_axis))[order]
+    _select_points(trace, order[lttb_indices(positions[order], heights, max_bars)])
+
+
+def _downsample_bars(traces: list, limit: int):
+    # Every bar trace keeps the same categories, so grouped/stacked bars stay aligned
+    totals = pd.Series(dtype=float)
+    for trace in traces:
+        category_axis, value_axis = _bar_axes(trace)
+        trace_totals = category_totals(
+            getattr(trace, category_axis), getattr(trace, value_axis)
+        )
+        totals = totals.add(trace_totals, fill_value=0)
+    if len(totals) <= limit:
+        return
+    keep = set(totals.abs().sort_values(ascending=False).index[: limit - 1])
+
+    for trace in traces:
+        category_axis, value_axis = _bar_axes(trace)
+        labels, values = top_n_with_other(
+            getattr(trace, category_axis), getattr(trace, value_axis), limit, keep
+        )
+        for attribute in POINT_ATTRIBUTES:
+            setattr(trace, attribute, None)
+        setattr(trace, category_axis, labels)
+        setattr(trace, value_axis, values)
+        _clear_marker_arrays(trace)
+
+
+def _histogram_as_bars(trace, max_bins: int):
+    horizontal = trace.x is None
+    values = _as_numeric(trace.y if horizontal else trace.x)
+    values = values[~np.isnan(values)]
+    bins = (trace.nbinsy if horizontal else trace.nbinsx) or min(
+        max_bins, max(int(np.sqrt(len(values))), 1)
+    )
+    counts, edges = np.histogram(values, bins=bins)
+    centers = (edges[:-1] + edges[1:]) / 2
+    return go.Bar(
+        x=counts if horizontal else centers,
+        y=centers if horizontal else counts,
+        width=np.diff(edges),
+        orientation="h" if horizontal else "v",
+        name=trace.name,
+        marker=trace.marker.to_plotly_json(),
+        legendgroup=trace.legendgroup,
+        showlegend=trace.showlegend,
+    )
+
+
+def _counts_only(trace) -> bool:
+    # Histograms of one variable; sums or averages of a second one are left to plotly.js
+    return (trace.x is None) != (trace.y is None) and (
+        trace.histfunc or "count"
+    ) == "count"
+
+
+def downsample_figure(
+    fig: go.Figure,
+    line_points: int = CHART_LINE_POINTS,
+    scatter_points: int = CHART_SCATTER_POINTS,
+    category_limit: int = CHART_CATEGORY_LIMIT,
+):
+    """
+    Shrink the figure before it is sent to the browser: LTTB for lines and for bars over
+    dates or numbers, binned aggregation for scatter plots, top-N plus "Other" for
+    categorical bars and pies, and pre-binned histograms.
+
+    Returns the figure with the original and the rendered number of points.
+    """
+    original_points = sum(_point_count(trace) for trace in fig.data)
+    traces = list(fig.data)
+    # Point budgets are shared by every trace of the figure
+    share = max(len(traces), 1)
+
+    for index, trace in enumerate(traces):
+        if trace.type in ("scatter", "scattergl"):
+            _downsample_scatter(
+                trace, max(line_points // share, 3), max(scatter_points // share, 1)
+            )
+        elif (
+            trace.type == "pie"
+            and trace.labels is not None
+            and len(trace.labels) > category_limit
+        ):
+            labels, values = top_n_with_other(
+                trace.labels, trace.values, category_limit
+            )
+            trace.labels, trace.values = labels, values
+            trace.text = trace.hovertext = trace.customdata = None
+            _clear_marker_arrays(trace)
+        elif (
+            trace.type == "histogram"
+            and _point_count(trace) > scatter_points
+            and _counts_only(trace)
+        ):
+            try:
+                traces[index] = _histogram_as_bars(trace, category_limit)
+            except (TypeError, ValueError):
+                pass
+
+    bars = [
+        trace
+        for trace in traces
+        if trace.type == "bar" and trace.x is not None and trace.y is not None
+    ]
+    categorical = []
+    for trace in bars:
+        category_axis, _ = _bar_axes(trace)
+        axis_type = (
+            fig.layout.yaxis if category_axis == "y" else fig.layout.xaxis
+        ).type
+        if _is_categorical(getattr(trace, category_axis), axis_type):
+            categorical.append(trace)
+        else:
+            _downsample_continuous_bars(trace, max(line_points // share, 3))
+    if categorical:
+        try:
+            _downsample_bars(categorical, category_limit)
+        except (TypeError, ValueError):
+            pass
+
+    if any(trace is not original for trace, original in zip(traces, fig.data)):
+        fig = go.Figure(data=traces, layout=fig.layout)
+
+    rendered_points = sum(_point_count(trace) for trace in fig.data)
+    metrics.incr("downsampling.original_points", original_points)
+    metrics.incr("downsampling.rendered_points", rendered_points)
+    return fig, original_points, rendered_points
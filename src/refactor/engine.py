@@ -0,0 +1,113 @@
+# engine.py
+import json
+from functools import lru_cache
+
+import plotly.io as pio
+
+from async_app_logic import AsyncAppLogic
+from config import API_RESULT_BATCH_ROWS, API_RESULT_MAX_ROWS, PIPELINE_MODE
+from event_loop import iterate_async
+from events import CHART, MESSAGE, RESULT, RESULT_BATCH, Event
+from greeting_cache import greeting_cache
+from session_pool import SessionPool
+
+
+def _rows(frame) -> list:
+    # pandas' encoder handles timestamps, decimals and NaN
+    return json.loads(frame.to_json(orient="values", date_format="iso"))
+
+
+def serialize_event(
+    event: Event,
+    max_rows: int = API_RESULT_MAX_ROWS,
+    batch_rows: int = API_RESULT_BATCH_ROWS,
+) -> list:
+    """JSON-ready payloads for one pipeline event; a query result becomes a header and its row batches."""
+    if event.type == RESULT:
+        result = event.data
+        frame = result.rows(0, max_rows)
+        header = {
+            "type": RESULT,
+            "index": event.index,
+            "query": result.query,
+            # RESULT_SCAN handle for the rows past max_rows
+            "query_id": result.query_id,
+            "total_rows": result.total_rows,
+            "columns": [str(column) for column in frame.columns],
+        }
+        batches = [
+            {
+                "type": RESULT_BATCH,
+                "index": event.index,
+                "offset": start,
+                "rows": _rows(frame.iloc[start : start + batch_rows]),
+            }
+            for start in range(0, len(frame), batch_rows)
+        ]
+        return [header, *batches]
+
+    if event.type == CHART:
+        fig, original_points, rendered_points, note = event.data
+        return [
+            {
+                "type": CHART,
+                "figure": json.loads(pio.to_json(fig, validate=False)),
+                "original_points": original_points,
+                "rendered_points": rendered_points,
+                "note": note,
+            }
+        ]
+
+    if event.type == MESSAGE:
+        # Results and charts were already sent with their own events
+        message = event.data
+        if not isinstance(message.get("content"), str):
+            return []
+        payload = {
+            "type": MESSAGE,
+            "role": message["role"],
+            "content": message["content"],
+        }
+        if "confirm" in message:
+            payload["confirm"] = message["confirm"]
+        return [payload]
+
+    payload = {"type": event.type, "data": event.data}
+    if event.index is not None:
+        payload["index"] = event.index
+    return [payload]
+
+
+class ChatEngine:
+    """
+    The chat pipeline without a UI: one user message in, JSON-ready events out.
+
+    Streamlit renders the same AsyncAppLogic events itself (AppLogic); the HTTP API
+    (api.py) and the Lambda handler (lambda_handler.py) go through this class, with their
+    own session pool, so they can be scaled separately from the UI.
+    """
+
+    def __init__(
+        self, pipeline_mode: str = PIPELINE_MODE, session_pool: SessionPool = None
+    ):
+        self.session_pool = session_pool or SessionPool()
+        self.pipeline = AsyncAppLogic(pipeline_mode, self.session_pool)
+
+    async def stream(self, message: str, confirm_token: str = None):
+        """`confirm_token` is the "confirm" token of an earlier message event, to run its expensive queries anyway."""
+        async for event in self.pipeline.handle_input(message, confirm_token):
+            for payload in serialize_event(event):
+                yield payload
+
+    def run(self, message: str, confirm_token: str = None) -> list:
+        """Every event of one message, for callers without an event loop."""
+        return list(iterate_async(self.stream(message, confirm_token)))
+
+    def greeting(self) -> str:
+        return greeting_cache.get_or_generate_pooled(self.session_pool)
+
+
+@lru_cache(maxsize=None)
+def get_engine() -> ChatEngine:
+    # One engine and session pool per API worker or warm Lambda container
+    return ChatEngine()
@@ -0,0 +1,56 @@
+# event_loop.py
+import asyncio
+import queue
+import threading
+
+_loop = None
+_lock = threading.Lock()
+
+_DONE = object()
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """The process-wide event loop, running in a daemon thread and shared by every conversation."""
+    global _loop
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_loop.run_forever, name="pipeline-event-loop", daemon=True
+            ).start()
+        return _loop
+
+
+def iterate_async(async_iterable):
+    """
+    Iterate an async generator from a synchronous thread (e.g. the Streamlit script thread).
+    Items are produced on the shared loop; stopping the iteration early cancels the generator.
+    """
+    items = queue.Queue()
+
+    async def pump():
+        error = None
+        try:
+            async for item in async_iterable:
+                items.put((item, None))
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            # Close the generator now so its cleanup (cancelling queries, releasing sessions) runs
+            if hasattr(async_iterable, "aclose"):
+                await async_iterable.aclose()
+            items.put((_DONE, error))
+
+    future = asyncio.run_coroutine_threadsafe(pump(), get_event_loop())
+    try:
+        while True:
+            item, error = items.get()
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        # e.g. Streamlit stopped the script for a rerun: don't leave queries running
+        future.cancel()
@@ -0,0 +1,31 @@
+# events.py
+from dataclasses import dataclass
+
+# Transient progress text; None clears it
+STATUS = "status"
+INFO = "info"
+WARNING = "warning"
+ERROR = "error"
+# A new streamed answer starts; the following TOKEN events are appended to it
+STREAM_START = "stream_start"
+TOKEN = "token"
+# SQL shown as markdown without being streamed (cached or routed queries)
+SQL = "sql"
+QUERY_STARTED = "query_started"
+RESULT = "result"
+# Serialized output only (engine.py): the rows of a RESULT, in order
+RESULT_BATCH = "result_batch"
+# The running batch failed; results shown for it so far are withdrawn
+QUERIES_CANCELLED = "queries_cancelled"
+# (figure, original points, rendered points, note); the note says when only the first rows are charted
+CHART = "chart"
+# An entry for the chat history
+MESSAGE = "message"
+
+
+@dataclass
+class Event:
+    type: str
+    data: object = None
+    # Position of the query in a multi-query answer, for QUERY_STARTED and RESULT
+    index: int = None
@@ -0,0 +1,103 @@
+# greeting_cache.py
+import hashlib
+import logging
+import threading
+import time
+
+from snowflake.snowpark import Session
+
+from cache_store import TieredCache
+from config import GREETING_CACHE_TTL_SECONDS
+from llm.clients import MODEL
+from llm.system_generator import SYSTEM_TEMPLATE, SystemGeneratorLLM
+from metrics import metrics
+from schema_context import schema_context_cache
+from session_pool import SessionPool
+
+logger = logging.getLogger(__name__)
+
+
+class GreetingCache:
+    """
+    SystemGeneratorLLM greeting per schema fingerprint.
+
+    Every new browser session gets the same introduction and example questions until
+    the table changes, so they are generated once and kept on disk across restarts.
+    """
+
+    def __init__(self, store: TieredCache = None):
+        self.store = store or TieredCache(
+            "greeting_cache",
+            ttl_seconds=GREETING_CACHE_TTL_SECONDS,
+            max_memory_items=8,
+            max_disk_items=64,
+        )
+        # Held for a whole generation; start_refresher runs on every rerun and must not wait for one
+        self._lock = threading.Lock()
+        self._refresher_lock = threading.Lock()
+        self._refresher = None
+
+    @staticmethod
+    def _key(fingerprint: str) -> str:
+        # A new prompt or model makes a new greeting too
+        return hashlib.sha256(
+            f"{fingerprint}|{MODEL}|{SYSTEM_TEMPLATE}".encode("utf-8")
+        ).hexdigest()
+
+    def generate(self, snowflake_session: Session, container=None) -> str:
+        key = self._key(schema_context_cache.get_fingerprint(snowflake_session))
+        with metrics.timer("greeting.generate"):
+            greeting = SystemGeneratorLLM(
+                _snowflake_session=snowflake_session
+            ).generate_response(container)
+        if greeting:
+            self.store.set(key, greeting)
+        return greeting
+
+    def get_or_generate(self, snowflake_session: Session, container=None) -> str:
+        """The cached greeting; on a miss it is generated (streamed into `container` if given) and stored."""
+        key = self._key(schema_context_cache.get_fingerprint(snowflake_session))
+        greeting = self.store.get(key)
+        metrics.incr("greeting_cache.hit" if greeting else "greeting_cache.miss")
+        if greeting:
+            return greeting
+
+        # Sessions opened together wait for one generation instead of each paying for their own
+        with self._lock:
+            greeting = self.store.get(key)
+            if greeting:
+                return greeting
+            return self.generate(snowflake_session, container)
+
+    def get_or_generate_pooled(self, session_pool: SessionPool, container=None) -> str:
+        """get_or_generate with a session leased only to check the schema, not for the LLM call."""
+        with session_pool.session() as session:
+            schema_context_cache.get_snapshot(session)
+        return self.get_or_generate(None, container)
+
+    def start_refresher(self, session_pool: SessionPool, interval: float):
+        """Regenerate the greeting every `interval` seconds in a daemon thread, once per process."""
+        with self._refresher_lock:
+            if self._refresher is not None or interval <= 0:
+                return
+            self._refresher = threading.Thread(
+                target=self._refresh_forever,
+                args=(session_pool, interval),
+                name="greeting-refresher",
+                daemon=True,
+            )
+        self._refresher.start()
+
+    def _refresh_forever(self, session_pool: SessionPool, interval: float):
+        while True:
+            time.sleep(interval)
+            try:
+                with session_pool.session() as session:
+                    schema_context_cache.get_snapshot(session)
+                self.generate(None)
+                metrics.incr("greeting_cache.refreshed")
+            except Exception as e:
+                logger.warning("Greeting refresh failed: %s", e)
+
+
+greeting_cache = GreetingCache()
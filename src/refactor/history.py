@@ -0,0 +1,90 @@
+# history.py
+import logging
+import os
+import shutil
+import time
+import uuid
+
+from config import CACHE_DIR, HISTORY_MEMORY_BYTES, HISTORY_SPILL_TTL_SECONDS
+from metrics import metrics
+from query_results import QueryResult
+
+logger = logging.getLogger(__name__)
+
+
+class HistoryStore:
+    """
+    Keeps the query results of one browser session's chat history within a memory budget.
+
+    Results are compacted (Arrow, downcast dtypes) once their message is in the history.
+    When the session holds more than `memory_budget` bytes, the oldest results are spilled
+    to Arrow files under CACHE_DIR/history/<session> and memory-mapped back for the pages
+    that are viewed again.
+    """
+
+    def __init__(
+        self, memory_budget: int = HISTORY_MEMORY_BYTES, cache_dir: str = CACHE_DIR
+    ):
+        self.memory_budget = memory_budget
+        self.root = os.path.join(cache_dir, "history")
+        self.directory = os.path.join(self.root, uuid.uuid4().hex)
+        self._results = []
+        self._prune()
+
+    def track(self, messages: list):
+        """Compact the results of messages added since the last call, then enforce the budget."""
+        tracked = {result.id for result in self._results}
+        for message in messages:
+            result = message.get("results")
+            if isinstance(result, QueryResult) and result.id not in tracked:
+                self._results.append(result)
+                tracked.add(result.id)
+        self._enforce_budget()
+
+    def account(self, result: QueryResult):
+        """
+        Called after a page of a tracked result was read: pulling more batches re-inflates a
+        compacted or spilled result into a DataFrame, and RESULT_SCAN pages add to its memory.
+        """
+        if any(tracked is result for tracked in self._results):
+            self._enforce_budget()
+
+    def _enforce_budget(self):
+        for result in self._results:
+            # New results, and results that paging re-inflated, go back to their compact form
+            if not result.compacted:
+                result.compact()
+
+        in_memory = [result for result in self._results if result.spill_path is None]
+        used = sum(result.memory_bytes for result in self._results)
+        # Oldest first; the latest result always stays in memory
+        for result in in_memory[:-1]:
+            if used <= self.memory_budget:
+                break
+            before = result.memory_bytes
+            result.remote_pages.clear()
+            result.spill(os.path.join(self.directory, f"{result.id}.arrow"))
+            used -= before - result.memory_bytes
+        metrics.observe("history.memory_bytes", used)
+
+    def stats(self) -> dict:
+        return {
+            "results": len(self._results),
+            "spilled": sum(
+                1 for result in self._results if result.spill_path is not None
+            ),
+            "memory_bytes": sum(result.memory_bytes for result in self._results),
+        }
+
+    def _prune(self):
+        # Spill directories of sessions that ended (or of a previous container run)
+        if not os.path.isdir(self.root):
+            return
+        cutoff = time.time() - HISTORY_SPILL_TTL_SECONDS
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    shutil.rmtree(path, ignore_errors=True)
+            except OSError as e:
+                logger.debug("Could not prune %s: %s", path, e)
@@ -0,0 +1,161 @@
+# input_prefilter.py
+import logging
+import math
+import re
+import time
+from collections import Counter
+
+from metrics import metrics
+from parsers import InputEvaluator
+
+logger = logging.getLogger(__name__)
+
+
+# Whole-message small talk (english and spanish): these never need SQL
+SMALL_TALK = re.compile(
+    r"^(hi|hello|hey|hola|buenas|buen dia|buenos dias|buenas tardes|buenas noches|"
+    r"good (morning|afternoon|evening)|thanks|thank you( very much)?|thx|gracias|muchas gracias|"
+    r"bye|goodbye|adios|chau|see you|ok|okay|cool|great|perfect|nice|genial|perfecto|"
+    r"how are you|como estas|are you there|nice to meet you)"
+    r"([\s,!.?]+(there|again|so much|a lot|bot|catapult( health)?( bot)?|how are you|como estas|"
+    r"nice to meet you|are you there|for your help|por tu ayuda))*[\s,!.?:)]*$",
+    re.IGNORECASE,
+)
+
+CHART_WORDS = re.compile(
+    r"\b(chart|graph|plot|pie|histogram|visuali[sz]e|visuali[sz]ation|grafico|gráfico|grafica|gráfica|diagram)\b",
+    re.IGNORECASE,
+)
+
+QUERY_INTENT = re.compile(
+    r"^\s*(how many|how much|list|show|give me|count|what (is|are) the (number|total|average|percentage|count)|"
+    r"which (patients|companies|employees)|cuantos|cuántos|cuantas|cuántas|lista|muestra|dame)\b",
+    re.IGNORECASE,
+)
+
+FEW_SHOT = re.compile(
+    r"User input: (?P<text>.+)\n"
+    r"Your response: is_a_query = (?P<is_a_query>True|False), "
+    r"include_chart = (?P<include_chart>True|False), "
+    r"simple_answer = (?P<simple_answer>True|False)"
+)
+
+BULLET = re.compile(r"^- (?P<text>.+)$", re.MULTILINE)
+
+# A few more labelled phrases so the lexical model isn't trained on 8 lines only
+EXTRA_EXAMPLES = [
+    ("Good morning!", False),
+    ("Thanks for your help", False),
+    ("Gracias por tu ayuda", False),
+    ("Hola, como estas?", False),
+    ("How many patients completed their consult?", True),
+    ("List the patients of Company One", True),
+    ("Show me a bar chart of patients by company", True),
+    ("What is the average age of patients?", True),
+    ("Cuantos pacientes hay por empresa?", True),
+]
+
+
+def tokenize(text: str) -> list:
+    words = re.findall(r"[a-záéíóúñü0-9']+", text.lower())
+    return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+
+class NaiveBayes:
+    """Two-class multinomial naive Bayes over unigrams and bigrams, with add-one smoothing."""
+
+    def __init__(self, examples: list):
+        self.counts = {True: Counter(), False: Counter()}
+        self.docs = Counter()
+        for text, label in examples:
+            self.counts[label].update(tokenize(text))
+            self.docs[label] += 1
+        self.vocabulary = set(self.counts[True]) | set(self.counts[False])
+        self.totals = {
+            label: sum(counter.values()) for label, counter in self.counts.items()
+        }
+
+    def predict_proba(self, text: str) -> float:
+        # Probability that the text is a data question
+        log_scores = {}
+        total_docs = sum(self.docs.values())
+        for label in (True, False):
+            score = math.log((self.docs[label] + 1) / (total_docs + 2))
+            denominator = self.totals[label] + len(self.vocabulary) + 1
+            for token in tokenize(text):
+                if token in self.vocabulary:
+                    score += math.log((self.counts[label][token] + 1) / denominator)
+            log_scores[label] = score
+        delta = log_scores[False] - log_scores[True]
+        return 1.0 / (1.0 + math.exp(min(delta, 700)))
+
+
+class InputPrefilter:
+    """
+    Local, zero-LLM classifier that answers obvious inputs before InputEvaluatorLLM.
+
+    Small talk is recognised by rules. Data questions need both a query-intent rule
+    and a confident lexical model. Everything else returns None so the caller asks
+    the LLM.
+    """
+
+    def __init__(self, examples: list, threshold: float = 0.9):
+        self.model = NaiveBayes(examples)
+        self.threshold = threshold
+
+    @classmethod
+    def from_template(
+        cls, system_template: str, threshold: float = 0.9
+    ) -> "InputPrefilter":
+        examples = [
+            (match.group("text").strip(), match.group("is_a_query") == "True")
+            for match in FEW_SHOT.finditer(system_template)
+        ]
+        # Bullet list of greetings given before the few-shot examples
+        examples += [
+            (match.group("text").strip(), False)
+            for match in BULLET.finditer(system_template)
+        ]
+        return cls(examples + EXTRA_EXAMPLES, threshold=threshold)
+
+    def classify(self, user_input: str):
+        start = time.perf_counter()
+        evaluation = self._classify(user_input.strip())
+        metrics.observe("input_prefilter.latency", time.perf_counter() - start)
+
+        if evaluation is None:
+            metrics.incr("input_prefilter.miss")
+        else:
+            metrics.incr("input_prefilter.hit")
+            # Each hit saves one InputEvaluatorLLM round-trip
+            metrics.incr(
+                "input_prefilter.saved_seconds", metrics.mean("input_evaluator.llm")
+            )
+        logger.info("Input prefilter: %s", self.report())
+        return evaluation
+
+    def _classify(self, text: str):
+        if not text:
+            return None
+        if SMALL_TALK.match(text):
+            return InputEvaluator(
+                is_a_query=False, include_chart=False, simple_answer=True
+            )
+        if (
+            QUERY_INTENT.match(text)
+            and self.model.predict_proba(text) >= self.threshold
+        ):
+            return InputEvaluator(
+                is_a_query=True,
+                include_chart=bool(CHART_WORDS.search(text)),
+                simple_answer=False,
+            )
+        return None
+
+    def report(self) -> dict:
+        return {
+            "hit_rate": metrics.hit_rate("input_prefilter"),
+            "hits": metrics.get("input_prefilter.hit"),
+            "deferred_to_llm": metrics.get("input_prefilter.miss"),
+            "saved_seconds": metrics.get("input_prefilter.saved_seconds"),
+        }
@@ -0,0 +1,46 @@
+# lambda_handler.py
+import base64
+import json
+
+from engine import get_engine
+
+
+def _response(status: int, body: dict) -> dict:
+    return {
+        "statusCode": status,
+        "headers": {"Content-Type": "application/json"},
+        "body": json.dumps(body, default=str),
+    }
+
+
+def _request(event: dict) -> dict:
+    # API Gateway / function URL events carry the request as a (possibly base64) JSON body;
+    # a direct invocation passes it as the event itself
+    if "body" not in event:
+        return event
+    body = event.get("body") or "{}"
+    if event.get("isBase64Encoded"):
+        body = base64.b64decode(body).decode("utf-8")
+    return json.loads(body)
+
+
+def handler(event, context):
+    """The events of one message, buffered: Lambda behind API Gateway can't stream them like api.py."""
+    event = event or {}
+    path = event.get("rawPath") or event.get("path") or ""
+    if path.endswith("/greeting"):
+        return _response(200, {"greeting": get_engine().greeting()})
+
+    try:
+        request = _request(event)
+    except (ValueError, TypeError):
+        return _response(400, {"error": "The request body must be JSON"})
+    if not isinstance(request, dict):
+        return _response(400, {"error": "The request body must be a JSON object"})
+    message, confirm_token = request.get("message"), request.get("confirm_token")
+    if not message and not confirm_token:
+        return _response(400, {"error": 'Missing "message"'})
+    if confirm_token is not None and not isinstance(confirm_token, str):
+        return _response(400, {"error": '"confirm_token" must be a string'})
+
+    return _response(200, {"events": get_engine().run(message, confirm_token)})
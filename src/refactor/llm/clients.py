@@ -0,0 +1,22 @@
+# llm/clients.py
+from functools import lru_cache
+
+from config import OPENAI_API_KEY
+
+MODEL = "gpt-4-1106-preview"
+
+
+@lru_cache(maxsize=None)
+def get_chat_llm(streaming: bool = True, json_mode: bool = False):
+    """ChatOpenAI client shared by the generators, built on first use instead of at import."""
+    from langchain.chat_models import ChatOpenAI
+
+    # JSON mode guarantees a parseable object, so those calls are not streamed
+    model_kwargs = {"response_format": {"type": "json_object"}} if json_mode else {}
+    return ChatOpenAI(
+        temperature=0.0,
+        model=MODEL,
+        streaming=streaming and not json_mode,
+        openai_api_key=OPENAI_API_KEY,
+        model_kwargs=model_kwargs,
+    )
@@ -1,21 +1,20 @@
 from langchain.chains import LLMChain
-from langchain.chat_models import ChatOpenAI
 from langchain.output_parsers import PydanticOutputParser
 from langchain.prompts import PromptTemplate
 from langchain.schema.language_model import BaseLanguageModel
 from langchain.schema.output_parser import OutputParserException
 from parsers import input_evaluator_parser # este es tu parser!
-from config import OPENAI_API_KEY
+from config import INPUT_PREFILTER_ENABLED
+from input_prefilter import InputPrefilter
+from metrics import metrics
+from llm.clients import get_chat_llm
 import json
+import logging
 import re
+import time
 
+logger = logging.getLogger(__name__)
 
-LLM = ChatOpenAI(
-    temperature=0.0,
-    model="gpt-4-1106-preview",
-    streaming=True,
-    openai_api_key=OPENAI_API_KEY, 
-)
 
 SYSTEM_TEMPLATE = """
 Your goal is to evaluate if a user input is a question that can be answered by an SQL query or not.
@@ -56,13 +55,18 @@ The user input is delimited by four consecutive backticks.
 class InputEvaluatorLLM:
     def __init__(
         self,
-        llm: BaseLanguageModel = LLM,
+        llm: BaseLanguageModel = None,
         system_template: str = SYSTEM_TEMPLATE,
         parser: PydanticOutputParser = input_evaluator_parser,
+        prefilter: InputPrefilter = None,
     ):
-        self.llm = llm
+        self.llm = llm or get_chat_llm()
         self.template = system_template
         self.parser = parser
+        # Local classifier trained on the few-shot examples of the template
+        if prefilter is None and INPUT_PREFILTER_ENABLED:
+            prefilter = InputPrefilter.from_template(system_template)
+        self.prefilter = prefilter
 
         self.prompt = self._build_prompt()
         self.chain = self._build_chain()
@@ -83,11 +87,31 @@ class InputEvaluatorLLM:
             verbose=True,
         )  
 
-    def evaluate(self, user_input: str):
+    def evaluate(self, user_input: str, use_prefilter: bool = True):
+        if use_prefilter and self.prefilter is not None:
+            evaluation = self.prefilter.classify(user_input)
+            if evaluation is not None:
+                return evaluation
+
+        start = time.perf_counter()
         evaluation = self.chain.predict(user_input=user_input)
+        metrics.observe("input_evaluator.llm", time.perf_counter() - start)
+        return self._parse(evaluation)
+
+    async def aevaluate(self, user_input: str, use_prefilter: bool = True):
+        if use_prefilter and self.prefilter is not None:
+            evaluation = self.prefilter.classify(user_input)
+            if evaluation is not None:
+                return evaluation
+
+        start = time.perf_counter()
+        evaluation = await self.chain.apredict(user_input=user_input)
+        metrics.observe("input_evaluator.llm", time.perf_counter() - start)
+        return self._parse(evaluation)
 
+    def _parse(self, evaluation):
         try:
-            print("Raw evaluation:", evaluation)
+            logger.debug("Raw evaluation: %s", evaluation)
 
             if isinstance(evaluation, str):
                 cleaned_output = evaluation.strip('`').replace('json', '').strip()
@@ -95,9 +119,7 @@ class InputEvaluatorLLM:
                 # Remove non-printable characters using regular expression
                 cleaned_output = re.sub(r'[^\x20-\x7E]', '', cleaned_output)
                 
-                print("Cleaned output:", cleaned_output)
-                print("Type of cleaned output:", type(cleaned_output))
-                print("Length of cleaned output:", len(cleaned_output))
+                logger.debug("Cleaned output (%d characters): %s", len(cleaned_output), cleaned_output)
 
                 evaluation_dict = json.loads(cleaned_output)
                 evaluation_json = json.dumps(evaluation_dict)
@@ -110,7 +132,7 @@ class InputEvaluatorLLM:
                 raise TypeError(f"Unexpected type of output: {type(evaluation)}")
 
         except json.JSONDecodeError as e:
-            print("Failed to parse JSON:", evaluation)
+            logger.warning("Failed to parse JSON: %s", evaluation)
             raise OutputParserException(f"Failed to parse JSON: {e}", llm_output=evaluation)
         except TypeError as e:
             raise OutputParserException(f"Type error: {e}", llm_output=evaluation)
@@ -118,5 +140,3 @@ class InputEvaluatorLLM:
             raise OutputParserException(f"An unexpected error occurred: {e}", llm_output=evaluation)
 
 
-
-
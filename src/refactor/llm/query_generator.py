@@ -1,29 +1,11 @@
 from langchain.chains import LLMChain
-from langchain.chat_models import ChatOpenAI
 from langchain.prompts import PromptTemplate
 from langchain.schema.language_model import BaseLanguageModel
-import streamlit as st
+import asyncio
 from snowflake.snowpark import Session
-from sqlalchemy.dialects import registry
-from langchain_experimental.sql import SQLDatabaseChain
-from llm.streamming_handler import StreamHandler
-from config import OPENAI_API_KEY,db
-
-LLM = ChatOpenAI(
-    temperature=0.0,
-    model="gpt-4-1106-preview",
-    streaming=True,
-    openai_api_key=OPENAI_API_KEY
-)
-
-
-QUALIFIED_TABLE_NAME = "CATAPULT_HEALTH_DB.POC_CATAPULT_HEALTH.HEALTHRECORDDATA"
-
-TABLE_DESCRIPTION = """
-This table is an electronic health record (EHR) system or a patient health database which has clinical or healthcare data from patients.
-"""
-
-METADATA_QUERY = "SELECT VARIABLE_NAME, DEFINITION FROM CATAPULT_HEALTH_DB.POC_CATAPULT_HEALTH.HEALTHRECORDDATA_ATTRIBUTES;"
+from config import get_db
+from schema_context import get_table_context
+from llm.clients import get_chat_llm
 
 
 SYSTEM_TEMPLATE = """
@@ -89,69 +71,26 @@ Your generated snowflake query:
 """
 
 
-@st.cache_data(show_spinner=False)
-def get_table_context(_snowflake_session: Session, table_name: str, table_description: str, metadata_query: str = None ):
-    table = table_name.split(".")
-    # Execute the query
-    query = f"""
-        SELECT COLUMN_NAME, DATA_TYPE FROM {table[0].upper()}.INFORMATION_SCHEMA.COLUMNS
-        WHERE TABLE_SCHEMA = '{table[1].upper()}' AND TABLE_NAME = '{table[2].upper()}'
-    """
-    result = _snowflake_session.sql(query).collect()
-
-    # Process the result
-    columns = "\n".join(
-        [
-            f"- **{row['COLUMN_NAME']}**: {row['DATA_TYPE']}"
-            for row in result
-        ]
-    )
-
-    context = f"""
-    Here is the table name <tableName> {'.'.join(table)} </tableName>
-    <tableDescription>{table_description}</tableDescription>
-    Here are the columns of the {'.'.join(table)}
-    <columns>\n\n{columns}\n\n</columns>
-    """
-
-    if metadata_query:
-        metadata_result = _snowflake_session.sql(metadata_query).collect()
-        metadata = "\n".join(
-            [
-                f"- **{row['VARIABLE_NAME']}**: {row['DEFINITION']}"
-                for row in metadata_result
-            ]
-        )
-        context += f"\n\nAvailable variables by VARIABLE_NAME:\n\n{metadata}"
-
-    return context
-
-
-
-
 class QueryGeneratorLLM:
-    def __init__(self, _snowflake_session:Session, llm: BaseLanguageModel = LLM,system_template: str = SYSTEM_TEMPLATE):
-        self.llm = llm
+    def __init__(self, _snowflake_session:Session, llm: BaseLanguageModel = None,system_template: str = SYSTEM_TEMPLATE):
+        self.llm = llm or get_chat_llm()
         self.template = system_template
         self.snowflake_session = _snowflake_session
-        self.stream_handler = StreamHandler(st.empty())
 
     def _get_connection(self):
         # create connection:
+        from langchain_experimental.sql import SQLDatabaseChain
+
         db_chain = SQLDatabaseChain.from_llm(
             llm=self.llm,
-            db=db,
+            db=get_db(),
             verbose=True,
             return_direct=True)
         
         return db_chain.run
     
     def _build_prompt(self, user_input: str) -> PromptTemplate:
-        table_context = get_table_context(
-            _snowflake_session=self.snowflake_session,
-            table_name=QUALIFIED_TABLE_NAME,
-            table_description=TABLE_DESCRIPTION,
-            metadata_query=METADATA_QUERY)
+        table_context = get_table_context(_snowflake_session=self.snowflake_session, user_input=user_input)
 
         # Now format the template with both context and user_input
         formatted_template = self.template.format(context=table_context, user_input=user_input)
@@ -178,22 +117,11 @@ class QueryGeneratorLLM:
             verbose=True
             )
     
-    def generate_response(self, user_input: str)-> str:
-        prompt = self._build_prompt(user_input)
-        response_stream = self.llm.stream(prompt)
-
-        # Clear the existing text in the stream handler
-        self.stream_handler.text = ""
-
-        # Stream the response and let the handler update the text
-        for chunk in response_stream:
-            self.stream_handler.on_llm_new_token(chunk)
-
-        # The final response should now be in self.stream_handler.text
-        # Remove any unwanted parts from the response if necessary
-        response = self.stream_handler.text.replace("content=", "").strip()
-
-        return response
-
-
-    
\ No newline at end of file
+    async def astream_response(self, user_input: str):
+        """Yields the text of the answer as it is generated."""
+        # The prompt needs the schema snapshot, which may query Snowflake
+        prompt = await asyncio.to_thread(self._build_prompt, user_input)
+        self.last_prompt = prompt
+        async for chunk in self.llm.astream(prompt):
+            if isinstance(chunk.content, str):
+                yield chunk.content
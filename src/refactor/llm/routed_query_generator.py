@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import re
+import time
+
+from langchain.output_parsers import PydanticOutputParser
+from langchain.schema.language_model import BaseLanguageModel
+from langchain.schema.output_parser import OutputParserException
+from snowflake.snowpark import Session
+
+from llm.clients import get_chat_llm
+from metrics import metrics
+from parsers import RoutedQuery, routed_query_parser
+from schema_context import get_table_context
+
+logger = logging.getLogger(__name__)
+
+
+SYSTEM_TEMPLATE = """
+You will be acting as an AI Snowflake SQL Expert named Catapult Health Bot.
+In a single answer you must:
+1. evaluate if the user input is a question that can be answered by an SQL query or not,
+2. if it is, evaluate if a chart is needed to answer the question,
+3. if it is, write the Snowflake SQL queries that answer it.
+
+Examples were sql code won't be needed usually come as greetings, cheers and trivial conversations, e.g.
+"Hi, nice to meet you!", "Hello, how are you?", "Thank you very much!".
+
+Here are a Few-shot examples of user input and expected flags:
+
+User input: Hi, how are you?
+Your response: is_a_query = False, include_chart = False, simple_answer = True, sql_queries = []
+
+User input: I need a pie chart of sales by country
+Your response: is_a_query = True, include_chart = True, simple_answer = False, sql_queries = [one query]
+
+User input: How many customers we have this week?
+Your response: is_a_query = True, include_chart = False, simple_answer = False, sql_queries = [one query]
+
+You are given one table, the table name is in <tableName> tag, the columns are in <columns> tag.
+
+{context}
+
+Here are the critical rules for the SQL queries you must abide:
+<rules>
+1. The code MUST BE SNOWFLAKE SQL, it MUST NOT BE other types of SQL, such as bigquerySQL, or POSTGRESQL.
+Remember: The "FILTER" function does not exist in snowflake sql.
+2. If you get more than one question in a request, you should provide one sql query for each question.
+3. If I don't tell you to find a limited set of results in the sql query or question, you MUST NOT limit the number of responses.
+4. Text / string where clauses must be fuzzy match e.g ilike %keyword%
+5. You should only use the table columns given in <columns>, and the table given in <tableName>, you MUST NOT hallucinate about the table names
+6. DO NOT put numerical at the very front of sql variable.
+7. Do not wrap the queries in markdown, each item of sql_queries is the plain sql text.
+</rules>
+
+The user input is delimited by four consecutive backticks.
+
+{format_instructions}
+
+````{user_input}````
+"""
+
+
+class RoutedQueryGeneratorLLM:
+    """Returns the InputEvaluator flags and the SQL blocks from one JSON response."""
+
+    def __init__(
+        self,
+        _snowflake_session: Session,
+        llm: BaseLanguageModel = None,
+        system_template: str = SYSTEM_TEMPLATE,
+        parser: PydanticOutputParser = routed_query_parser,
+    ):
+        self.llm = llm or get_chat_llm(json_mode=True)
+        self.template = system_template
+        self.snowflake_session = _snowflake_session
+        self.parser = parser
+
+    def _build_prompt(self, user_input: str) -> str:
+        table_context = get_table_context(
+            _snowflake_session=self.snowflake_session, user_input=user_input
+        )
+
+        # Now format the template with the context, format instructions and user_input
+        return self.template.format(
+            context=table_context,
+            format_instructions=self.parser.get_format_instructions(),
+            user_input=user_input,
+        )
+
+    async def agenerate_response(self, user_input: str) -> RoutedQuery:
+        prompt = await asyncio.to_thread(self._build_prompt, user_input)
+
+        start = time.perf_counter()
+        response = await self.llm.apredict(prompt)
+        metrics.observe("routed_query_generator.llm", time.perf_counter() - start)
+        return self._parse(response)
+
+    def _parse(self, response: str) -> RoutedQuery:
+        # Remove markdown fences in case the model still adds them
+        cleaned_output = re.sub(r"^```(json)?|```$", "", response.strip()).strip()
+        try:
+            routed = self.parser.parse(cleaned_output)
+        except OutputParserException:
+            logger.warning("Failed to parse routed query: %s", response, exc_info=True)
+            raise
+
+        if not routed.is_a_query:
+            routed.sql_queries = []
+        return routed
@@ -1,20 +1,9 @@
 from langchain.chains import LLMChain
-from langchain.chat_models import ChatOpenAI
 from langchain.prompts import PromptTemplate
 from langchain.schema.language_model import BaseLanguageModel
-import streamlit as st
 from snowflake.snowpark import Session
-from langchain_experimental.sql import SQLDatabaseChain
-from config import db, OPENAI_API_KEY
-from llm.streamming_handler import StreamHandler
-
-
-LLM = ChatOpenAI(
-    temperature=0.0,
-    model="gpt-4-1106-preview",
-    streaming=True,
-    openai_api_key =OPENAI_API_KEY,
-)
+from config import get_db
+from llm.clients import get_chat_llm
 
 
 # SIMPLE_TEMPLATE = """
@@ -28,8 +17,6 @@ LLM = ChatOpenAI(
 # """
 
 
-
-
 SIMPLE_TEMPLATE = """
 You are a helpful, respectful and honest assistant. Always answer as helpfully as possible, while being safe.
 If a question does not make sense, or is not factually coherent, explain why instead of answering something not correct.
@@ -55,11 +42,6 @@ Your generated response based on user's request and on the user's language in th
 """
 
 
-
-
-
-
-
 # Examples of user questions:
 # - Hi! how are you?
 # - Nice to meet you!
@@ -68,17 +50,18 @@ Your generated response based on user's request and on the user's language in th
 # - do you know what hour is in Buenos Aires, Argentina right now?
 
 class SimpleGeneratorLLM:
-    def __init__(self,_snowflake_session: Session, llm: BaseLanguageModel = LLM, simple_template: str = SIMPLE_TEMPLATE):
-        self.llm = llm
+    def __init__(self,_snowflake_session: Session, llm: BaseLanguageModel = None, simple_template: str = SIMPLE_TEMPLATE):
+        self.llm = llm or get_chat_llm()
         self.template = simple_template
         self.snowflake_session = _snowflake_session
-        self.stream_handler = StreamHandler(st.empty())
     
     def _get_connection(self):
         # create connection:
+        from langchain_experimental.sql import SQLDatabaseChain
+
         db_chain = SQLDatabaseChain.from_llm(
             llm=self.llm,
-            db=db,
+            db=get_db(),
             verbose=True,
             return_direct=True)
         
@@ -94,22 +77,10 @@ class SimpleGeneratorLLM:
         return str(final_template)
 
 
-    def generate_response(self, user_input: str)-> str:
-        prompt = self._build_prompt(user_input)
-        response_stream = self.llm.stream(prompt)
-
-        # Clear the existing text in the stream handler
-        self.stream_handler.text = ""
-
-        # Stream the response and let the handler update the text
-        for chunk in response_stream:
-            self.stream_handler.on_llm_new_token(chunk)
-
-        # The final response should now be in self.stream_handler.text
-        # Remove any unwanted parts from the response if necessary
-        response = self.stream_handler.text.replace("content=", "").strip()
-
-        return response
+    async def astream_response(self, user_input: str):
+        async for chunk in self.llm.astream(self._build_prompt(user_input)):
+            if isinstance(chunk.content, str):
+                yield chunk.content
 
 
     def _build_chain(self, user_input: str) -> LLMChain:
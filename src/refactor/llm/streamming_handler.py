@@ -1,18 +1,61 @@
 from langchain.callbacks.base import BaseCallbackHandler
 from langchain.schema.messages import AIMessageChunk
+from config import STREAM_RENDER_INTERVAL, STREAM_RENDER_MAX_PENDING
+import time
+
 
 class StreamHandler(BaseCallbackHandler):
-    def __init__(self, container, initial_text=""):
+    """
+    Renders a streamed answer into a container with a markdown() method, e.g. st.empty();
+    without a container the text is only collected.
+
+    Every render re-sends the whole text, so tokens are coalesced: the container is
+    updated at most once per `interval` seconds, or sooner once `max_pending`
+    characters are waiting. flush() renders what is left when the stream ends.
+    An interval of 0 renders every token.
+    """
+
+    def __init__(self, container, initial_text="", interval: float = STREAM_RENDER_INTERVAL,
+                 max_pending: int = STREAM_RENDER_MAX_PENDING, clock=time.monotonic):
         self.container = container
         self.text = initial_text
+        self.interval = interval
+        self.max_pending = max_pending
+        self.clock = clock
+        self.pending = 0
+        self.last_render = None
+        # For the streaming benchmark
+        self.render_calls = 0
+        self.rendered_chars = 0
 
     def on_llm_new_token(self, token: AIMessageChunk, **kwargs) -> None:
         # Ensure that the token.content is a string and not a Streamlit object
         if isinstance(token.content, str):
-            # Append the content to self.text
-            self.text += token.content
-            # Update the container with the current text
-            self.container.markdown(self.text)
+            self.append(token.content)
+
+    def on_llm_end(self, response, **kwargs) -> None:
+        self.flush()
 
+    def append(self, text: str) -> None:
+        self.text += text
+        self.pending += len(text)
+        now = self.clock()
+        if (
+            self.interval <= 0
+            or self.pending >= self.max_pending
+            or self.last_render is None
+            or now - self.last_render >= self.interval
+        ):
+            self._render(now)
 
+    def flush(self) -> None:
+        if self.pending:
+            self._render(self.clock())
 
+    def _render(self, now: float) -> None:
+        if self.container is not None:
+            self.container.markdown(self.text)
+        self.pending = 0
+        self.last_render = now
+        self.render_calls += 1
+        self.rendered_chars += len(self.text)
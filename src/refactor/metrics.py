@@ -0,0 +1,63 @@
+# metrics.py
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+class Metrics:
+    """Thread-safe, process-wide counters and timings for the chatbot pipeline."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._timings = defaultdict(lambda: {"count": 0, "total": 0.0, "max": 0.0})
+
+    def incr(self, name: str, value: float = 1):
+        with self._lock:
+            self._counters[name] += value
+
+    def observe(self, name: str, seconds: float):
+        with self._lock:
+            timing = self._timings[name]
+            timing["count"] += 1
+            timing["total"] += seconds
+            timing["max"] = max(timing["max"], seconds)
+
+    @contextmanager
+    def timer(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def get(self, name: str) -> float:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def mean(self, name: str) -> float:
+        with self._lock:
+            timing = self._timings.get(name)
+            if not timing or not timing["count"]:
+                return 0.0
+            return timing["total"] / timing["count"]
+
+    def hit_rate(self, prefix: str) -> float:
+        hits = self.get(f"{prefix}.hit")
+        misses = self.get(f"{prefix}.miss")
+        return hits / (hits + misses) if hits + misses else 0.0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            timings = {
+                name: dict(
+                    timing,
+                    mean=timing["total"] / timing["count"] if timing["count"] else 0.0,
+                )
+                for name, timing in self._timings.items()
+            }
+            return {"counters": dict(self._counters), "timings": timings}
+
+
+metrics = Metrics()
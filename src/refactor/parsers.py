@@ -1,3 +1,5 @@
+from typing import List
+
 from langchain.output_parsers import PydanticOutputParser
 from pydantic import BaseModel, Field
 
@@ -23,4 +25,17 @@ class InputEvaluator(BaseModel):
 
 input_evaluator_parser = PydanticOutputParser(
     pydantic_object=InputEvaluator
-)
\ No newline at end of file
+)
+
+
+class RoutedQuery(InputEvaluator):
+    sql_queries: List[str] = Field(
+        default_factory=list,
+        description="""One executable Snowflake SQL query per question in the user input, without markdown fences."""
+        """This must be empty if the argument "is_a_query" is False.""",
+    )
+
+
+routed_query_parser = PydanticOutputParser(
+    pydantic_object=RoutedQuery
+)
@@ -0,0 +1,36 @@
+"""
+Fills the local caches before the first browser session: the schema snapshot and
+the greeting for the current schema fingerprint. Run at container start, from the
+same working directory as `streamlit run` so both use the same CACHE_DIR:
+
+    python src/refactor/prewarm.py
+"""
+
+import logging
+import sys
+import time
+
+from config import create_session
+from greeting_cache import greeting_cache
+
+logger = logging.getLogger(__name__)
+
+
+def main() -> int:
+    started_at = time.perf_counter()
+    session = create_session()
+    try:
+        greeting_cache.get_or_generate(session)
+    except Exception as e:
+        # The app still starts; the first session generates the greeting instead
+        logger.error("Pre-warming failed: %s", e)
+        return 1
+    finally:
+        session.close()
+    logger.info("Caches pre-warmed in %.1fs", time.perf_counter() - started_at)
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
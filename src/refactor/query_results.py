@@ -0,0 +1,222 @@
+# query_results.py
+import os
+import threading
+import uuid
+from collections import OrderedDict
+
+import pandas as pd
+import pyarrow as pa
+
+from config import RESULT_MAX_BYTES, RESULT_MAX_ROWS
+from metrics import metrics
+
+# Text columns with at most this share of distinct values are stored as categories
+CATEGORY_MAX_RATIO = 0.5
+
+
+def downcast_frame(data: pd.DataFrame) -> pd.DataFrame:
+    """Smallest dtypes that hold the same values: narrower numbers, categories for repetitive text."""
+    data = data.copy()
+    for column in data.columns:
+        series = data[column]
+        if pd.api.types.is_bool_dtype(series):
+            continue
+        if pd.api.types.is_integer_dtype(series):
+            data[column] = pd.to_numeric(series, downcast="integer")
+        elif pd.api.types.is_float_dtype(series):
+            downcast = pd.to_numeric(series, downcast="float")
+            # float32 only when no precision is lost
+            if downcast.astype(series.dtype).equals(series):
+                data[column] = downcast
+        elif (
+            pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)
+        ) and len(series):
+            try:
+                if series.nunique(dropna=True) <= len(series) * CATEGORY_MAX_RATIO:
+                    data[column] = series.astype("category")
+            except TypeError:
+                # Unhashable values, e.g. parsed VARIANT columns
+                pass
+    return data
+
+
+class QueryResult:
+    """
+    Result of one SQL query, fetched from pandas batches in bounded steps.
+
+    Each `fetch()` stops at `max_rows` rows or `max_bytes` bytes, so an unfiltered
+    query never materializes the whole table in the container; the remaining
+    batches stay on the Snowflake side until more rows are requested.
+    """
+
+    def __init__(
+        self,
+        query: str,
+        batches=None,
+        data: pd.DataFrame = None,
+        query_id: str = None,
+        cache_key: str = None,
+        max_rows: int = RESULT_MAX_ROWS,
+        max_bytes: int = RESULT_MAX_BYTES,
+    ):
+        self.id = uuid.uuid4().hex
+        self.query = query
+        # Rows pulled so far: a DataFrame while fetching, an Arrow table once compacted for the
+        # chat history, or an Arrow file on local disk once spilled
+        self._data = data
+        self._table = None
+        self.spill_path = None
+        # Handles to the full result outside this process: Snowflake's RESULT_SCAN and the local cache
+        self.query_id = query_id
+        self.cache_key = cache_key
+        self.total_rows = len(data) if data is not None else None
+        # Pages read through RESULT_SCAN, most recently viewed last
+        self.remote_pages = OrderedDict()
+        # Set once RESULT_SCAN failed (Snowflake keeps results for 24 hours); only pulled rows remain
+        self.expired = False
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self._batches = batches
+        self._pending = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_dataframe(
+        cls, query: str, data: pd.DataFrame, cache_key: str = None
+    ) -> "QueryResult":
+        return cls(query, data=data, cache_key=cache_key)
+
+    @property
+    def data(self) -> pd.DataFrame:
+        if self.compacted:
+            # Charts and caches need a DataFrame; pages are read with rows() instead
+            return self._arrow().to_pandas()
+        return self._data
+
+    @data.setter
+    def data(self, data: pd.DataFrame):
+        self.discard_spill()
+        self._data, self._table, self.spill_path = data, None, None
+
+    @property
+    def exhausted(self) -> bool:
+        return self._batches is None and self._pending is None
+
+    @property
+    def row_count(self) -> int:
+        if self.compacted:
+            return self._arrow().num_rows
+        return 0 if self._data is None else len(self._data)
+
+    @property
+    def memory_bytes(self) -> int:
+        """Bytes held in this process for the rows pulled so far and the RESULT_SCAN pages."""
+        pages = sum(
+            int(page.memory_usage(deep=True).sum())
+            for page in self.remote_pages.values()
+        )
+        if self._table is not None:
+            return self._table.nbytes + pages
+        if self._data is not None:
+            return int(self._data.memory_usage(deep=True).sum()) + pages
+        return pages
+
+    @property
+    def compacted(self) -> bool:
+        return self._data is None and (
+            self._table is not None or self.spill_path is not None
+        )
+
+    @property
+    def loaded(self) -> bool:
+        return self._data is not None or self.compacted
+
+    def rows(self, start: int, count: int) -> pd.DataFrame:
+        """Rows [start, start + count) of the rows pulled so far, without materializing the others."""
+        if self.compacted:
+            return self._arrow().slice(start, count).to_pandas()
+        return self.data.iloc[start : start + count]
+
+    def compact(self):
+        """Keep the rows pulled so far as an Arrow table with downcast dtypes."""
+        with self._lock:
+            if self._data is None:
+                return
+            self._table = pa.Table.from_pandas(
+                downcast_frame(self._data), preserve_index=False
+            )
+            self._data = None
+
+    def spill(self, path: str):
+        """Move the compacted rows to an Arrow file at `path`; they are memory-mapped back when read."""
+        with self._lock:
+            if self._table is None:
+                return
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(
+                sink, self._table.schema
+            ) as writer:
+                writer.write_table(self._table)
+            self.spill_path, self._table = path, None
+            metrics.incr("query_results.spilled")
+
+    def expire(self):
+        """The full result can no longer be read; paging is limited to the rows pulled so far."""
+        with self._lock:
+            self.expired = True
+            self.query_id = None
+            self._batches = self._pending = None
+            self.remote_pages.clear()
+        self.total_rows = self.row_count
+        metrics.incr("query_results.expired")
+
+    def discard_spill(self):
+        if self.spill_path and os.path.exists(self.spill_path):
+            os.remove(self.spill_path)
+
+    def _arrow(self) -> pa.Table:
+        if self._table is not None:
+            return self._table
+        return pa.ipc.open_file(pa.memory_map(self.spill_path)).read_all()
+
+    def fetch(self) -> int:
+        """Pull the next batches into `data`. Returns the number of new rows."""
+        with self._lock:
+            frames, rows, size = [], 0, 0
+            while rows < self.max_rows and size < self.max_bytes:
+                batch = self._next_batch()
+                if batch is None:
+                    break
+                # Keep whatever doesn't fit in this step for the next fetch
+                room = self.max_rows - rows
+                if len(batch) > room:
+                    self._pending = batch.iloc[room:].reset_index(drop=True)
+                    batch = batch.iloc[:room]
+                frames.append(batch)
+                rows += len(batch)
+                size += int(batch.memory_usage(deep=True).sum())
+
+            if frames:
+                if self.row_count:
+                    frames.insert(0, self.data)
+                self.data = pd.concat(frames, ignore_index=True)
+            elif not self.loaded:
+                self.data = pd.DataFrame()
+
+            if self.exhausted:
+                self.total_rows = self.row_count
+
+            metrics.incr("query_results.rows_fetched", rows)
+            metrics.incr("query_results.bytes_fetched", size)
+            return rows
+
+    def _next_batch(self):
+        if self._pending is not None:
+            batch, self._pending = self._pending, None
+            return batch
+        if self._batches is None:
+            return None
+        batch = next(self._batches, None)
+        if batch is None:
+            self._batches = None
+        return batch
@@ -0,0 +1,169 @@
+# result_cache.py
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from config import CACHE_DIR, RESULT_CACHE_MAX_BYTES
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+ROW_GROUP_SIZE = 10000
+
+# Results of these functions change between executions, so they are never cached
+NON_DETERMINISTIC = re.compile(
+    r"\b(CURRENT_DATE|CURRENT_TIME|CURRENT_TIMESTAMP|GETDATE|SYSDATE|LOCALTIMESTAMP|RANDOM|UUID_STRING|SEQ\d)\b",
+    re.IGNORECASE,
+)
+
+
+def normalize_sql(query: str) -> str:
+    # Collapse whitespace outside string literals and drop the trailing semicolon
+    parts = re.split(r"('(?:[^']|'')*')", query.strip())
+    normalized = "".join(
+        part if index % 2 else re.sub(r"\s+", " ", part)
+        for index, part in enumerate(parts)
+    )
+    return normalized.strip().rstrip(";").strip()
+
+
+class ResultCache:
+    """
+    Query results stored as Parquet files on local disk.
+
+    Keys combine the normalized SQL with the table version (LAST_ALTERED), so
+    a write to the table makes every older entry unreachable; those entries
+    then age out of the byte-budget LRU.
+    """
+
+    def __init__(
+        self, cache_dir: str = CACHE_DIR, max_bytes: int = RESULT_CACHE_MAX_BYTES
+    ):
+        self.cache_dir = os.path.join(cache_dir, "results")
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index = None
+
+    @staticmethod
+    def key(query: str, table_version: str) -> str:
+        return hashlib.sha256(
+            f"{table_version}|{normalize_sql(query)}".encode("utf-8")
+        ).hexdigest()
+
+    @staticmethod
+    def is_cacheable(query: str) -> bool:
+        return not NON_DETERMINISTIC.search(query)
+
+    def contains(self, key: str) -> bool:
+        with self._lock:
+            return key in self._load_index()
+
+    def get(self, key: str):
+        with self._lock:
+            index = self._load_index()
+            if key not in index:
+                metrics.incr("result_cache.miss")
+                return None
+            path = self._path(key)
+            try:
+                result = pq.read_table(path).to_pandas()
+            except (OSError, pa.ArrowException):
+                index.pop(key, None)
+                metrics.incr("result_cache.miss")
+                return None
+
+            # Bump the access time so the LRU order survives restarts
+            now = time.time()
+            os.utime(path, (now, now))
+            index[key] = (index[key][0], now)
+            metrics.incr("result_cache.hit")
+            return result
+
+    def set(self, key: str, result: pd.DataFrame):
+        with self._lock:
+            index = self._load_index()
+            path = self._path(key)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            try:
+                # Small row groups let read_page load a single page without reading the whole file
+                pq.write_table(
+                    pa.Table.from_pandas(result, preserve_index=False),
+                    tmp_path,
+                    row_group_size=ROW_GROUP_SIZE,
+                )
+                os.replace(tmp_path, path)
+            except (OSError, pa.ArrowException) as e:
+                logger.warning("Could not cache query result: %s", e)
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                return
+
+            index[key] = (os.path.getsize(path), time.time())
+            self._evict(index)
+
+    def row_count(self, key: str):
+        # Read from the Parquet footer, no row data is loaded
+        try:
+            return pq.ParquetFile(self._path(key)).metadata.num_rows
+        except (OSError, pa.ArrowException):
+            return None
+
+    def read_page(self, key: str, offset: int, limit: int):
+        # Only the row groups overlapping [offset, offset + limit) are read
+        try:
+            parquet_file = pq.ParquetFile(self._path(key))
+        except (OSError, pa.ArrowException):
+            return None
+
+        tables, first_row, start = [], None, 0
+        for index in range(parquet_file.num_row_groups):
+            rows = parquet_file.metadata.row_group(index).num_rows
+            if start >= offset + limit:
+                break
+            if start + rows > offset:
+                if first_row is None:
+                    first_row = start
+                tables.append(parquet_file.read_row_group(index))
+            start += rows
+        if not tables:
+            return parquet_file.schema_arrow.empty_table().to_pandas()
+        return pa.concat_tables(tables).slice(offset - first_row, limit).to_pandas()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.parquet")
+
+    def _load_index(self) -> dict:
+        if self._index is None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._index = {}
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".parquet"):
+                    stat = os.stat(os.path.join(self.cache_dir, name))
+                    self._index[name[: -len(".parquet")]] = (
+                        stat.st_size,
+                        stat.st_mtime,
+                    )
+        return self._index
+
+    def _evict(self, index: dict):
+        total = sum(size for size, _ in index.values())
+        for key, (size, _) in sorted(index.items(), key=lambda item: item[1][1]):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            del index[key]
+            total -= size
+            metrics.incr("result_cache.evicted")
+
+
+result_cache = ResultCache()
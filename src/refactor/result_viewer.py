@@ -0,0 +1,188 @@
+# result_viewer.py
+import logging
+import math
+
+import pandas as pd
+import streamlit as st
+from snowflake.connector import ProgrammingError
+from snowflake.snowpark.exceptions import SnowparkSQLException
+
+from chart_snapshot import ChartSnapshot
+from config import RESULT_PAGE_SIZE
+from metrics import metrics
+from query_results import QueryResult
+from result_cache import result_cache
+from session_pool import SessionPool, SessionPoolExhausted
+
+logger = logging.getLogger(__name__)
+
+# Remote pages kept per result, so reruns don't query RESULT_SCAN again
+MAX_CACHED_PAGES = 8
+# A rerun waits at most this long for a pooled session to read RESULT_SCAN
+SESSION_WAIT_SECONDS = 5
+
+
+def get_total_rows(result: QueryResult, session_pool: SessionPool = None):
+    """
+    Total rows of the full result, or None if it can't be known without pulling every row.
+    A session is leased from `session_pool` only to count the rows through RESULT_SCAN.
+    """
+    if result.total_rows is None:
+        if result.exhausted:
+            result.total_rows = result.row_count
+        elif result.cache_key:
+            result.total_rows = result_cache.row_count(result.cache_key)
+        if result.total_rows is None and result.query_id and session_pool is not None:
+            count_query = (
+                f"SELECT COUNT(*) AS TOTAL FROM TABLE(RESULT_SCAN('{result.query_id}'))"
+            )
+            try:
+                with session_pool.session(SESSION_WAIT_SECONDS) as session:
+                    result.total_rows = session.sql(count_query).collect()[0]["TOTAL"]
+            except (ProgrammingError, SnowparkSQLException) as e:
+                _expire(result, e)
+    return result.total_rows
+
+
+def _expire(result: QueryResult, error: Exception):
+    logger.warning(
+        "RESULT_SCAN of query %s failed, keeping the rows already fetched: %s",
+        result.query_id,
+        error,
+    )
+    result.expire()
+
+
+def get_page(
+    result: QueryResult,
+    page: int,
+    page_size: int = RESULT_PAGE_SIZE,
+    session_pool: SessionPool = None,
+) -> pd.DataFrame:
+    start, end = page * page_size, (page + 1) * page_size
+
+    # 1. rows already in memory
+    if result.loaded and (end <= result.row_count or result.exhausted):
+        metrics.incr("result_viewer.page.memory")
+        return result.rows(start, page_size)
+
+    # 2. the local result cache
+    if result.cache_key:
+        cached = result_cache.read_page(result.cache_key, start, page_size)
+        if cached is not None:
+            metrics.incr("result_viewer.page.cache")
+            return cached
+
+    # 3. the persisted Snowflake result, only this page is transferred
+    if result.query_id and session_pool is not None:
+        pages = result.remote_pages
+        if (start, page_size) not in pages:
+            page_query = (
+                f"SELECT * FROM TABLE(RESULT_SCAN('{result.query_id}')) "
+                f"LIMIT {page_size} OFFSET {start}"
+            )
+            try:
+                with session_pool.session(SESSION_WAIT_SECONDS) as session:
+                    pages[(start, page_size)] = session.sql(page_query).to_pandas()
+            except (ProgrammingError, SnowparkSQLException) as e:
+                _expire(result, e)
+                return result.rows(start, page_size)
+            metrics.incr("result_viewer.page.result_scan")
+            while len(pages) > MAX_CACHED_PAGES:
+                pages.popitem(last=False)
+        pages.move_to_end((start, page_size))
+        return pages[(start, page_size)]
+
+    # 4. no handle to the full result: keep pulling batches until the page is loaded
+    while not result.exhausted and result.row_count < end:
+        if not result.fetch():
+            break
+    return result.rows(start, page_size)
+
+
+def render_query_result(
+    result: QueryResult,
+    session_pool: SessionPool = None,
+    page_size: int = RESULT_PAGE_SIZE,
+    history=None,
+):
+    """
+    `session_pool` is only used for pages read through RESULT_SCAN. `history` is the HistoryStore
+    of the chat, told about the memory that page fetches add to the result.
+    """
+    try:
+        total_rows = get_total_rows(result, session_pool)
+    except SessionPoolExhausted:
+        _warn_busy()
+        # Don't wait for a session again for the page
+        total_rows, session_pool = None, None
+    if total_rows is not None and total_rows <= page_size:
+        st.dataframe(_get_page(result, 0, page_size, session_pool))
+        _account(result, history)
+        return
+
+    # The table goes above the page selector, but is filled once the selected page is known
+    table = st.empty()
+    page_count = math.ceil(total_rows / page_size) if total_rows is not None else None
+    page = st.number_input(
+        "Page",
+        min_value=1,
+        max_value=page_count,
+        value=1,
+        step=1,
+        key=f"page-{result.id}",
+    )
+    rows = _get_page(result, int(page) - 1, page_size, session_pool)
+    table.dataframe(rows)
+    _account(result, history)
+
+    first_row = (int(page) - 1) * page_size + 1
+    total = f"{total_rows:,}" if total_rows is not None else "?"
+    st.caption(f"Rows {first_row:,}-{first_row + len(rows) - 1:,} of {total}")
+
+
+def _get_page(
+    result: QueryResult, page: int, page_size: int, session_pool: SessionPool = None
+) -> pd.DataFrame:
+    try:
+        return get_page(result, page, page_size, session_pool)
+    except SessionPoolExhausted:
+        _warn_busy()
+        return get_page(result, page, page_size)
+
+
+def _warn_busy():
+    metrics.incr("result_viewer.pool_exhausted")
+    st.warning(
+        "All Snowflake connections are busy, so only the rows fetched earlier are shown. Try again in a moment."
+    )
+
+
+def _account(result: QueryResult, history):
+    if history is not None:
+        history.account(result)
+    if result.expired:
+        st.caption(
+            f"This result expired on Snowflake (results are kept for 24 hours); "
+            f"only the first {result.row_count:,} rows fetched earlier are shown. Ask again for the full result."
+        )
+
+
+def render_chart_snapshot(snapshot: ChartSnapshot):
+    image = snapshot.image
+    if image is not None:
+        st.image(image)
+    # Only an opened chart is rebuilt and sent to the browser as an interactive figure. The label
+    # stays the same once the image is ready: Streamlit derives the widget id from it
+    if st.checkbox("Interactive chart", key=f"chart-{snapshot.id}"):
+        metrics.incr("chart_snapshot.rehydrated")
+        st.plotly_chart(snapshot.figure())
+    if (
+        snapshot.rendered_points is not None
+        and snapshot.rendered_points < snapshot.original_points
+    ):
+        st.caption(
+            f"Showing {snapshot.rendered_points:,} of {snapshot.original_points:,} points."
+        )
+    if snapshot.note:
+        st.caption(snapshot.note)
@@ -0,0 +1,317 @@
+# schema_context.py
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+
+from snowflake.snowpark import Session
+
+from config import (
+    CACHE_DIR,
+    SCHEMA_CONTEXT_MAX_COLUMNS,
+    SCHEMA_CONTEXT_TOKEN_BUDGET,
+    SCHEMA_CONTEXT_TOP_K,
+    SCHEMA_VERSION_TTL_SECONDS,
+)
+from metrics import metrics
+from schema_index import estimate_tokens, schema_index_store, select_entries
+
+QUALIFIED_TABLE_NAME = "CATAPULT_HEALTH_DB.POC_CATAPULT_HEALTH.HEALTHRECORDDATA"
+
+METADATA_TABLE_NAME = (
+    "CATAPULT_HEALTH_DB.POC_CATAPULT_HEALTH.HEALTHRECORDDATA_ATTRIBUTES"
+)
+
+TABLE_DESCRIPTION = """
+This table is an electronic health record (EHR) system or a patient health database which has clinical or healthcare data from patients.
+"""
+
+
+@dataclass
+class SchemaSnapshot:
+    table_name: str
+    metadata_table: str
+    # LAST_ALTERED of every table the snapshot was built from
+    versions: dict
+    fingerprint: str
+    columns: list = field(default_factory=list)
+    metadata: list = field(default_factory=list)
+    checked_at: float = 0.0
+
+
+class SchemaContextCache:
+    """
+    Process-wide cache of the table schema used to build the LLM prompts.
+
+    Snapshots live in memory and on disk (so a new container starts warm).
+    Once a snapshot is older than `version_ttl` seconds, a single
+    INFORMATION_SCHEMA.TABLES query compares LAST_ALTERED; columns and
+    metadata are only re-pulled when that version changed.
+    """
+
+    def __init__(
+        self, cache_dir: str = CACHE_DIR, version_ttl: int = SCHEMA_VERSION_TTL_SECONDS
+    ):
+        self.cache_dir = os.path.join(cache_dir, "schema")
+        self.version_ttl = version_ttl
+        self._snapshots = {}
+        self._lock = threading.Lock()
+
+    def get_snapshot(
+        self,
+        snowflake_session: Session,
+        table_name: str = QUALIFIED_TABLE_NAME,
+        metadata_table: str = METADATA_TABLE_NAME,
+    ) -> SchemaSnapshot:
+        """
+        Without a session (LLM prompts are built while no session is leased) the cached
+        snapshot is returned however old it is; the caller loads it under a lease first.
+        """
+        key = f"{table_name}|{metadata_table or ''}"
+        with self._lock:
+            snapshot = self._snapshots.get(key) or self._load(key)
+            now = time.time()
+            if snapshot and (
+                snowflake_session is None
+                or now - snapshot.checked_at < self.version_ttl
+            ):
+                self._snapshots[key] = snapshot
+                return snapshot
+            if snowflake_session is None:
+                raise ValueError(
+                    f"No schema snapshot of {table_name} is cached and no Snowflake session was given"
+                )
+
+            tables = [name for name in (table_name, metadata_table) if name]
+            versions = self._fetch_versions(snowflake_session, tables)
+            if snapshot is None or snapshot.versions != versions:
+                snapshot = self._fetch_snapshot(
+                    snowflake_session, table_name, metadata_table, versions
+                )
+            snapshot.checked_at = now
+
+            self._snapshots[key] = snapshot
+            self._save(key, snapshot)
+            return snapshot
+
+    def get_data_version(
+        self, snowflake_session: Session, table_name: str = QUALIFIED_TABLE_NAME
+    ) -> str:
+        # Changes whenever any table behind the prompts is written to (DML or DDL)
+        snapshot = self.get_snapshot(snowflake_session, table_name)
+        return "|".join(
+            f"{name}={version}" for name, version in sorted(snapshot.versions.items())
+        )
+
+    def get_fingerprint(
+        self, snowflake_session: Session, table_name: str = QUALIFIED_TABLE_NAME
+    ) -> str:
+        return self.get_snapshot(snowflake_session, table_name).fingerprint
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshots.clear()
+            if os.path.isdir(self.cache_dir):
+                for name in os.listdir(self.cache_dir):
+                    os.remove(os.path.join(self.cache_dir, name))
+
+    def _fetch_versions(self, snowflake_session: Session, tables: list) -> dict:
+        database, schema, _ = tables[0].upper().split(".")
+        names = ", ".join(f"'{table.upper().split('.')[2]}'" for table in tables)
+        query = f"""
+            SELECT TABLE_NAME, LAST_ALTERED FROM {database}.INFORMATION_SCHEMA.TABLES
+            WHERE TABLE_SCHEMA = '{schema}' AND TABLE_NAME IN ({names})
+        """
+        result = snowflake_session.sql(query).collect()
+        return {
+            f"{database}.{schema}.{row['TABLE_NAME']}": str(row["LAST_ALTERED"])
+            for row in result
+        }
+
+    def _fetch_snapshot(
+        self,
+        snowflake_session: Session,
+        table_name: str,
+        metadata_table: str,
+        versions: dict,
+    ) -> SchemaSnapshot:
+        table = table_name.split(".")
+        query = f"""
+            SELECT COLUMN_NAME, DATA_TYPE FROM {table[0].upper()}.INFORMATION_SCHEMA.COLUMNS
+            WHERE TABLE_SCHEMA = '{table[1].upper()}' AND TABLE_NAME = '{table[2].upper()}'
+            ORDER BY ORDINAL_POSITION
+        """
+        columns = [
+            [row["COLUMN_NAME"], row["DATA_TYPE"]]
+            for row in snowflake_session.sql(query).collect()
+        ]
+
+        metadata = []
+        if metadata_table:
+            metadata_query = f"SELECT VARIABLE_NAME, DEFINITION FROM {metadata_table};"
+            metadata = [
+                [row["VARIABLE_NAME"], row["DEFINITION"]]
+                for row in snowflake_session.sql(metadata_query).collect()
+            ]
+
+        fingerprint = hashlib.sha256(
+            json.dumps([table_name.upper(), columns, metadata], default=str).encode(
+                "utf-8"
+            )
+        ).hexdigest()
+
+        return SchemaSnapshot(
+            table_name=table_name,
+            metadata_table=metadata_table,
+            versions=versions,
+            fingerprint=fingerprint,
+            columns=columns,
+            metadata=metadata,
+        )
+
+    def _path(self, key: str) -> str:
+        return os.path.join(
+            self.cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json"
+        )
+
+    def _load(self, key: str):
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                return SchemaSnapshot(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def _save(self, key: str, snapshot: SchemaSnapshot):
+        # Write to a temp file first so a crashed write never leaves a corrupt cache entry
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(asdict(snapshot), f, default=str)
+        os.replace(tmp_path, path)
+
+
+schema_context_cache = SchemaContextCache()
+
+
+def _format_entry(name, description) -> str:
+    return f"- **{name}**: {description}"
+
+
+def relevant_columns(
+    snapshot: SchemaSnapshot,
+    user_input: str,
+    top_k: int = SCHEMA_CONTEXT_TOP_K,
+    max_columns: int = SCHEMA_CONTEXT_MAX_COLUMNS,
+) -> list:
+    """Every column, or for wide tables the best matches for the question topped up in table order."""
+    columns = snapshot.columns
+    if not user_input or len(columns) <= max_columns:
+        return columns
+
+    ranked = schema_index_store.get(f"{snapshot.fingerprint}-columns", columns).search(
+        user_input, top_k
+    )
+    keep = {index for index, _ in ranked}
+    for index in range(len(columns)):
+        if len(keep) >= max_columns:
+            break
+        keep.add(index)
+    return [column for index, column in enumerate(columns) if index in keep]
+
+
+def relevant_metadata(
+    snapshot: SchemaSnapshot,
+    user_input: str,
+    top_k: int = SCHEMA_CONTEXT_TOP_K,
+    token_budget: int = SCHEMA_CONTEXT_TOKEN_BUDGET,
+) -> list:
+    """The attribute definitions most relevant to the question (BM25), at most top_k and within token_budget."""
+    metadata = snapshot.metadata
+    if not user_input or not metadata:
+        return metadata
+
+    ranked = schema_index_store.get(
+        f"{snapshot.fingerprint}-metadata", metadata
+    ).search(user_input)
+    if not ranked:
+        # Nothing matched: the first definitions are better than none
+        ranked = [(index, 0.0) for index in range(len(metadata))]
+    selected = select_entries(metadata, ranked, top_k, token_budget, _format_entry)
+    # Table order keeps the prompt stable for questions about the same variables
+    order = {tuple(entry): position for position, entry in enumerate(metadata)}
+    return sorted(selected, key=lambda entry: order[tuple(entry)])
+
+
+def build_table_context(
+    snapshot: SchemaSnapshot,
+    table_description: str,
+    user_input: str = None,
+    top_k: int = SCHEMA_CONTEXT_TOP_K,
+    token_budget: int = SCHEMA_CONTEXT_TOKEN_BUDGET,
+) -> str:
+    """
+    Prompt context for the table. With a user_input, only the columns and variable
+    definitions relevant to it are included; without one, the whole dictionary is.
+    """
+    table = snapshot.table_name.split(".")
+    selected_columns = relevant_columns(snapshot, user_input, top_k)
+    columns = "\n".join(
+        [
+            f"- **{column_name}**: {data_type}"
+            for column_name, data_type in selected_columns
+        ]
+    )
+    if len(selected_columns) < len(snapshot.columns):
+        columns += f"\n- ... {len(snapshot.columns) - len(selected_columns)} more columns not relevant to the question"
+
+    context = f"""
+    Here is the table name <tableName> {'.'.join(table)} </tableName>
+    <tableDescription>{table_description}</tableDescription>
+    Here are the columns of the {'.'.join(table)}
+    <columns>\n\n{columns}\n\n</columns>
+    """
+
+    selected_metadata = relevant_metadata(snapshot, user_input, top_k, token_budget)
+    if selected_metadata:
+        metadata = "\n".join(
+            [
+                _format_entry(variable_name, definition)
+                for variable_name, definition in selected_metadata
+            ]
+        )
+        heading = "Available variables by VARIABLE_NAME"
+        if len(selected_metadata) < len(snapshot.metadata):
+            heading += f" (the {len(selected_metadata)} most relevant to the question, out of {len(snapshot.metadata)})"
+        context += f"\n\n{heading}:\n\n{metadata}"
+
+    if user_input and snapshot.metadata:
+        full = sum(
+            estimate_tokens(_format_entry(*entry)) for entry in snapshot.metadata
+        )
+        sent = sum(
+            estimate_tokens(_format_entry(*entry)) for entry in selected_metadata
+        )
+        metrics.incr("schema_context.metadata_tokens_full", full)
+        metrics.incr("schema_context.metadata_tokens_sent", sent)
+
+    return context
+
+
+def get_table_context(
+    _snowflake_session: Session,
+    table_name: str = QUALIFIED_TABLE_NAME,
+    table_description: str = TABLE_DESCRIPTION,
+    metadata_table: str = METADATA_TABLE_NAME,
+    user_input: str = None,
+    top_k: int = SCHEMA_CONTEXT_TOP_K,
+    token_budget: int = SCHEMA_CONTEXT_TOKEN_BUDGET,
+) -> str:
+    snapshot = schema_context_cache.get_snapshot(
+        _snowflake_session, table_name, metadata_table
+    )
+    return build_table_context(
+        snapshot, table_description, user_input, top_k, token_budget
+    )
@@ -0,0 +1,222 @@
+# schema_index.py
+import json
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter
+
+from config import CACHE_DIR
+
+# BM25 parameters
+K1 = 1.5
+B = 0.75
+
+# Words that say nothing about which variable the question is about (English and Spanish)
+STOPWORDS = {
+    "a",
+    "an",
+    "and",
+    "are",
+    "as",
+    "at",
+    "be",
+    "by",
+    "for",
+    "from",
+    "has",
+    "have",
+    "how",
+    "in",
+    "is",
+    "it",
+    "many",
+    "me",
+    "much",
+    "of",
+    "on",
+    "or",
+    "per",
+    "show",
+    "that",
+    "the",
+    "their",
+    "there",
+    "this",
+    "to",
+    "was",
+    "were",
+    "what",
+    "when",
+    "where",
+    "which",
+    "who",
+    "with",
+    "give",
+    "list",
+    "number",
+    "count",
+    "al",
+    "como",
+    "con",
+    "cual",
+    "cuales",
+    "cuantos",
+    "cuantas",
+    "de",
+    "del",
+    "el",
+    "en",
+    "es",
+    "la",
+    "las",
+    "lo",
+    "los",
+    "mostrar",
+    "muestra",
+    "para",
+    "por",
+    "que",
+    "se",
+    "un",
+    "una",
+    "y",
+}
+
+
+def tokenize(text: str) -> list:
+    """Lowercase ASCII words; snake_case and camelCase names are split into their words."""
+    text = (
+        unicodedata.normalize("NFKD", str(text))
+        .encode("ascii", "ignore")
+        .decode("ascii")
+    )
+    text = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", text).lower()
+    tokens = []
+    for word in re.findall(r"[a-z0-9]+", text):
+        if len(word) < 2 or word in STOPWORDS:
+            continue
+        # Light stemming, so "patients" matches "patient"
+        if len(word) > 4 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+class BM25Index:
+    """Okapi BM25 over small documents such as column names and variable definitions."""
+
+    def __init__(self, term_frequencies: list, document_frequencies: dict):
+        self.term_frequencies = term_frequencies
+        self.document_frequencies = document_frequencies
+        lengths = [sum(frequencies.values()) for frequencies in term_frequencies]
+        self.lengths = lengths
+        self.average_length = sum(lengths) / len(lengths) if lengths else 0.0
+
+    @classmethod
+    def build(cls, documents: list) -> "BM25Index":
+        term_frequencies = [dict(Counter(tokenize(document))) for document in documents]
+        document_frequencies = Counter(
+            term for frequencies in term_frequencies for term in frequencies
+        )
+        return cls(term_frequencies, dict(document_frequencies))
+
+    def search(self, query: str, top_k: int = None) -> list:
+        """(document index, score) pairs with a positive score, best first."""
+        count = len(self.term_frequencies)
+        scores = [0.0] * count
+        for term in set(tokenize(query)):
+            frequency = self.document_frequencies.get(term)
+            if not frequency:
+                continue
+            idf = math.log(1 + (count - frequency + 0.5) / (frequency + 0.5))
+            for index, frequencies in enumerate(self.term_frequencies):
+                tf = frequencies.get(term)
+                if tf:
+                    norm = K1 * (
+                        1 - B + B * self.lengths[index] / (self.average_length or 1)
+                    )
+                    scores[index] += idf * tf * (K1 + 1) / (tf + norm)
+
+        ranked = sorted(
+            ((index, score) for index, score in enumerate(scores) if score > 0),
+            key=lambda item: item[1],
+            reverse=True,
+        )
+        return ranked[:top_k] if top_k is not None else ranked
+
+    def to_dict(self) -> dict:
+        return {
+            "term_frequencies": self.term_frequencies,
+            "document_frequencies": self.document_frequencies,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "BM25Index":
+        return cls(data["term_frequencies"], data["document_frequencies"])
+
+
+class SchemaIndexStore:
+    """
+    BM25 indexes over the columns and the attribute dictionary of a schema snapshot.
+    Keys include the schema fingerprint; indexes are kept in memory and persisted
+    under CACHE_DIR/schema_index, so they are only rebuilt when the schema changes.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR):
+        self.cache_dir = os.path.join(cache_dir, "schema_index")
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str, entries: list) -> BM25Index:
+        """Index over (name, description) entries; the name is repeated so a match on it outweighs the description."""
+        with self._lock:
+            index = self._indexes.get(key) or self._load(key)
+            if index is None or len(index.term_frequencies) != len(entries):
+                index = BM25Index.build(
+                    [f"{name} {name} {description}" for name, description in entries]
+                )
+                self._save(key, index)
+            self._indexes[key] = index
+            return index
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _load(self, key: str):
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                return BM25Index.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _save(self, key: str, index: BM25Index):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index.to_dict(), f)
+        os.replace(tmp_path, path)
+
+
+schema_index_store = SchemaIndexStore()
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English text with the OpenAI tokenizers
+    return len(text) // 4 + 1
+
+
+def select_entries(
+    entries: list, ranked: list, top_k: int, token_budget: int, format_entry
+) -> list:
+    """Entries of `ranked` in rank order, at most `top_k` and within `token_budget` tokens."""
+    selected, used = [], 0
+    for index, _ in ranked[:top_k]:
+        cost = estimate_tokens(format_entry(*entries[index]))
+        if used + cost > token_budget:
+            break
+        selected.append(entries[index])
+        used += cost
+    return selected
@@ -0,0 +1,203 @@
+# session_pool.py
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from snowflake.snowpark import Session
+
+from config import (
+    SESSION_POOL_ACQUIRE_TIMEOUT,
+    SESSION_POOL_IDLE_TIMEOUT,
+    SESSION_POOL_MAX_SIZE,
+    SESSION_POOL_MIN_SIZE,
+    SESSION_POOL_PING_INTERVAL,
+    create_session,
+)
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+TOKEN_EXPIRED = "Authentication token has expired"
+
+
+class SessionPoolExhausted(TimeoutError):
+    """Every session stayed in use for the whole acquire timeout."""
+
+
+@dataclass
+class _PooledSession:
+    session: Session
+    last_used: float
+    last_checked: float
+
+
+class SessionPool:
+    """
+    Snowpark sessions shared by every Streamlit session of the process.
+
+    Idle sessions are handed out most-recently-used first. A session that has not
+    been used for `ping_interval` seconds is checked with SELECT 1 before it is
+    handed out, and replaced if the check fails (e.g. an expired token). Sessions
+    idle for longer than `idle_timeout` are closed, down to `min_size`.
+    """
+
+    def __init__(
+        self,
+        factory=create_session,
+        min_size: int = SESSION_POOL_MIN_SIZE,
+        max_size: int = SESSION_POOL_MAX_SIZE,
+        idle_timeout: float = SESSION_POOL_IDLE_TIMEOUT,
+        ping_interval: float = SESSION_POOL_PING_INTERVAL,
+    ):
+        self.factory = factory
+        self.min_size = min_size
+        self.max_size = max(max_size, 1)
+        self.idle_timeout = idle_timeout
+        self.ping_interval = ping_interval
+
+        self._idle = []
+        self._in_use = {}
+        self._size = 0
+        self._condition = threading.Condition()
+
+    def prefill(self):
+        # Open min_size sessions up front so the first message doesn't pay for the login
+        with self._condition:
+            missing = max(self.min_size - self._size, 0)
+            self._size += missing
+        now = time.time()
+        for _ in range(missing):
+            try:
+                entry = _PooledSession(self._create(), now, now)
+            except Exception:
+                with self._condition:
+                    self._size -= 1
+                raise
+            with self._condition:
+                self._idle.append(entry)
+                self._condition.notify()
+
+    def acquire(self, timeout: float = SESSION_POOL_ACQUIRE_TIMEOUT) -> Session:
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            expired = []
+            with self._condition:
+                while True:
+                    expired += self._take_expired()
+                    if self._idle:
+                        entry = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        entry = None
+                        break
+                    remaining = (
+                        deadline - time.monotonic() if deadline is not None else None
+                    )
+                    if remaining is not None and remaining <= 0:
+                        metrics.incr("session_pool.exhausted")
+                        raise SessionPoolExhausted(
+                            "No Snowflake session available in the pool"
+                        )
+                    self._condition.wait(remaining)
+            for stale in expired:
+                self._close(stale.session)
+
+            if entry is None:
+                try:
+                    now = time.time()
+                    entry = _PooledSession(self._create(), now, now)
+                except Exception:
+                    with self._condition:
+                        self._size -= 1
+                        self._condition.notify()
+                    raise
+            elif time.time() - entry.last_checked > self.ping_interval:
+                if not self._ping(entry.session):
+                    self._discard(entry.session)
+                    continue
+                entry.last_checked = time.time()
+            else:
+                metrics.incr("session_pool.reused")
+
+            with self._condition:
+                self._in_use[id(entry.session)] = entry
+            return entry.session
+
+    def release(self, session: Session, discard: bool = False):
+        with self._condition:
+            entry = self._in_use.pop(id(session), None)
+            if entry is not None and not discard:
+                entry.last_used = time.time()
+                self._idle.append(entry)
+                self._condition.notify()
+                return
+        if entry is not None:
+            self._discard(session)
+
+    @contextmanager
+    def session(self, timeout: float = SESSION_POOL_ACQUIRE_TIMEOUT):
+        session = self.acquire(timeout)
+        discard = False
+        try:
+            yield session
+        except Exception as e:
+            # The next acquire() must not get a session whose token is no longer valid
+            discard = TOKEN_EXPIRED in str(e)
+            raise
+        finally:
+            self.release(session, discard=discard)
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": len(self._in_use),
+            }
+
+    def _take_expired(self) -> list:
+        # Called with the lock held; the caller closes the returned sessions outside of it
+        now = time.time()
+        expired = []
+        for entry in list(self._idle):
+            if self._size - len(expired) <= self.min_size:
+                break
+            if now - entry.last_used > self.idle_timeout:
+                self._idle.remove(entry)
+                expired.append(entry)
+        self._size -= len(expired)
+        metrics.incr("session_pool.evicted", len(expired))
+        return expired
+
+    def _create(self) -> Session:
+        with metrics.timer("session_pool.create"):
+            session = self.factory()
+        metrics.incr("session_pool.created")
+        return session
+
+    def _ping(self, session: Session) -> bool:
+        try:
+            session.sql("SELECT 1").collect()
+            return True
+        except Exception as e:
+            logger.warning(
+                "Discarding Snowflake session that failed the liveness check: %s", e
+            )
+            metrics.incr("session_pool.ping_failed")
+            return False
+
+    def _discard(self, session: Session):
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+        self._close(session)
+
+    @staticmethod
+    def _close(session: Session):
+        try:
+            session.close()
+        except Exception as e:
+            logger.debug("Error closing Snowflake session: %s", e)
@@ -0,0 +1,146 @@
+# speculation.py
+import asyncio
+import logging
+import time
+
+from snowflake.snowpark import Session
+
+from config import SPECULATION_MIN_QUERY_RATE, SPECULATION_WARMUP, SPECULATIVE_SQL
+from event_loop import get_event_loop
+from llm.query_generator import QueryGeneratorLLM
+from metrics import metrics
+from schema_index import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+
+def should_speculate() -> bool:
+    """SPECULATIVE_SQL "on" always speculates; "auto" only while most evaluated inputs are data questions."""
+    if SPECULATIVE_SQL == "on":
+        return True
+    if SPECULATIVE_SQL != "auto":
+        return False
+    queries, others = metrics.get("speculation.query_inputs"), metrics.get(
+        "speculation.other_inputs"
+    )
+    if queries + others < SPECULATION_WARMUP:
+        return True
+    return queries / (queries + others) >= SPECULATION_MIN_QUERY_RATE
+
+
+def record_evaluation(is_a_query: bool):
+    # Every input that went to InputEvaluatorLLM, whether speculation ran or not, so "auto" can turn it back on
+    metrics.incr(
+        "speculation.query_inputs" if is_a_query else "speculation.other_inputs"
+    )
+
+
+class SqlSpeculation:
+    """
+    QueryGeneratorLLM output generated while InputEvaluatorLLM is still classifying the input.
+
+    The generation runs on the shared event loop. If the input is a query, stream()
+    replays what was generated so far and follows the rest; otherwise cancel() stops
+    it and records the tokens spent for nothing.
+    """
+
+    def __init__(self, snowflake_session: Session, user_input: str):
+        self.generator = QueryGeneratorLLM(snowflake_session)
+        self.user_input = user_input
+        self.chunks = []
+        self.done = False
+        self.streamed = False
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self.evaluated_at = None
+        self._changed = asyncio.Event()
+        self._task = None
+
+    def start(self) -> "SqlSpeculation":
+        self.started_at = time.perf_counter()
+        try:
+            asyncio.get_running_loop()
+            self._task = asyncio.ensure_future(self._run())
+        except RuntimeError:
+            # Called from a thread without a loop (the sync pipeline)
+            self._task = asyncio.run_coroutine_threadsafe(self._run(), get_event_loop())
+        metrics.incr("speculation.started")
+        return self
+
+    async def _run(self):
+        try:
+            async for token in self.generator.astream_response(self.user_input):
+                self.chunks.append(token)
+                self._changed.set()
+            self.finished_at = time.perf_counter()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._changed.set()
+
+    def mark_evaluated(self):
+        self.evaluated_at = time.perf_counter()
+
+    async def stream(self):
+        """The generated text: chunks produced so far, then the rest as it arrives."""
+        self.streamed = True
+        position = 0
+        while True:
+            while position < len(self.chunks):
+                yield self.chunks[position]
+                position += 1
+            if self.done:
+                break
+            self._changed.clear()
+            if position == len(self.chunks) and not self.done:
+                await self._changed.wait()
+
+        if self.error is not None:
+            raise self.error
+        self._record_used()
+
+    def cancel(self):
+        if self._task is not None and not self.done:
+            self._task.cancel()
+        wasted = self._wasted_tokens()
+        metrics.incr("speculation.cancelled")
+        metrics.incr("speculation.wasted_tokens", wasted)
+        logger.info("Speculative SQL cancelled, %s tokens wasted", wasted)
+
+    def _wasted_tokens(self) -> int:
+        # The prompt was sent as soon as the generation started; streamed chunks are about one token each
+        prompt = getattr(self.generator, "last_prompt", None)
+        return (estimate_tokens(prompt) if prompt else 0) + len(self.chunks)
+
+    def _record_used(self):
+        # Without speculation the generation would have started when the evaluation returned
+        duration = self.finished_at - self.started_at
+        head_start = (self.evaluated_at or self.finished_at) - self.started_at
+        saved = max(min(head_start, duration), 0.0)
+        metrics.incr("speculation.used")
+        metrics.observe("speculation.latency_saved", saved)
+        logger.info("Speculative SQL used, %.2fs saved", saved)
+
+
+def report() -> dict:
+    used, cancelled = metrics.get("speculation.used"), metrics.get(
+        "speculation.cancelled"
+    )
+    queries, others = metrics.get("speculation.query_inputs"), metrics.get(
+        "speculation.other_inputs"
+    )
+    return {
+        "mode": SPECULATIVE_SQL,
+        "query_rate": queries / (queries + others) if queries + others else 0.0,
+        "used": used,
+        "cancelled": cancelled,
+        "mean_latency_saved_seconds": metrics.mean("speculation.latency_saved"),
+        "wasted_tokens": metrics.get("speculation.wasted_tokens"),
+        "wasted_tokens_per_cancel": (
+            metrics.get("speculation.wasted_tokens") / cancelled if cancelled else 0.0
+        ),
+    }
@@ -0,0 +1,68 @@
+# sql_cache.py
+import hashlib
+import re
+
+from cache_store import TieredCache
+from config import (
+    SQL_CACHE_MAX_ENTRIES,
+    SQL_CACHE_MEMORY_ENTRIES,
+    SQL_CACHE_TTL_SECONDS,
+)
+from metrics import metrics
+
+
+def normalize_question(question: str) -> str:
+    # Case, repeated whitespace and trailing punctuation don't change the generated SQL
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip(" ?!.")
+
+
+def format_sql_blocks(queries: list) -> str:
+    return "\n".join(f"```sql\n{query}\n```" for query in queries)
+
+
+class SqlCache:
+    """
+    Cache of (normalized question, schema fingerprint) -> SQL blocks that executed successfully,
+    with the evaluation's include_chart so a hit needs no LLM call at all.
+    """
+
+    def __init__(self, store: TieredCache = None):
+        self.store = store or TieredCache(
+            "sql_cache",
+            ttl_seconds=SQL_CACHE_TTL_SECONDS,
+            max_memory_items=SQL_CACHE_MEMORY_ENTRIES,
+            max_disk_items=SQL_CACHE_MAX_ENTRIES,
+        )
+
+    @staticmethod
+    def _key(question: str, fingerprint: str) -> str:
+        return hashlib.sha256(
+            f"{fingerprint}|{normalize_question(question)}".encode("utf-8")
+        ).hexdigest()
+
+    def get(self, question: str, fingerprint: str):
+        """{"sql_queries": [...], "include_chart": bool}, or None."""
+        entry = self.store.get(self._key(question, fingerprint))
+        # Entries written before include_chart was stored are misses
+        if not isinstance(entry, dict):
+            entry = None
+        metrics.incr("sql_cache.hit" if entry else "sql_cache.miss")
+        return entry
+
+    def set(
+        self,
+        question: str,
+        fingerprint: str,
+        queries: list,
+        include_chart: bool = False,
+    ):
+        if queries:
+            entry = {"sql_queries": list(queries), "include_chart": include_chart}
+            self.store.set(self._key(question, fingerprint), entry)
+
+    def invalidate(self, question: str, fingerprint: str):
+        self.store.delete(self._key(question, fingerprint))
+
+
+sql_cache = SqlCache()
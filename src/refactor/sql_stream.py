@@ -0,0 +1,51 @@
+# sql_stream.py
+import re
+from dataclasses import dataclass
+
+# The fence every generator is prompted to wrap its SQL in
+SQL_FENCE = re.compile(r"```sql\n(.*?)\n```", re.DOTALL)
+
+
+def extract_sql(text: str) -> list:
+    return SQL_FENCE.findall(text)
+
+
+@dataclass
+class DispatchedQuery:
+    """A block started before the answer finished streaming: its cost decision, then its result."""
+
+    query: str
+    # Futures (concurrent or asyncio); the result is None when the decision stopped the query
+    decision: object
+    result: object
+
+
+class SqlFenceParser:
+    """
+    Finds the ```sql blocks of an answer while it is being streamed.
+
+    feed() returns the blocks closed by the new text. Once the stream ends,
+    `queries` is exactly extract_sql() of the whole answer: the text only grows,
+    so a block matched in a prefix is matched the same way in the full text.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.queries = []
+        self._position = 0
+
+    def feed(self, chunk: str) -> list:
+        if not chunk:
+            return []
+        scan_from = len(self.text)
+        self.text += chunk
+        # Only a new closing fence can complete a block; its backticks may straddle the previous chunk
+        if "```" not in self.text[max(scan_from - 3, self._position) :]:
+            return []
+
+        closed = []
+        for match in SQL_FENCE.finditer(self.text, self._position):
+            closed.append(match.group(1))
+            self._position = match.end()
+        self.queries.extend(closed)
+        return closed
@@ -0,0 +1,209 @@
+# sql_validator.py
+import difflib
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import SqlglotError
+
+from config import DATABASE, SCHEMA
+from metrics import metrics
+from schema_context import METADATA_TABLE_NAME, QUALIFIED_TABLE_NAME, SchemaSnapshot
+
+# Date/time parts Snowflake accepts as bare words, e.g. DATEADD(day, ...), that may parse as columns
+DATE_PARTS = {
+    "YEAR",
+    "YEARS",
+    "Y",
+    "YY",
+    "YYYY",
+    "QUARTER",
+    "QUARTERS",
+    "Q",
+    "MONTH",
+    "MONTHS",
+    "MM",
+    "MON",
+    "WEEK",
+    "WEEKS",
+    "W",
+    "WK",
+    "DAY",
+    "DAYS",
+    "D",
+    "DD",
+    "DAYOFWEEK",
+    "DAYOFYEAR",
+    "HOUR",
+    "HOURS",
+    "H",
+    "HH",
+    "MINUTE",
+    "MINUTES",
+    "MI",
+    "SECOND",
+    "SECONDS",
+    "S",
+    "SS",
+    "MILLISECOND",
+    "MICROSECOND",
+    "NANOSECOND",
+}
+
+
+# Nodes that write or change objects, wherever they appear in a statement
+WRITE_NODES = (exp.DML, exp.DDL, exp.Drop, exp.Alter, exp.Command)
+
+
+class SqlValidationError(Exception):
+    """A generated query that would fail in Snowflake, or must not run at all, found without running it."""
+
+
+def _suggest(name: str, candidates) -> str:
+    matches = difflib.get_close_matches(name, sorted(candidates), n=3)
+    return f" Did you mean {', '.join(matches)}?" if matches else ""
+
+
+def _check_filter_clause(statement: exp.Expression):
+    if statement.find(exp.Filter):
+        raise SqlValidationError(
+            "Snowflake does not support the `FILTER (WHERE ...)` clause on aggregates. "
+            "Use COUNT_IF, IFF or CASE WHEN inside the aggregate instead."
+        )
+
+
+def _check_statement(statements: list) -> exp.Expression:
+    """The only statement of the query, after checking it is a read-only SELECT (optionally WITH ...)."""
+    if not statements:
+        raise SqlValidationError("The query is empty.")
+    if len(statements) > 1:
+        raise SqlValidationError(
+            "Only one statement can run per query. Put each query in its own ```sql block."
+        )
+
+    statement = statements[0]
+    while isinstance(statement, exp.Subquery):
+        statement = statement.this
+    if not isinstance(statement, (exp.Select, exp.SetOperation)) or statement.find(
+        *WRITE_NODES
+    ):
+        raise SqlValidationError(
+            "Only SELECT queries (optionally starting with WITH) can be run."
+        )
+    return statement
+
+
+def _qualified(name: str) -> tuple:
+    """Database, schema and table of a dotted name, None for the parts it leaves out."""
+    parts = [part.strip('"').upper() for part in name.split(".")]
+    return (None,) * (3 - len(parts)) + tuple(parts[-3:])
+
+
+def _same_table(reference: tuple, allowed: tuple) -> bool:
+    # Unqualified references resolve to the session's database and schema, when known
+    defaults = (DATABASE, SCHEMA, None)
+    for part, allowed_part, default in zip(reference, allowed, defaults):
+        part = part or (default.upper() if default else None)
+        if part is not None and allowed_part is not None and part != allowed_part:
+            return False
+    return True
+
+
+def _check_tables(
+    statement: exp.Expression, table_name: str, metadata_table: str
+) -> dict:
+    """Alias -> table name of every table the statement reads, after checking each one is allowed."""
+    allowed = [_qualified(name) for name in (table_name, metadata_table) if name]
+    ctes = {cte.alias_or_name.upper() for cte in statement.find_all(exp.CTE)}
+
+    # Table functions can read anything (RESULT_SCAN, INFORMATION_SCHEMA, ...); FLATTEN only reads its input
+    for function in statement.find_all(exp.TableFromRows):
+        if not isinstance(function.this, exp.Explode):
+            raise SqlValidationError(
+                f"{function.sql(dialect='snowflake')} can't be queried. Only {table_name} can be queried."
+            )
+
+    sources = {}
+    for table in statement.find_all(exp.Table):
+        name = table.name.upper()
+        if not name or (name in ctes and not table.db):
+            continue
+        reference = (table.catalog.upper() or None, table.db.upper() or None, name)
+        if not any(_same_table(reference, allowed_name) for allowed_name in allowed):
+            known = {allowed_name[-1] for allowed_name in allowed}
+            raise SqlValidationError(
+                f"Table {table.sql(dialect='snowflake')} can't be queried. "
+                f"Only {table_name} can be queried.{_suggest(name, known)}"
+            )
+        sources[table.alias_or_name.upper()] = name
+    return sources
+
+
+def _check_columns(statement: exp.Expression, snapshot: SchemaSnapshot, sources: dict):
+    # PIVOT output columns come from data values, they can't be checked against the schema
+    if not snapshot.columns or statement.find(exp.Pivot):
+        return
+
+    main_table = snapshot.table_name.upper().split(".")[-1]
+    columns = {column_name.upper() for column_name, _ in snapshot.columns}
+    # Names introduced by the query itself: select aliases, CTE and derived table column lists
+    aliases = {alias.alias.upper() for alias in statement.find_all(exp.Alias)}
+    for table_alias in statement.find_all(exp.TableAlias):
+        aliases.add(table_alias.name.upper())
+        aliases.update(column.name.upper() for column in table_alias.columns)
+    for function in statement.find_all(exp.Lambda):
+        aliases.update(argument.name.upper() for argument in function.expressions)
+    # Unqualified columns can only be checked when the main table is the only source
+    only_main_table = set(sources.values()) == {main_table} and not statement.find(
+        exp.Subquery, exp.CTE, exp.Lateral
+    )
+
+    for column in statement.find_all(exp.Column):
+        name = column.name.upper()
+        if not name or name == "*" or name in aliases or name in DATE_PARTS:
+            continue
+        qualifier = column.table.upper()
+        if qualifier:
+            # Columns of CTEs, subqueries and the metadata table are not in the snapshot
+            if sources.get(qualifier) != main_table:
+                continue
+        elif not only_main_table:
+            continue
+        if name not in columns:
+            raise SqlValidationError(
+                f"Column {column.sql(dialect='snowflake')} does not exist in {snapshot.table_name}.{_suggest(name, columns)} "
+                f"Available columns: {', '.join(column_name for column_name, _ in snapshot.columns)}."
+            )
+
+
+def validate_sql(query: str, snapshot: SchemaSnapshot = None):
+    """
+    Parse the query with the Snowflake dialect, check it is a single SELECT on the chatbot's
+    tables and, given a snapshot, check its columns against the cached schema. Raises
+    SqlValidationError with a message meant for ErrorFeedbackLLM.
+    """
+    try:
+        statements = [
+            statement
+            for statement in sqlglot.parse(query, read="snowflake")
+            if statement is not None
+        ]
+    except SqlglotError as e:
+        raise SqlValidationError(f"The query is not valid Snowflake SQL: {e}") from e
+
+    statement = _check_statement(statements)
+    if snapshot is None:
+        _check_tables(statement, QUALIFIED_TABLE_NAME, METADATA_TABLE_NAME)
+        return
+    _check_filter_clause(statement)
+    sources = _check_tables(statement, snapshot.table_name, snapshot.metadata_table)
+    _check_columns(statement, snapshot, sources)
+
+
+def validate_queries(sql_queries: list, snapshot: SchemaSnapshot = None):
+    for query in sql_queries:
+        try:
+            validate_sql(query, snapshot)
+        except SqlValidationError as e:
+            metrics.incr("sql_validator.rejected")
+            raise SqlValidationError(f"{e}\n\nQuery:\n{query}") from e
+    metrics.incr("sql_validator.passed", len(sql_queries))
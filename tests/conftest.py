@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The app modules import each other by their bare names, as under `streamlit run ./src/refactor/app.py`
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "refactor")
+)
@@ -0,0 +1,366 @@
+import asyncio
+import json
+
+import pandas as pd
+import pytest
+from snowflake.connector import ProgrammingError
+
+import async_app_logic
+from async_app_logic import AsyncAppLogic
+from cache_store import TieredCache
+from confirmations import PendingConfirmations
+from cost_guard import CostGuard
+from events import ERROR, INFO, MESSAGE, RESULT, SQL, WARNING
+from metrics import metrics
+from parsers import InputEvaluator, RoutedQuery
+from result_cache import ResultCache
+from schema_context import METADATA_TABLE_NAME, QUALIFIED_TABLE_NAME, SchemaSnapshot
+from session_pool import TOKEN_EXPIRED
+from sql_cache import SqlCache
+
+FIRST = f"SELECT COMPANY FROM {QUALIFIED_TABLE_NAME}"
+SECOND = f"SELECT COUNT(*) AS N FROM {QUALIFIED_TABLE_NAME}"
+
+
+def answer(*queries) -> str:
+    return "".join(f"Here you go:\n```sql\n{query}\n```\n" for query in queries)
+
+
+class FakeJob:
+    def __init__(self, query_id: str):
+        self.query_id = query_id
+
+    def is_done(self):
+        return True
+
+    def result(self, kind):
+        return iter([pd.DataFrame({"N": [1, 2]})])
+
+    def cancel(self):
+        pass
+
+
+class FakeSession:
+    """Runs every query instantly; EXPLAIN reports `pool.scanned_bytes` for the cost guard."""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.query = None
+
+    def sql(self, query):
+        if query.startswith("EXPLAIN"):
+            self.query = query
+            return self
+        errors = self.pool.failures.get(query)
+        if errors:
+            raise errors.pop(0)
+        self.pool.executed.append(query)
+        self.query = query
+        return self
+
+    def collect(self):
+        stats = {
+            "partitionsTotal": 10,
+            "partitionsAssigned": 1,
+            "bytesAssigned": self.pool.scanned_bytes,
+        }
+        return [[json.dumps({"GlobalStats": stats})]]
+
+    def collect_nowait(self, statement_params=None):
+        return FakeJob(f"query-{len(self.pool.executed)}")
+
+
+class FakePool:
+    def __init__(self):
+        self.executed = []
+        # Query -> errors it raises, in order
+        self.failures = {}
+        self.scanned_bytes = 1000
+        self.leased = 0
+        self.discarded = 0
+
+    def acquire(self):
+        self.leased += 1
+        return FakeSession(self)
+
+    def release(self, session, discard=False):
+        self.leased -= 1
+        self.discarded += discard
+
+
+class FakeSchemaCache:
+    snapshot = SchemaSnapshot(
+        table_name=QUALIFIED_TABLE_NAME,
+        metadata_table=METADATA_TABLE_NAME,
+        versions={},
+        fingerprint="fingerprint",
+        columns=[("COMPANY", "TEXT"), ("BMI", "NUMBER")],
+        metadata=[],
+    )
+
+    def get_fingerprint(self, snowflake_session):
+        return self.snapshot.fingerprint
+
+    def get_snapshot(self, snowflake_session):
+        return self.snapshot
+
+    def get_data_version(self, snowflake_session):
+        return "v1"
+
+
+class FakeEvaluator:
+    prefilter = None
+
+    def __init__(self):
+        self.evaluation = InputEvaluator(
+            is_a_query=True, include_chart=False, simple_answer=False
+        )
+
+    async def aevaluate(self, user_input, use_prefilter=True):
+        return self.evaluation
+
+
+class UncachedResults(ResultCache):
+    # Every query reaches the fake session
+    @staticmethod
+    def is_cacheable(query):
+        return False
+
+
+@pytest.fixture
+def answers(monkeypatch):
+    """
+    The answers the generators stream, each a list of chunks, consumed in order.
+    A chunk can be a coroutine function, awaited when the model gets to it.
+    """
+    scripted = []
+
+    class FakeGenerator:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        async def astream_response(self, *args):
+            for chunk in scripted.pop(0):
+                yield await chunk() if callable(chunk) else chunk
+
+    for name in ("QueryGeneratorLLM", "ErrorFeedbackLLM", "SimpleGeneratorLLM"):
+        monkeypatch.setattr(async_app_logic, name, FakeGenerator)
+    return scripted
+
+
+@pytest.fixture
+def pool(tmp_path, monkeypatch):
+    monkeypatch.setattr(async_app_logic, "schema_context_cache", FakeSchemaCache())
+    monkeypatch.setattr(
+        async_app_logic, "result_cache", UncachedResults(cache_dir=str(tmp_path))
+    )
+    monkeypatch.setattr(
+        async_app_logic,
+        "sql_cache",
+        SqlCache(TieredCache("sql", 60, cache_dir=str(tmp_path))),
+    )
+    monkeypatch.setattr(
+        async_app_logic,
+        "pending_confirmations",
+        PendingConfirmations(TieredCache("confirmations", 60, cache_dir=str(tmp_path))),
+    )
+    monkeypatch.setattr(
+        async_app_logic,
+        "cost_guard",
+        CostGuard(
+            confirm_bytes=10**6,
+            reject_bytes=10**9,
+            confirm_partitions=0,
+            reject_partitions=0,
+        ),
+    )
+    monkeypatch.setattr(async_app_logic, "COST_GUARD_ENABLED", True)
+    monkeypatch.setattr(async_app_logic, "EARLY_SQL_DISPATCH", False)
+    monkeypatch.setattr(async_app_logic, "SQL_VALIDATION_ENABLED", True)
+    monkeypatch.setattr(async_app_logic, "SQL_VALIDATION_MAX_RETRIES", 2)
+    monkeypatch.setattr(async_app_logic, "should_speculate", lambda: False)
+    return FakePool()
+
+
+@pytest.fixture
+def logic(pool):
+    return AsyncAppLogic("split", session_pool=pool, input_evaluator=FakeEvaluator())
+
+
+def of_type(events, event_type) -> list:
+    return [event.data for event in events if event.type == event_type]
+
+
+def run(logic, user_input, confirm_token=None) -> list:
+    async def collect():
+        return [event async for event in logic.handle_input(user_input, confirm_token)]
+
+    return asyncio.run(collect())
+
+
+def test_blocks_closed_by_one_chunk_each_run_once(logic, pool, answers, monkeypatch):
+    monkeypatch.setattr(async_app_logic, "EARLY_SQL_DISPATCH", True)
+    answers.append([answer(FIRST, SECOND)])
+
+    events = run(logic, "companies and how many records")
+    results = {
+        event.index: event.data.query for event in events if event.type == RESULT
+    }
+    assert results == {0: FIRST, 1: SECOND}
+    assert sorted(pool.executed) == sorted([FIRST, SECOND])
+    assert pool.leased == 0
+
+
+def test_answers_that_need_no_query_are_streamed(logic, pool, answers):
+    logic.input_evaluator.evaluation = InputEvaluator(
+        is_a_query=False, include_chart=False, simple_answer=True
+    )
+    answers.append(["Hello", ", how can I help?"])
+
+    events = run(logic, "hello")
+    assert of_type(events, MESSAGE) == [
+        {"role": "assistant", "content": "Hello, how can I help?"}
+    ]
+    assert pool.executed == []
+
+
+def test_repeated_questions_reuse_the_sql_that_ran(logic, pool, answers):
+    answers.append([answer(FIRST)])
+    run(logic, "Which companies?")
+
+    # No answer is scripted: a second LLM call would fail
+    events = run(logic, "which companies")
+    assert of_type(events, SQL) == [f"```sql\n{FIRST}\n```"]
+    assert pool.executed == [FIRST, FIRST]
+
+
+def test_combined_mode_runs_the_routed_sql(pool, answers, monkeypatch):
+    class FakeRouter:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        async def agenerate_response(self, user_input):
+            return RoutedQuery(
+                is_a_query=True,
+                include_chart=False,
+                simple_answer=False,
+                sql_queries=[SECOND],
+            )
+
+    monkeypatch.setattr(async_app_logic, "RoutedQueryGeneratorLLM", FakeRouter)
+    events = run(
+        AsyncAppLogic("combined", session_pool=pool, input_evaluator=FakeEvaluator()),
+        "how many?",
+    )
+    assert [result.query for result in of_type(events, RESULT)] == [SECOND]
+
+
+def test_failing_queries_use_up_the_attempts(logic, pool, answers):
+    pool.failures[FIRST] = [
+        ProgrammingError("SQL compilation error")
+    ] * async_app_logic.MAX_RETRIES
+    answers.extend([answer(FIRST)] for _ in range(async_app_logic.MAX_RETRIES))
+
+    events = run(logic, "companies")
+    assert of_type(events, ERROR)[-1] == "All attempts failed."
+    assert len(of_type(events, ERROR)) == async_app_logic.MAX_RETRIES + 1
+    assert answers == [] and pool.executed == []
+
+
+def test_schema_rejections_are_retried_then_left_to_snowflake(logic, pool, answers):
+    unknown_column = f"SELECT WEIGHT FROM {QUALIFIED_TABLE_NAME}"
+    retries = async_app_logic.SQL_VALIDATION_MAX_RETRIES
+    answers.extend([answer(unknown_column)] for _ in range(retries + 1))
+
+    events = run(logic, "weights")
+    assert len(of_type(events, WARNING)) == retries
+    # The snapshot may be what is wrong: past the retries only the read-only check runs
+    assert pool.executed == [unknown_column]
+
+
+def test_sql_that_must_never_run_ends_after_the_attempts(logic, pool, answers):
+    delete = f"DELETE FROM {QUALIFIED_TABLE_NAME}"
+    retries = async_app_logic.SQL_VALIDATION_MAX_RETRIES + async_app_logic.MAX_RETRIES
+    answers.extend([answer(delete)] for _ in range(retries))
+
+    events = run(logic, "delete everything")
+    assert of_type(events, ERROR) == ["All attempts failed."]
+    assert answers == [] and pool.executed == []
+
+
+def test_an_expired_token_reruns_the_same_sql_on_a_fresh_session(logic, pool, answers):
+    pool.failures[FIRST] = [ProgrammingError(f"390114: {TOKEN_EXPIRED}.")]
+    answers.append([answer(FIRST)])
+
+    events = run(logic, "companies")
+    assert "The Snowflake session expired, reconnecting..." in of_type(events, INFO)
+    assert [result.query for result in of_type(events, RESULT)] == [FIRST]
+    assert pool.executed == [FIRST] and pool.discarded == 1 and pool.leased == 0
+
+
+def test_expensive_queries_wait_for_a_single_use_confirmation(logic, pool, answers):
+    pool.scanned_bytes = 2 * 10**6
+    answers.append([answer(FIRST)])
+
+    events = run(logic, "companies")
+    token = of_type(events, MESSAGE)[-1]["confirm"]["token"]
+    assert pool.executed == []
+
+    # Estimated again, but not held back for another confirmation
+    events = run(logic, None, confirm_token=token)
+    assert [result.query for result in of_type(events, RESULT)] == [FIRST]
+    assert pool.executed == [FIRST]
+
+    events = run(logic, None, confirm_token=token)
+    assert of_type(events, ERROR) == [
+        "This confirmation has expired or was already used. Please ask the question again."
+    ]
+    assert pool.executed == [FIRST]
+
+
+def test_queries_above_the_reject_threshold_never_run(logic, pool, answers):
+    pool.scanned_bytes = 2 * 10**9
+    answers.append([answer(FIRST)])
+
+    events = run(logic, "everything")
+    assert of_type(events, ERROR)[0].startswith(
+        "The query was not run because it would scan 1.9 GB"
+    )
+    assert pool.executed == []
+
+
+def test_the_first_query_runs_while_the_next_one_is_written(
+    logic, pool, answers, monkeypatch
+):
+    monkeypatch.setattr(async_app_logic, "EARLY_SQL_DISPATCH", True)
+    executed_mid_stream = []
+
+    async def second_block():
+        for _ in range(100):
+            if pool.executed:
+                break
+            await asyncio.sleep(0.01)
+        executed_mid_stream.extend(pool.executed)
+        return answer(SECOND)
+
+    answers.append([answer(FIRST), second_block])
+    dispatched = metrics.snapshot()["counters"].get("queries.dispatched_early", 0)
+
+    events = run(logic, "companies and how many records")
+    assert executed_mid_stream == [FIRST]
+    assert [result.query for result in of_type(events, RESULT)] in (
+        [FIRST, SECOND],
+        [SECOND, FIRST],
+    )
+    assert sorted(pool.executed) == sorted([FIRST, SECOND])
+    assert metrics.snapshot()["counters"]["queries.dispatched_early"] == dispatched + 2
+
+
+def test_early_queries_wait_for_the_confirmation_too(logic, pool, answers, monkeypatch):
+    monkeypatch.setattr(async_app_logic, "EARLY_SQL_DISPATCH", True)
+    pool.scanned_bytes = 2 * 10**6
+    answers.append([answer(FIRST), "\nThat is all."])
+
+    events = run(logic, "companies")
+    assert "confirm" in of_type(events, MESSAGE)[-1]
+    assert pool.executed == [] and pool.leased == 0
@@ -0,0 +1,68 @@
+import types
+
+import pytest
+
+import cache_store
+from cache_store import TieredCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_store, "time", types.SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+def cache(tmp_path, **options) -> TieredCache:
+    options = {"ttl_seconds": 60, "max_memory_items": 2, "max_disk_items": 3, **options}
+    return TieredCache("test", cache_dir=str(tmp_path), **options)
+
+
+def test_values_outlive_the_memory_tier(tmp_path, clock):
+    cache(tmp_path).set("question", {"sql_queries": ["SELECT 1"]})
+    # A new process only has the SQLite tier
+    assert cache(tmp_path).get("question") == {"sql_queries": ["SELECT 1"]}
+
+
+def test_entries_expire_after_the_ttl(tmp_path, clock):
+    store = cache(tmp_path)
+    store.set("question", "answer")
+    clock[0] += 59
+    assert store.get("question") == "answer"
+    clock[0] += 1
+    assert store.get("question") is None
+    assert cache(tmp_path).get("question") is None
+
+
+def test_the_memory_tier_keeps_the_most_recently_used(tmp_path, clock):
+    store = cache(tmp_path)
+    store.set("a", 1)
+    store.set("b", 2)
+    store.get("a")
+    store.set("c", 3)
+    assert list(store._memory) == ["a", "c"]
+    # Evicted from memory only, still on disk
+    assert store.get("b") == 2
+
+
+def test_the_disk_tier_evicts_the_least_recently_used(tmp_path, clock):
+    store = cache(tmp_path, max_memory_items=0)
+    for key in ("a", "b", "c"):
+        store.set(key, key)
+        clock[0] += 1
+    store.get("a")
+    clock[0] += 1
+    store.set("d", "d")
+
+    reopened = cache(tmp_path)
+    assert [reopened.get(key) for key in ("a", "b", "c", "d")] == ["a", None, "c", "d"]
+
+
+def test_delete_and_clear(tmp_path, clock):
+    store = cache(tmp_path)
+    store.set("a", 1)
+    store.set("b", 2)
+    store.delete("a")
+    assert store.get("a") is None and cache(tmp_path).get("a") is None
+    store.clear()
+    assert store.get("b") is None and cache(tmp_path).get("b") is None
@@ -0,0 +1,108 @@
+import json
+
+import pytest
+
+from cache_store import TieredCache
+from confirmations import PendingConfirmations
+from cost_guard import ALLOW, CONFIRM, REJECT, CostEstimate, CostGuard
+
+GB = 1024**3
+
+
+class ExplainSession:
+    """Answers EXPLAIN USING JSON with the given GlobalStats."""
+
+    def __init__(self, **stats):
+        self.stats = stats
+        self.queries = []
+
+    def sql(self, query):
+        self.queries.append(query)
+        return self
+
+    def collect(self):
+        return [[json.dumps({"GlobalStats": self.stats, "Operations": [[]]})]]
+
+
+def test_estimate_reads_the_global_stats():
+    session = ExplainSession(
+        partitionsTotal=120, partitionsAssigned=7, bytesAssigned=5 * GB
+    )
+    estimate = CostGuard.estimate(session, "SELECT * FROM T;\n")
+    assert estimate == CostEstimate(
+        partitions_total=120, partitions_assigned=7, bytes_assigned=5 * GB
+    )
+    assert session.queries == ["EXPLAIN USING JSON SELECT * FROM T"]
+    assert CostGuard.estimate(ExplainSession(), "SELECT 1") == CostEstimate(0, 0, 0)
+
+
+@pytest.mark.parametrize(
+    "scanned, partitions, action",
+    [
+        (GB, 10, ALLOW),
+        (20 * GB, 10, CONFIRM),
+        (GB, 2000, CONFIRM),
+        (200 * GB, 10, REJECT),
+        (GB, 20000, REJECT),
+    ],
+)
+def test_thresholds_decide_the_action(scanned, partitions, action):
+    guard = CostGuard(
+        confirm_bytes=10 * GB,
+        reject_bytes=100 * GB,
+        confirm_partitions=1000,
+        reject_partitions=10000,
+    )
+    session = ExplainSession(
+        partitionsTotal=50000, partitionsAssigned=partitions, bytesAssigned=scanned
+    )
+    decision = guard.check(session, "SELECT * FROM T")
+    assert decision.action == action
+    assert bool(decision.reason) == (action != ALLOW)
+
+
+def test_zero_disables_a_threshold():
+    guard = CostGuard(
+        confirm_bytes=0,
+        reject_bytes=0,
+        confirm_partitions=0,
+        reject_partitions=0,
+        timeout_seconds=0,
+    )
+    session = ExplainSession(
+        partitionsTotal=10**6, partitionsAssigned=10**6, bytesAssigned=10**6 * GB
+    )
+    assert guard.check(session, "SELECT * FROM T").action == ALLOW
+    assert guard.statement_params() == {}
+    assert CostGuard(timeout_seconds=60).statement_params() == {
+        "STATEMENT_TIMEOUT_IN_SECONDS": "60"
+    }
+
+
+def test_confirmation_tokens_are_single_use(tmp_path):
+    confirmations = PendingConfirmations(
+        TieredCache("confirmations", 60, cache_dir=str(tmp_path))
+    )
+    token = confirmations.add("all records", ["SELECT * FROM T"], include_chart=True)
+    assert "SELECT" not in token
+
+    assert confirmations.redeem(token) == {
+        "user_input": "all records",
+        "sql_queries": ["SELECT * FROM T"],
+        "include_chart": True,
+    }
+    assert confirmations.redeem(token) is None
+    assert confirmations.redeem("made-up") is None
+    assert confirmations.redeem(None) is None
+
+
+def test_confirmation_tokens_expire(tmp_path):
+    confirmations = PendingConfirmations(
+        TieredCache("confirmations", -1, cache_dir=str(tmp_path))
+    )
+    assert (
+        confirmations.redeem(
+            confirmations.add("all records", ["SELECT * FROM T"], False)
+        )
+        is None
+    )
@@ -0,0 +1,133 @@
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+from downsampling import OTHER_LABEL, downsample_figure, lttb_indices, top_n_with_other
+
+
+def test_lttb_keeps_endpoints_and_budget():
+    x = np.arange(1000, dtype=float)
+    y = np.sin(x / 50)
+    indices = lttb_indices(x, y, 100)
+    assert len(indices) == 100
+    assert indices[0] == 0 and indices[-1] == 999
+    assert np.all(np.diff(indices) > 0)
+
+
+def test_lttb_returns_everything_under_the_threshold():
+    x = np.arange(10, dtype=float)
+    assert list(lttb_indices(x, x, 20)) == list(range(10))
+
+
+def test_top_n_folds_the_rest_into_other():
+    labels, values = top_n_with_other(["a", "b", "c", "d"], [10, 5, 1, 1], limit=3)
+    assert labels == ["a", "b", OTHER_LABEL]
+    assert values == [10, 5, 2]
+
+
+def test_categorical_bars_become_top_n_plus_other():
+    data = pd.DataFrame(
+        {"company": [f"company {i}" for i in range(100)], "patients": range(100)}
+    )
+    fig, original, rendered = downsample_figure(
+        px.bar(data, x="company", y="patients"), category_limit=25
+    )
+    assert (original, rendered) == (100, 25)
+    assert list(fig.data[0].x)[-1] == OTHER_LABEL
+    assert "company 99" in list(fig.data[0].x)
+
+
+def test_daily_bars_keep_their_date_axis():
+    data = pd.DataFrame(
+        {"day": pd.date_range("2023-01-01", periods=365), "patients": np.arange(365)}
+    )
+    fig, original, rendered = downsample_figure(
+        px.bar(data, x="day", y="patients"), category_limit=25
+    )
+    assert (original, rendered) == (365, 365)
+    assert OTHER_LABEL not in [str(value) for value in fig.data[0].x]
+
+
+def test_temporal_bars_over_the_budget_are_thinned_in_axis_order():
+    data = pd.DataFrame(
+        {
+            "hour": pd.date_range("2023-01-01", periods=5000, freq="h"),
+            "value": np.random.rand(5000),
+        }
+    )
+    fig, original, rendered = downsample_figure(
+        px.bar(data, x="hour", y="value"), line_points=500
+    )
+    assert (original, rendered) == (5000, 500)
+    days = pd.to_datetime(pd.Series(fig.data[0].x))
+    assert days.is_monotonic_increasing
+    assert (
+        days.iloc[0] == data["hour"].iloc[0] and days.iloc[-1] == data["hour"].iloc[-1]
+    )
+
+
+def test_numeric_bars_are_not_folded_into_other():
+    data = pd.DataFrame({"age": np.arange(18, 118), "patients": np.arange(100)})
+    fig, original, rendered = downsample_figure(
+        px.bar(data, x="age", y="patients"), category_limit=25
+    )
+    assert rendered == 100
+    assert OTHER_LABEL not in list(fig.data[0].x)
+
+
+def test_category_axis_type_wins_over_numeric_labels():
+    data = pd.DataFrame({"zip": np.arange(10000, 10100), "patients": np.arange(100)})
+    fig = px.bar(data, x="zip", y="patients")
+    fig.update_xaxes(type="category")
+    fig, _, rendered = downsample_figure(fig, category_limit=25)
+    assert rendered == 25
+
+
+def test_histogram_is_prebinned_with_its_marker():
+    data = pd.DataFrame({"value": np.random.randn(20000)})
+    fig = px.histogram(data, x="value", color_discrete_sequence=["#ff0000"])
+    fig, original, rendered = downsample_figure(
+        fig, scatter_points=5000, category_limit=25
+    )
+    trace = fig.data[0]
+    assert trace.type == "bar"
+    assert trace.marker.color == "#ff0000"
+    assert original == 20000 and rendered == 25
+    assert sum(trace.y) == 20000
+
+
+def test_horizontal_histogram_is_prebinned_horizontally():
+    data = pd.DataFrame({"value": np.random.randn(20000)})
+    fig, _, _ = downsample_figure(px.histogram(data, y="value"), scatter_points=5000)
+    assert fig.data[0].type == "bar"
+    assert fig.data[0].orientation == "h"
+    assert sum(fig.data[0].x) == 20000
+
+
+def test_histogram_of_sums_is_left_to_plotly():
+    data = pd.DataFrame(
+        {"value": np.random.randn(20000), "weight": np.random.rand(20000)}
+    )
+    fig, _, _ = downsample_figure(
+        px.histogram(data, x="value", y="weight", histfunc="sum"), scatter_points=5000
+    )
+    assert fig.data[0].type == "histogram"
+
+
+def test_dense_scatter_is_binned():
+    x, y = np.random.rand(20000), np.random.rand(20000)
+    fig, original, rendered = downsample_figure(
+        go.Figure(go.Scatter(x=x, y=y, mode="markers")), scatter_points=400
+    )
+    assert original == 20000
+    assert rendered <= 400
+    assert sum(int(text.split()[0]) for text in fig.data[0].hovertext) == 20000
+
+
+def test_long_line_is_reduced_to_the_point_budget():
+    x = np.arange(10000)
+    fig, _, rendered = downsample_figure(
+        go.Figure(go.Scatter(x=x, y=np.sin(x / 100), mode="lines")), line_points=500
+    )
+    assert rendered == 500
@@ -0,0 +1,155 @@
+import base64
+import json
+import os
+import subprocess
+import sys
+
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.io as pio
+import pytest
+
+import lambda_handler
+from engine import serialize_event
+from events import CHART, MESSAGE, RESULT, RESULT_BATCH, TOKEN, Event
+from query_results import QueryResult
+
+SRC = os.path.dirname(os.path.abspath(lambda_handler.__file__))
+
+FRAME = pd.DataFrame(
+    {
+        "COMPANY": ["Acme", "Globex", None, "Initech", "Umbrella"],
+        "BMI": [24.5, float("nan"), 31.0, 22.25, 28.0],
+        "SCREENED_AT": pd.to_datetime(
+            ["2024-01-02", "2024-02-03", "2024-03-04", "2024-04-05", "2024-05-06"]
+        ),
+    }
+)
+
+
+class FakeEngine:
+    def __init__(self):
+        self.messages = []
+
+    def greeting(self):
+        return "Hello!"
+
+    def run(self, message, confirm_token=None):
+        self.messages.append((message, confirm_token))
+        return [
+            {"type": TOKEN, "data": "Hi"},
+            {"type": MESSAGE, "role": "assistant", "content": "Hi"},
+        ]
+
+    async def stream(self, message, confirm_token=None):
+        for payload in self.run(message, confirm_token):
+            yield payload
+
+
+def round_trip(payloads) -> list:
+    return json.loads(json.dumps(payloads))
+
+
+def test_results_are_sent_as_a_header_and_row_batches():
+    result = QueryResult.from_dataframe("SELECT * FROM T", FRAME)
+    header, *batches = round_trip(
+        serialize_event(Event(RESULT, result, index=1), max_rows=4, batch_rows=3)
+    )
+
+    assert header == {
+        "type": RESULT,
+        "index": 1,
+        "query": "SELECT * FROM T",
+        "query_id": None,
+        "total_rows": 5,
+        "columns": ["COMPANY", "BMI", "SCREENED_AT"],
+    }
+    assert [
+        (batch["type"], batch["offset"], len(batch["rows"])) for batch in batches
+    ] == [(RESULT_BATCH, 0, 3), (RESULT_BATCH, 3, 1)]
+
+    rows = [row for batch in batches for row in batch["rows"]]
+    rebuilt = pd.DataFrame(rows, columns=header["columns"])
+    rebuilt["SCREENED_AT"] = pd.to_datetime(rebuilt["SCREENED_AT"])
+    # The timestamp resolution depends on the pandas version
+    pd.testing.assert_frame_equal(rebuilt, FRAME.head(4), check_dtype=False)
+
+
+def test_charts_and_messages_round_trip():
+    fig = go.Figure(go.Bar(x=["Acme", "Globex"], y=[3, 4]))
+    (chart,) = round_trip(serialize_event(Event(CHART, (fig, 2, 2, None))))
+    assert pio.from_json(json.dumps(chart["figure"])).data[0].y == (3, 4)
+
+    message = {
+        "role": "assistant",
+        "content": "Expensive.",
+        "confirm": {"token": "abc"},
+    }
+    assert round_trip(serialize_event(Event(MESSAGE, message))) == [
+        {"type": MESSAGE, **message}
+    ]
+    # Results and charts were already sent with their own events
+    assert (
+        serialize_event(
+            Event(MESSAGE, {"role": "assistant", "content": None, "results": None})
+        )
+        == []
+    )
+    assert serialize_event(Event(TOKEN, "Hi")) == [{"type": TOKEN, "data": "Hi"}]
+
+
+def test_lambda_handler_reads_direct_and_api_gateway_events(monkeypatch):
+    engine = FakeEngine()
+    monkeypatch.setattr(lambda_handler, "get_engine", lambda: engine)
+
+    response = lambda_handler.handler({"message": "hi"}, None)
+    assert response["statusCode"] == 200
+    assert json.loads(response["body"])["events"][-1]["content"] == "Hi"
+
+    body = base64.b64encode(json.dumps({"confirm_token": "abc"}).encode()).decode()
+    assert (
+        lambda_handler.handler({"body": body, "isBase64Encoded": True}, None)[
+            "statusCode"
+        ]
+        == 200
+    )
+    assert engine.messages == [("hi", None), (None, "abc")]
+
+    assert json.loads(
+        lambda_handler.handler({"rawPath": "/greeting"}, None)["body"]
+    ) == {"greeting": "Hello!"}
+    assert lambda_handler.handler({"body": "not json"}, None)["statusCode"] == 400
+    assert lambda_handler.handler({"message": ""}, None)["statusCode"] == 400
+    assert lambda_handler.handler({"confirm_token": 1}, None)["statusCode"] == 400
+
+
+def test_lambda_handler_does_not_import_streamlit():
+    # A fresh interpreter: other tests import Streamlit into this one
+    script = (
+        "import sys, lambda_handler\n"
+        "lambda_handler.get_engine = lambda: type('E', (), {'greeting': lambda self: 'Hello!'})()\n"
+        "assert lambda_handler.handler({'rawPath': '/greeting'}, None)['statusCode'] == 200\n"
+        "assert 'streamlit' not in sys.modules, 'streamlit was imported'\n"
+    )
+    completed = subprocess.run(
+        [sys.executable, "-c", script], cwd=SRC, capture_output=True, text=True
+    )
+    assert completed.returncode == 0, completed.stderr
+
+
+def test_api_streams_ndjson(monkeypatch):
+    pytest.importorskip("fastapi")
+    from fastapi.testclient import TestClient
+
+    import api
+
+    monkeypatch.setattr(api, "get_engine", lambda: FakeEngine())
+    client = TestClient(api.app)
+    response = client.post("/chat", json={"message": "hi"})
+    assert response.status_code == 200
+    assert [json.loads(line)["type"] for line in response.text.splitlines()] == [
+        TOKEN,
+        MESSAGE,
+    ]
+    assert client.post("/chat", json={}).status_code == 400
+    assert client.get("/greeting").json() == {"greeting": "Hello!"}
@@ -0,0 +1,58 @@
+import pandas as pd
+
+from history import HistoryStore
+from query_results import QueryResult
+
+
+def batches(count: int, rows: int = 10):
+    for index in range(count):
+        yield pd.DataFrame(
+            {"ID": range(index * rows, (index + 1) * rows), "COMPANY": ["acme"] * rows}
+        )
+
+
+def result(name: str) -> QueryResult:
+    query_result = QueryResult(name, batches=batches(5), max_rows=10)
+    query_result.fetch()
+    return query_result
+
+
+def test_results_are_compacted_and_the_oldest_spilled(tmp_path):
+    history = HistoryStore(memory_budget=1, cache_dir=str(tmp_path))
+    first, last = result("first"), result("last")
+    history.track([{"results": first}, {"results": last}])
+    assert first.spill_path is not None
+    assert last.compacted and last.spill_path is None
+    assert history.stats()["spilled"] == 1
+
+
+def test_paging_past_the_fetched_rows_is_accounted(tmp_path):
+    history = HistoryStore(memory_budget=1, cache_dir=str(tmp_path))
+    first, last = result("first"), result("last")
+    history.track([{"results": first}, {"results": last}])
+
+    # Pulling the next batches turns the spilled result back into a DataFrame
+    first.fetch()
+    assert not first.compacted and first.row_count == 20
+
+    history.account(first)
+    assert first.compacted and first.spill_path is not None
+    assert first.rows(10, 10)["ID"].tolist() == list(range(10, 20))
+
+
+def test_remote_pages_count_towards_memory(tmp_path):
+    history = HistoryStore(cache_dir=str(tmp_path))
+    first = result("first")
+    history.track([{"results": first}])
+    before = first.memory_bytes
+    first.remote_pages[(100, 10)] = pd.DataFrame({"ID": range(10)})
+    assert first.memory_bytes > before
+
+
+def test_expired_result_keeps_the_fetched_rows():
+    expired = result("expired")
+    expired.query_id = "01b2"
+    expired.expire()
+    assert expired.expired and expired.exhausted
+    assert expired.query_id is None
+    assert expired.total_rows == 10
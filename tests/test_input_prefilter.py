@@ -0,0 +1,62 @@
+import pytest
+
+# parsers.InputEvaluator is a langchain output parser model
+pytest.importorskip("langchain")
+
+from input_prefilter import EXTRA_EXAMPLES, InputPrefilter, NaiveBayes
+
+EXAMPLES = EXTRA_EXAMPLES + [
+    ("Hi", False),
+    ("What can you do?", False),
+    ("How many patients are smokers?", True),
+    ("Show the average BMI by company", True),
+]
+
+
+@pytest.fixture
+def prefilter() -> InputPrefilter:
+    return InputPrefilter(EXAMPLES)
+
+
+@pytest.mark.parametrize(
+    "text", ["Hello there!", "hola, como estas?", "Thanks for your help", "ok :)"]
+)
+def test_small_talk_needs_no_sql(prefilter, text):
+    evaluation = prefilter.classify(text)
+    assert evaluation is not None
+    assert not evaluation.is_a_query and evaluation.simple_answer
+
+
+def test_obvious_data_questions_skip_the_llm(prefilter):
+    evaluation = prefilter.classify(
+        "How many patients completed their consult by company?"
+    )
+    assert (
+        evaluation.is_a_query
+        and not evaluation.include_chart
+        and not evaluation.simple_answer
+    )
+    assert prefilter.classify(
+        "Show me a bar chart of patients by company"
+    ).include_chart
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "",
+        "   ",
+        # No query intent at the start
+        "I wonder whether smokers have a higher BMI",
+        # Query intent, but nothing like the examples
+        "list your favourite films",
+    ],
+)
+def test_anything_else_is_left_to_the_llm(prefilter, text):
+    assert prefilter.classify(text) is None
+
+
+def test_naive_bayes_separates_the_examples():
+    model = NaiveBayes(EXAMPLES)
+    assert model.predict_proba("How many patients are smokers?") > 0.5
+    assert model.predict_proba("Good morning, thanks!") < 0.5
@@ -0,0 +1,55 @@
+import pandas as pd
+
+from result_cache import ResultCache, normalize_sql
+
+QUERY = "SELECT COMPANY, AVG(BMI)\n  FROM HEALTHRECORDDATA\n WHERE COMPANY = 'Acme  Corp'\n GROUP BY COMPANY;"
+
+
+def test_keys_ignore_formatting_outside_string_literals():
+    assert normalize_sql(QUERY) == (
+        "SELECT COMPANY, AVG(BMI) FROM HEALTHRECORDDATA WHERE COMPANY = 'Acme  Corp' GROUP BY COMPANY"
+    )
+    assert ResultCache.key(QUERY, "v1") == ResultCache.key(
+        QUERY.replace("\n", "\t\t").rstrip(";"), "v1"
+    )
+    # Whitespace inside a literal changes the result
+    assert ResultCache.key(QUERY, "v1") != ResultCache.key(
+        QUERY.replace("Acme  Corp", "Acme Corp"), "v1"
+    )
+
+
+def test_keys_change_with_the_table_version():
+    assert ResultCache.key(QUERY, "v1") != ResultCache.key(QUERY, "v2")
+
+
+def test_non_deterministic_queries_are_not_cacheable():
+    assert ResultCache.is_cacheable(QUERY)
+    assert not ResultCache.is_cacheable(
+        "SELECT * FROM HEALTHRECORDDATA WHERE SCREENING_DATE > current_date - 30"
+    )
+    assert not ResultCache.is_cacheable("SELECT RANDOM() FROM HEALTHRECORDDATA")
+
+
+def test_results_are_read_back_whole_and_by_page(tmp_path):
+    cache = ResultCache(cache_dir=str(tmp_path))
+    key = ResultCache.key(QUERY, "v1")
+    cache.set(key, pd.DataFrame({"ID": range(25)}))
+
+    assert cache.contains(key)
+    assert cache.get(key)["ID"].tolist() == list(range(25))
+    assert cache.row_count(key) == 25
+    assert cache.read_page(key, 20, 10)["ID"].tolist() == list(range(20, 25))
+    assert cache.get(ResultCache.key(QUERY, "v2")) is None
+
+
+def test_the_least_recently_used_results_are_evicted(tmp_path):
+    cache = ResultCache(cache_dir=str(tmp_path), max_bytes=10**9)
+    keys = [ResultCache.key(f"SELECT {index}", "v1") for index in range(3)]
+    for key in keys:
+        cache.set(key, pd.DataFrame({"ID": range(100)}))
+    cache.get(keys[0])
+
+    # Room for two results only
+    cache.max_bytes = sum(size for size, _ in cache._index.values()) * 2 // 3 + 1
+    cache.set(keys[2], pd.DataFrame({"ID": range(100)}))
+    assert [cache.contains(key) for key in keys] == [True, False, True]
@@ -0,0 +1,66 @@
+from contextlib import contextmanager
+
+import pandas as pd
+import pytest
+
+from query_results import QueryResult
+from result_viewer import get_page, get_total_rows, render_query_result
+from session_pool import SessionPoolExhausted
+
+
+class FakePool:
+    """Counts the sessions leased; `exhausted` makes every lease time out."""
+
+    def __init__(self, exhausted=False):
+        self.exhausted = exhausted
+        self.leases = 0
+
+    @contextmanager
+    def session(self, timeout=None):
+        if self.exhausted:
+            raise SessionPoolExhausted("No Snowflake session available in the pool")
+        self.leases += 1
+        yield self
+
+    def sql(self, query):
+        self.query = query
+        return self
+
+    def collect(self):
+        return [{"TOTAL": 100}]
+
+    def to_pandas(self):
+        return pd.DataFrame({"ID": range(10)})
+
+
+def partial_result() -> QueryResult:
+    # The first 20 of 100 rows were pulled; the rest is only reachable through RESULT_SCAN
+    result = QueryResult(
+        "SELECT ID FROM T",
+        batches=iter([pd.DataFrame({"ID": range(20)}), pd.DataFrame()]),
+        query_id="01b2",
+        max_rows=20,
+    )
+    result.fetch()
+    return result
+
+
+def test_rows_in_memory_need_no_session():
+    pool = FakePool()
+    assert get_page(partial_result(), 1, 10, pool)["ID"].tolist() == list(range(10, 20))
+    assert pool.leases == 0
+
+
+def test_result_scan_leases_a_session_per_read():
+    pool, result = FakePool(), partial_result()
+    assert get_total_rows(result, pool) == 100
+    get_page(result, 5, 10, pool)
+    get_page(result, 5, 10, pool)
+    # The second read of the page is served from the result's remote pages
+    assert pool.leases == 2
+
+
+def test_busy_pool_falls_back_to_the_fetched_rows():
+    with pytest.raises(SessionPoolExhausted):
+        get_total_rows(partial_result(), FakePool(exhausted=True))
+    render_query_result(partial_result(), FakePool(exhausted=True), page_size=10)
@@ -0,0 +1,117 @@
+import pytest
+
+import schema_context
+from schema_context import SchemaSnapshot, relevant_columns, relevant_metadata
+from schema_index import (
+    BM25Index,
+    SchemaIndexStore,
+    estimate_tokens,
+    select_entries,
+    tokenize,
+)
+
+METADATA = [
+    [
+        "BMI",
+        "Body mass index, weight in kilograms divided by the square of the height in meters",
+    ],
+    ["SYSTOLIC_BP", "Systolic blood pressure in mmHg"],
+    ["DIASTOLIC_BP", "Diastolic blood pressure in mmHg"],
+    ["SMOKER", "Whether the patient smokes tobacco"],
+    ["COMPANY", "Employer of the patient"],
+]
+
+
+@pytest.fixture(autouse=True)
+def index_store(tmp_path, monkeypatch):
+    store = SchemaIndexStore(cache_dir=str(tmp_path))
+    monkeypatch.setattr(schema_context, "schema_index_store", store)
+    return store
+
+
+def snapshot(columns=(), metadata=METADATA) -> SchemaSnapshot:
+    return SchemaSnapshot(
+        table_name="DB.SCHEMA.T",
+        metadata_table="DB.SCHEMA.T_ATTRIBUTES",
+        versions={},
+        fingerprint="test",
+        columns=list(columns),
+        metadata=list(metadata),
+    )
+
+
+def test_tokenize_splits_names_and_drops_stopwords():
+    assert tokenize("systolicBP of the PATIENTS") == ["systolic", "bp", "patient"]
+    assert tokenize("Presión arterial de los fumadores") == [
+        "presion",
+        "arterial",
+        "fumadore",
+    ]
+
+
+def test_bm25_ranks_the_matching_documents_first():
+    index = BM25Index.build(
+        [f"{name} {name} {description}" for name, description in METADATA]
+    )
+    ranked = index.search("average diastolic pressure by company")
+    assert [position for position, _ in ranked[:2]] == [2, 4]
+    assert {position for position, _ in ranked} == {1, 2, 4}
+    assert index.search("unrelated words") == []
+
+
+def test_select_entries_stops_at_top_k_and_the_token_budget():
+    ranked = [(index, 1.0) for index in range(len(METADATA))]
+    format_entry = lambda name, description: f"{name}: {description}"
+    assert len(select_entries(METADATA, ranked, 2, 10_000, format_entry)) == 2
+
+    budget = estimate_tokens(format_entry(*METADATA[0])) + estimate_tokens(
+        format_entry(*METADATA[1])
+    )
+    assert select_entries(METADATA, ranked, 10, budget, format_entry) == METADATA[:2]
+    assert (
+        select_entries(METADATA, ranked, 10, budget - 1, format_entry) == METADATA[:1]
+    )
+
+
+def test_relevant_metadata_keeps_table_order_within_the_budget():
+    selected = relevant_metadata(
+        snapshot(), "blood pressure of smokers", top_k=3, token_budget=10_000
+    )
+    assert [name for name, _ in selected] == ["SYSTOLIC_BP", "DIASTOLIC_BP", "SMOKER"]
+
+    # SMOKER ranks first and SYSTOLIC_BP ties with DIASTOLIC_BP; 13 tokens each leave no room for a third
+    tight = relevant_metadata(
+        snapshot(), "blood pressure of smokers", top_k=3, token_budget=26
+    )
+    assert [name for name, _ in tight] == ["SYSTOLIC_BP", "SMOKER"]
+
+
+def test_relevant_metadata_without_a_match_falls_back_to_the_first_definitions():
+    assert (
+        relevant_metadata(snapshot(), "zzz", top_k=2, token_budget=10_000)
+        == METADATA[:2]
+    )
+    assert relevant_metadata(snapshot(), None) == METADATA
+
+
+def test_wide_tables_keep_the_matching_columns():
+    columns = [(f"COLUMN_{index}", "TEXT") for index in range(10)] + [
+        ("SMOKER_STATUS", "TEXT")
+    ]
+    selected = relevant_columns(
+        snapshot(columns), "smoker status", top_k=3, max_columns=4
+    )
+    assert ("SMOKER_STATUS", "TEXT") in selected and len(selected) == 4
+    assert (
+        relevant_columns(snapshot(columns[:4]), "smoker status", max_columns=4)
+        == columns[:4]
+    )
+
+
+def test_indexes_are_persisted_per_key(index_store, tmp_path):
+    entries = [tuple(entry) for entry in METADATA]
+    built = index_store.get("fingerprint-metadata", entries)
+    reloaded = SchemaIndexStore(cache_dir=str(tmp_path)).get(
+        "fingerprint-metadata", entries
+    )
+    assert reloaded.to_dict() == built.to_dict()
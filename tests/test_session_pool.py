@@ -0,0 +1,111 @@
+import threading
+
+import pytest
+
+from session_pool import TOKEN_EXPIRED, SessionPool, SessionPoolExhausted
+
+
+class FakeSession:
+    def __init__(self, number: int):
+        self.number = number
+        self.alive = True
+        self.closed = False
+        self.queries = []
+
+    def sql(self, query):
+        self.queries.append(query)
+        return self
+
+    def collect(self):
+        if not self.alive:
+            raise RuntimeError(TOKEN_EXPIRED)
+        return [[1]]
+
+    def close(self):
+        self.closed = True
+
+
+class Factory:
+    def __init__(self):
+        self.created = []
+
+    def __call__(self):
+        self.created.append(FakeSession(len(self.created)))
+        return self.created[-1]
+
+
+@pytest.fixture
+def factory():
+    return Factory()
+
+
+def make_pool(factory, **kwargs) -> SessionPool:
+    options = dict(min_size=1, max_size=2, idle_timeout=3600, ping_interval=3600)
+    options.update(kwargs)
+    return SessionPool(factory, **options)
+
+
+def test_sessions_are_reused(factory):
+    pool = make_pool(factory)
+    pool.prefill()
+    session = pool.acquire()
+    pool.release(session)
+    assert pool.acquire() is session
+    assert len(factory.created) == 1 and session.queries == []
+
+
+def test_acquire_times_out_when_every_session_is_in_use(factory):
+    pool = make_pool(factory, max_size=1)
+    session = pool.acquire()
+    with pytest.raises(SessionPoolExhausted):
+        pool.acquire(timeout=0.05)
+
+    # A waiting thread gets the session as soon as it is released
+    acquired = []
+    waiter = threading.Thread(target=lambda: acquired.append(pool.acquire(timeout=5)))
+    waiter.start()
+    pool.release(session)
+    waiter.join()
+    assert acquired == [session]
+
+
+def test_idle_sessions_are_closed_down_to_the_minimum(factory):
+    pool = make_pool(factory, max_size=3, idle_timeout=0)
+    sessions = [pool.acquire() for _ in range(3)]
+    for session in sessions:
+        pool.release(session)
+
+    pool.acquire()
+    assert [session.closed for session in sessions] == [True, True, False]
+    assert pool.stats() == {"size": 1, "idle": 0, "in_use": 1}
+
+
+def test_sessions_idle_past_the_ping_interval_are_checked(factory):
+    pool = make_pool(factory, ping_interval=0)
+    session = pool.acquire()
+    pool.release(session)
+    assert pool.acquire() is session
+    assert session.queries == ["SELECT 1"]
+
+    # A session failing the check is replaced
+    session.alive = False
+    pool.release(session)
+    replacement = pool.acquire()
+    assert replacement is not session and session.closed
+    assert pool.stats()["size"] == 1
+
+
+def test_sessions_are_released_when_the_block_raises(factory):
+    pool = make_pool(factory)
+    with pytest.raises(ValueError):
+        with pool.session() as session:
+            raise ValueError("bad query")
+    assert pool.stats() == {"size": 1, "idle": 1, "in_use": 0}
+    assert not session.closed
+
+    # An expired token is not handed out again
+    with pytest.raises(RuntimeError):
+        with pool.session() as same:
+            raise RuntimeError(f"390114: {TOKEN_EXPIRED}.")
+    assert same is session and session.closed
+    assert pool.stats() == {"size": 0, "idle": 0, "in_use": 0}
@@ -0,0 +1,50 @@
+import pytest
+
+from sql_stream import SqlFenceParser, extract_sql
+
+ANSWER = (
+    "Average BMI by company:\n\n```sql\nSELECT COMPANY, AVG(BMI)\nFROM T\nGROUP BY COMPANY;\n```\n\n"
+    "And the smokers:\n```sql\nSELECT COUNT_IF(SMOKER) FROM T;\n```\nDone."
+)
+
+
+def feed_all(chunks) -> tuple:
+    parser = SqlFenceParser()
+    closed = [query for chunk in chunks for query in parser.feed(chunk)]
+    return parser, closed
+
+
+def test_blocks_close_when_their_fence_does():
+    parser = SqlFenceParser()
+    assert parser.feed("```sql\nSELECT 1\n`") == []
+    assert parser.feed("``") == ["SELECT 1"]
+    assert parser.feed("\nthen ```sql\nSELECT 2") == []
+    assert parser.feed("\n```") == ["SELECT 2"]
+
+
+@pytest.mark.parametrize("split", range(1, len(ANSWER)))
+def test_any_split_finds_the_same_blocks(split):
+    parser, closed = feed_all([ANSWER[:split], ANSWER[split:]])
+    assert closed == parser.queries == extract_sql(ANSWER)
+
+
+def test_one_character_at_a_time():
+    parser, closed = feed_all(ANSWER)
+    assert closed == parser.queries == extract_sql(ANSWER)
+    assert parser.text == ANSWER
+
+
+def test_unclosed_and_other_fences_are_not_queries():
+    parser, closed = feed_all(
+        ["```python\nprint(1)\n```\n", "```sql\nSELECT 1", "", "\n``"]
+    )
+    assert closed == [] and parser.queries == []
+
+
+def test_one_chunk_can_close_several_blocks():
+    parser = SqlFenceParser()
+    assert parser.feed(
+        "```sql\nSELECT 1\n```\n```sql\nSELECT 2\n```\n```sql\nSELECT"
+    ) == ["SELECT 1", "SELECT 2"]
+    assert parser.feed(" 3\n```") == ["SELECT 3"]
+    assert parser.queries == ["SELECT 1", "SELECT 2", "SELECT 3"]
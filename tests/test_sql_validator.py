@@ -0,0 +1,104 @@
+import pytest
+
+import sql_validator
+from schema_context import METADATA_TABLE_NAME, QUALIFIED_TABLE_NAME, SchemaSnapshot
+from sql_validator import SqlValidationError, validate_queries, validate_sql
+
+SNAPSHOT = SchemaSnapshot(
+    table_name=QUALIFIED_TABLE_NAME,
+    metadata_table=METADATA_TABLE_NAME,
+    versions={},
+    fingerprint="test",
+    columns=[("COMPANY", "TEXT"), ("BMI", "NUMBER"), ("SCREENING_DATE", "DATE")],
+)
+
+
+@pytest.fixture(autouse=True)
+def session_defaults(monkeypatch):
+    # The session the queries would run on, as set in the environment
+    database, schema, _ = QUALIFIED_TABLE_NAME.split(".")
+    monkeypatch.setattr(sql_validator, "DATABASE", database)
+    monkeypatch.setattr(sql_validator, "SCHEMA", schema)
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        f"SELECT COMPANY, AVG(BMI) FROM {QUALIFIED_TABLE_NAME} GROUP BY COMPANY",
+        f"WITH yearly AS (SELECT YEAR(SCREENING_DATE) AS Y, BMI FROM {QUALIFIED_TABLE_NAME}) "
+        f"SELECT Y, AVG(BMI) FROM yearly GROUP BY Y",
+        f"SELECT COMPANY FROM {QUALIFIED_TABLE_NAME} UNION ALL SELECT COMPANY FROM {QUALIFIED_TABLE_NAME};",
+        "SELECT COMPANY FROM HEALTHRECORDDATA",
+        f"SELECT * FROM {METADATA_TABLE_NAME}",
+    ],
+)
+def test_selects_on_the_table_pass(query):
+    validate_sql(query, SNAPSHOT)
+    validate_sql(query)
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        f"DELETE FROM {QUALIFIED_TABLE_NAME}",
+        f"DROP TABLE {QUALIFIED_TABLE_NAME}",
+        f"UPDATE {QUALIFIED_TABLE_NAME} SET BMI = 0",
+        f"INSERT INTO {QUALIFIED_TABLE_NAME} (BMI) SELECT BMI FROM {QUALIFIED_TABLE_NAME}",
+        f"CREATE TABLE COPY AS SELECT * FROM {QUALIFIED_TABLE_NAME}",
+        f"TRUNCATE TABLE {QUALIFIED_TABLE_NAME}",
+        "SHOW TABLES",
+    ],
+)
+def test_writes_and_commands_are_rejected(query):
+    for snapshot in (SNAPSHOT, None):
+        with pytest.raises(SqlValidationError, match="Only SELECT"):
+            validate_sql(query, snapshot)
+
+
+def test_several_statements_are_rejected():
+    query = f"SELECT COMPANY FROM {QUALIFIED_TABLE_NAME}; DELETE FROM {QUALIFIED_TABLE_NAME}"
+    with pytest.raises(SqlValidationError, match="Only one statement"):
+        validate_sql(query)
+
+
+@pytest.mark.parametrize(
+    "table",
+    [
+        "OTHER_DB.POC_CATAPULT_HEALTH.HEALTHRECORDDATA",
+        "CATAPULT_HEALTH_DB.OTHER_SCHEMA.HEALTHRECORDDATA",
+        "OTHER_SCHEMA.HEALTHRECORDDATA",
+        "PATIENTS",
+    ],
+)
+def test_other_tables_are_rejected(table):
+    for snapshot in (SNAPSHOT, None):
+        with pytest.raises(SqlValidationError, match="can't be queried"):
+            validate_sql(f"SELECT * FROM {table}", snapshot)
+
+
+def test_unqualified_tables_resolve_to_the_session_schema(monkeypatch):
+    monkeypatch.setattr(sql_validator, "SCHEMA", "OTHER_SCHEMA")
+    with pytest.raises(SqlValidationError, match="can't be queried"):
+        validate_sql("SELECT * FROM HEALTHRECORDDATA")
+
+
+def test_table_functions_other_than_flatten_are_rejected():
+    validate_sql(
+        f"SELECT f.VALUE FROM {QUALIFIED_TABLE_NAME} t, LATERAL FLATTEN(input => t.COMPANY) f"
+    )
+    with pytest.raises(SqlValidationError, match="can't be queried"):
+        validate_sql("SELECT * FROM TABLE(RESULT_SCAN(LAST_QUERY_ID()))")
+
+
+def test_unknown_columns_are_rejected_with_a_suggestion():
+    with pytest.raises(SqlValidationError, match="Did you mean COMPANY"):
+        validate_sql(f"SELECT COMPANYY FROM {QUALIFIED_TABLE_NAME}", SNAPSHOT)
+    # Without a snapshot the columns aren't checked
+    validate_sql(f"SELECT COMPANYY FROM {QUALIFIED_TABLE_NAME}")
+
+
+def test_rejected_queries_are_quoted():
+    with pytest.raises(SqlValidationError, match="Query:\nDROP TABLE X"):
+        validate_queries(
+            [f"SELECT BMI FROM {QUALIFIED_TABLE_NAME}", "DROP TABLE X"], SNAPSHOT
+        )